@@ -107,8 +107,11 @@ def main():
         if angle_decision == "y":
             compiler_type = "angle"
         android_decision = input("Is the compiler android based? [y/N]:")
+        devices = []
         if android_decision == "y":
             compiler_type = "android"
+            devices = input("Specify the serials of the identical devices running the compiler, separated by spaces "
+                            "(or press enter for the default adb device):").split()
         ldpath = input("Specify LD_LIBRARY_PATH (or press enter):")
         if ldpath == "":
             ldpath = " "
@@ -124,7 +127,7 @@ def main():
             otherenvs.append(otherenv)
         extra_compiler_decision = input("\nDo you want to add another compiler? [y/N]:")
 
-        compilers.append([compiler_name, compiler_renderer, compiler_type, ldpath, vkfilename, otherenvs])
+        compilers.append([compiler_name, compiler_renderer, compiler_type, ldpath, vkfilename, otherenvs, devices])
         if extra_compiler_decision != "y":
             break
         compiler_number += 1
@@ -238,6 +241,16 @@ def main():
         else:
             otherenvs.appendChild(config_document.createTextNode(" "))
         compiler_xml.appendChild(otherenvs)
+        if compiler[6]:
+            devices = config_document.createElement("devices")
+            length = config_document.createElement("length")
+            length.appendChild(config_document.createTextNode(str(len(compiler[6]))))
+            devices.appendChild(length)
+            for i, device in enumerate(compiler[6]):
+                device_xml = config_document.createElement("device_" + str(i))
+                device_xml.appendChild(config_document.createTextNode(device))
+                devices.appendChild(device_xml)
+            compiler_xml.appendChild(devices)
         compilers_xml.appendChild(compiler_xml)
 
     # Reducers settings
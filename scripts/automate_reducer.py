@@ -16,56 +16,129 @@ import argparse
 import os
 import shlex
 import shutil
+import signal
 import stat
 import subprocess
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from itertools import repeat
 
 import create_shell_code
 import splitter_merger
-from utils.execution_utils import env_setup
+from interestingness_server import InterestingnessServer
+from utils.Configuration import env_setup
 from utils.file_utils import clean_files, find_test_file, ensure_abs_path
+from utils.ResultsIndex import ResultsIndex
+from utils.RuntimeStats import add_runtime_stats_arguments, load_runtime_stats
 
 
 def batch_reduction(reducer, compilers, exec_dirs, files_to_reduce, shader_tool, ref="", reduce_timeout=False,
-                    double_run=False):
+                    double_run=False, interestingness_server=True, jobs=1, time_budget=None, runtime_stats=None):
+    if jobs > 1:
+        # The interestingness script of a sandbox can only reach the compilers of the sandbox through the server
+        if not interestingness_server:
+            exit("Parallel reductions require the interestingness server")
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(reduce_in_sandbox, repeat(reducer), repeat(compilers), repeat(exec_dirs),
+                              files_to_reduce, repeat(shader_tool), repeat(ref), repeat(reduce_timeout),
+                              repeat(double_run), repeat(time_budget), repeat(runtime_stats)))
+        return
+    for file in files_to_reduce:
+        reduce_file(reducer, compilers, exec_dirs, file, shader_tool, ref, reduce_timeout, double_run,
+                    interestingness_server, time_budget, runtime_stats=runtime_stats)
+
+
+def reduce_file(reducer, compilers, exec_dirs, file, shader_tool, ref="", reduce_timeout=False, double_run=False,
+                interestingness_server=True, time_budget=None, log_file="", reducer_output=None, runtime_stats=None):
     reduction_input = exec_dirs.execdir + "test_to_reduce" + shader_tool.file_extension
     reduction_output = exec_dirs.execdir + "test_reduced" + shader_tool.file_extension
-    for file in files_to_reduce:
-        # copy file to exec_dir
-        file_name = file.split("/")[-1].split(".")[0]
-        reduced_filename = file.replace(shader_tool.file_extension, "_re" + shader_tool.file_extension)
-        print("Reduction of " + file)
-        shutil.copy(file, reduction_input)
-        # run reduction
-        success = run_reduction(reducer, compilers, exec_dirs, reduction_input, reduction_output, shader_tool,
-                                          ref, reduce_timeout, log_file=reducer.name + "_" + file_name + ".log",
-                                          double_run=double_run)
-
-        # copy back
-        if os.path.isfile(reduction_output):
-            shutil.copy(reduction_output,
-                        reduced_filename)
-            # clean exec_dir
-            clean_files(exec_dirs.execdir, ["test_to_reduce" + shader_tool.file_extension,
-                                            "test_reduced" + shader_tool.file_extension])
+    # copy file to exec_dir
+    file_name = file.split("/")[-1].split(".")[0]
+    reduced_filename = file.replace(shader_tool.file_extension, "_re" + shader_tool.file_extension)
+    if log_file == "":
+        log_file = reducer.name + "_" + file_name + ".log"
+    print("Reduction of " + file)
+    shutil.copy(file, reduction_input)
+    # run reduction
+    success = run_reduction(reducer, compilers, exec_dirs, reduction_input, reduction_output, shader_tool,
+                            ref, reduce_timeout, log_file=log_file, double_run=double_run,
+                            interestingness_server=interestingness_server, time_budget=time_budget,
+                            reducer_output=reducer_output, runtime_stats=runtime_stats)
+
+    # copy back
+    if os.path.isfile(reduction_output):
+        shutil.copy(reduction_output,
+                    reduced_filename)
+        # clean exec_dir
+        clean_files(exec_dirs.execdir, ["test_to_reduce" + shader_tool.file_extension,
+                                        "test_reduced" + shader_tool.file_extension])
+    return success
+
+
+def reduce_in_sandbox(reducer, compilers, exec_dirs, file, shader_tool, ref="", reduce_timeout=False,
+                      double_run=False, time_budget=None, runtime_stats=None):
+    # Each reduction gets its own copy of the execution directory (reduction files and interestingness script)
+    # The log and the output of the reducer are kept in the execution directory as <reducer>_<shader>.log / .out
+    file_name = file.split("/")[-1].split(".")[0]
+    sandbox = tempfile.mkdtemp(prefix="reduction_" + file_name + "_", dir=exec_dirs.execdir) + "/"
+    try:
+        # The interestingness script calls the client shim from the scripts directory of its root
+        if os.path.isdir(exec_dirs.execdir + "scripts"):
+            os.symlink(exec_dirs.execdir + "scripts", sandbox + "scripts")
+        with open(exec_dirs.execdir + reducer.name + "_" + file_name + ".out", "w") as reducer_output:
+            return reduce_file(reducer.relocate(exec_dirs.execdir, sandbox), compilers, exec_dirs.resolve(sandbox),
+                               file, shader_tool, ref, reduce_timeout, double_run, True, time_budget,
+                               exec_dirs.execdir + reducer.name + "_" + file_name + ".log", reducer_output,
+                               runtime_stats)
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def run_reducer(cmd, exec_dir, output, time_budget=None):
+    if time_budget is None:
+        subprocess.run(cmd, stdout=output, stderr=output, universal_newlines=True, cwd=exec_dir)
+        return True
+    # The reducer gets its own session so that the whole process tree is stopped once the budget is spent
+    process = subprocess.Popen(cmd, stdout=output, stderr=output, universal_newlines=True, cwd=exec_dir,
+                               start_new_session=True)
+    try:
+        process.wait(timeout=time_budget)
+        return True
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+        return False
 
 
 def run_reduction(reducer, compilers, exec_dirs, test_input, test_output, shader_tool, ref="", reduce_timeout=False,
-                  log_file="reduction.log", double_run=False):
+                  log_file="reduction.log", double_run=False, interestingness_server=True, time_budget=None,
+                  reducer_output=None, runtime_stats=None):
     test_input = ensure_abs_path(exec_dirs.execdir, test_input)
     test_output = ensure_abs_path(exec_dirs.execdir, test_output)
     log_file = ensure_abs_path(exec_dirs.execdir, log_file)
     input_file = ensure_abs_path(exec_dirs.execdir, reducer.input_file)
     output_file = ensure_abs_path(exec_dirs.execdir, reducer.output_files)
     original_test_files = find_test_file(exec_dirs.execdir)
+    # The original shader is executed first (to collect the error code), its runtimes tighten the timeouts of the
+    # interestingness checks
+    if runtime_stats is not None:
+        runtime_stats = runtime_stats.for_reduction()
+    # The interestingness checks are served from this process, the interestingness test only calls the client shim
+    server = None
+    if interestingness_server:
+        server = InterestingnessServer(compilers, exec_dirs, shader_tool, test_input, double_run=double_run,
+                                       log_file=log_file, runtime_stats=runtime_stats)
     # Provides log file location
     error_code_str = create_shell_code.build_shell_test(compilers, exec_dirs, shader_tool,
                                                         test_input,
                                                         input_file, ref,
                                                         exec_dirs.execdir + reducer.interesting_test,
-                                                        double_run=double_run, log_name=log_file)
+                                                        double_run=double_run, log_name=log_file,
+                                                        server_socket=server.socket_path if server is not None else "",
+                                                        runtime_stats=runtime_stats)
 
     # Ensure the interestingness test is executable
     interesting_test_stat = os.stat(exec_dirs.execdir + reducer.interesting_test)
@@ -90,23 +163,33 @@ def run_reduction(reducer, compilers, exec_dirs, test_input, test_output, shader
             temp_files.append(input_file.split(".")[0] + ".json")
 
         # Extract the shader code using the splitter and name it as input_file
-        splitter_merger.split(shader_tool, test_input, input_file)
+        template = splitter_merger.split(shader_tool, test_input, input_file)
 
         # Perform the reduction using the reduction launch command
         ref_timestamp = time.time()
         cmd = shlex.split(reducer.command)
         print("Reduction launched: " + " ".join(cmd))
-        process = subprocess.run(cmd, stdout=sys.stdout, stderr=sys.stdout, universal_newlines=True,
-                                 cwd=exec_dirs.execdir)
+        if server is not None:
+            server.error_code = error_code_str
+            server.start()
+        try:
+            finished = run_reducer(cmd, exec_dirs.execdir, reducer_output if reducer_output is not None else sys.stdout,
+                                   time_budget)
+        finally:
+            if server is not None:
+                server.stop()
 
         # Add eventual temporary files
         temp_files += find_test_file(exec_dirs.execdir)
         temp_files = list(set(temp_files) - set(original_test_files))
 
         # Check results
-        if os.path.isfile(output_file):
+        if not finished:
+            print("Reduction stopped after the time budget of " + str(time_budget) + "s")
+            success = False
+        elif os.path.isfile(output_file):
             # Merge the shader code with the harness
-            splitter_merger.merge(shader_tool, test_output, output_file)
+            splitter_merger.merge(shader_tool, test_output, output_file, template)
             if test_output.split("/")[-1] in temp_files:
                 temp_files.remove(test_output.split("/")[-1])
             end_timestamp = time.time()
@@ -127,7 +210,33 @@ def run_reduction(reducer, compilers, exec_dirs, test_input, test_output, shader
     return success
 
 
-def get_files_to_reduce(reduce_keptshaders, test_file, keptshaderdir):
+def select_representatives(files_to_reduce, keptshaderdir, representatives=1):
+    # Only the smallest shaders of each bucket of the results index (findings sharing their signature, see
+    # finding_signature) are reduced, minus the shaders of the bucket already reduced. Shaders missing from the index
+    # are all reduced
+    index_location = ResultsIndex.location(keptshaderdir)
+    if representatives <= 0 or not os.path.isfile(index_location):
+        return files_to_reduce
+    seeds = [os.path.splitext(os.path.basename(file))[0] for file in files_to_reduce]
+    seeds_to_reduce = set(seeds)
+    reduced_seeds = {file[:file.find("_re")] for file in os.listdir(keptshaderdir) if file.find("_re") != -1}
+    selected = set()
+    bucketed = set()
+    buckets = ResultsIndex(index_location).buckets()
+    for bucket in buckets.values():
+        remaining = representatives - sum(1 for seed, _ in bucket if seed in reduced_seeds)
+        for seed, _ in bucket:
+            bucketed.add(seed)
+            if remaining > 0 and seed in seeds_to_reduce:
+                selected.add(seed)
+                remaining -= 1
+    files = [file for seed, file in zip(seeds, files_to_reduce) if seed in selected or seed not in bucketed]
+    print(str(len(files_to_reduce)) + " shaders to reduce in " + str(len(buckets)) + " buckets, " + str(len(files)) +
+          " of them reduced")
+    return files
+
+
+def get_files_to_reduce(reduce_keptshaders, test_file, keptshaderdir, representatives=0):
     if reduce_keptshaders:
         files_to_reduce = os.listdir(keptshaderdir)
         for file in list(files_to_reduce):
@@ -139,7 +248,8 @@ def get_files_to_reduce(reduce_keptshaders, test_file, keptshaderdir):
                     files_to_reduce.remove(not_reduced_file)
 
         # Return full path names
-        return list(map(lambda x: keptshaderdir + x, files_to_reduce))
+        return select_representatives(list(map(lambda x: keptshaderdir + x, files_to_reduce)), keptshaderdir,
+                                      representatives)
 
     else:
         return [test_file]
@@ -155,18 +265,40 @@ def main():
     parser.add_argument("--output-file", dest="output_file", default="test_reduced.shadertrap",
                         help="specify the name of the expected output file")
     parser.add_argument("--batch-reduction", dest="batch", action="store_true",
-                        help="launch batch reduction on all shaders stored in keptshaders (only attempt to reduce "
-                             "shaders which are not already reduced)")
+                        help="launch batch reduction on the shaders stored in keptshaders (only attempt to reduce "
+                             "shaders which are not already reduced), by default only one shader of each bucket of "
+                             "findings is reduced (see --representatives)")
     parser.add_argument("--reduce-timeout", dest="timeout", action="store_true",
                         help="forces the reducer to attempt to reduce shaders which time out")
     parser.add_argument('--double-run', dest="double_run", action="store_true",
                         help="Run the program twice eliminating useless wrappers on the second run")
+    parser.add_argument('--jobs', dest="jobs", default=1, type=int,
+                        help="Number of reductions launched concurrently, each one in its own copy of the execution "
+                             "directory (by default: 1)")
+    parser.add_argument('--time-budget', dest="time_budget", default=None, type=int,
+                        help="Stop the reduction of a shader after the given number of seconds (by default: no "
+                             "limit)")
+    parser.add_argument('--no-interestingness-server', dest="interestingness_server", action="store_false",
+                        help="Run the whole interestingness test (merge and comparison scripts) in a new process for "
+                             "each reduction step instead of serving it from the reduction process")
+    parser.add_argument('--representatives', dest="representatives", default=1, type=int,
+                        help="With --batch-reduction, number of shaders reduced for each bucket of findings sharing "
+                             "their error code, differing compilers and crash messages, the smallest shaders first "
+                             "(by default: 1, 0 reduces every shader)")
+    add_runtime_stats_arguments(parser)
 
     ns, exec_dirs, compilers_dict, reducer, shader_tool = env_setup(parser)
+    runtime_stats = load_runtime_stats(ns)
 
-    files_to_reduce = get_files_to_reduce(ns.batch, exec_dirs.execdir + ns.test_file, exec_dirs.keptshaderdir)
-    batch_reduction(reducer, compilers_dict, exec_dirs, files_to_reduce, shader_tool, ns.ref, ns.timeout,
-                    double_run=ns.double_run)
+    # Relative files are located in the execution directory (the reductions run in sandboxes)
+    files_to_reduce = get_files_to_reduce(ns.batch, ensure_abs_path(exec_dirs.execdir, ns.test_file),
+                                          exec_dirs.keptshaderdir, ns.representatives)
+    ref = ensure_abs_path(exec_dirs.execdir, ns.ref) if ns.ref != "" else ""
+    batch_reduction(reducer, compilers_dict, exec_dirs, files_to_reduce, shader_tool, ref, ns.timeout,
+                    double_run=ns.double_run, interestingness_server=ns.interestingness_server, jobs=ns.jobs,
+                    time_budget=ns.time_budget, runtime_stats=runtime_stats)
+    if runtime_stats is not None:
+        runtime_stats.save()
 
 
 if __name__ == '__main__':
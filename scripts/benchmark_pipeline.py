@@ -0,0 +1,273 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+
+from automate_reducer import batch_reduction
+from exec_glslsmith import exec_glslsmith
+from utils.Compiler import Compiler
+from utils.DirSettings import DirSettings
+from utils.Instrumentation import instrumentation, Instrumentation
+from utils.Reconditioner import Reconditioner
+from utils.Reducer import Reducer
+from utils.ShaderTool import ShaderTool
+
+# Stand-ins of the generator, the reconditioner, ShaderTrap and amber (see the header of each tool for its settings)
+FAKE_TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata", "fake_tools")
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Stages spent in the external tools, the remaining time of a sequential batch is spent in the scripts
+TOOL_STAGES = ["generation", "reconditioning", "driver"]
+
+
+@contextmanager
+def tool_settings(generator_latency=0, recondition_latency=0, driver_latency=0, shader_size=0, buffer_size=0):
+    # The fake tools read their settings from the environment they inherit
+    settings = {"FAKE_GENERATOR_LATENCY": generator_latency, "FAKE_RECONDITION_LATENCY": recondition_latency,
+                "FAKE_DRIVER_LATENCY": driver_latency, "FAKE_SHADER_SIZE": shader_size,
+                "FAKE_BUFFER_SIZE": buffer_size}
+    previous = {name: os.environ.get(name) for name in settings}
+    os.environ.update({name: str(value) for name, value in settings.items()})
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def prepare_environment(work_dir):
+    # Directories of a run located in work_dir, the fake drivers are exposed at the location of the graphicsfuzz ones
+    drivers = os.path.join(work_dir, "graphicsfuzz", "graphicsfuzz", "target", "graphicsfuzz", "python", "drivers")
+    os.makedirs(drivers)
+    for tool in os.listdir(FAKE_TOOLS):
+        if tool.startswith("glslsmith-"):
+            os.symlink(os.path.join(FAKE_TOOLS, tool), os.path.join(drivers, tool))
+    directories = []
+    for directory in ["execdir", "shaderoutput", "bufferoutput", "keptbuffers", "keptshaders"]:
+        os.makedirs(os.path.join(work_dir, directory))
+        directories.append(os.path.join(work_dir, directory, ""))
+    execdir, shaderoutput, dumpbufferdir, keptbufferdir, keptshaderdir = directories
+    # The interestingness tests of the reductions call the scripts from the execution directory
+    os.symlink(SCRIPTS_DIR, execdir + "scripts")
+    return DirSettings(os.path.join(work_dir, "graphicsfuzz", ""), execdir, shaderoutput, dumpbufferdir,
+                       keptbufferdir, keptshaderdir)
+
+
+def build_shader_tool(host):
+    return ShaderTool(host, os.path.join(FAKE_TOOLS, host), "." + host)
+
+
+def build_compilers(host, compiler_count, differing=1):
+    # The last differing compilers disagree with the others on every shader, so that the shaders are kept
+    # ShaderTrap selects the compiler by renderer, amber by ICD (the fake tools read the same substrings)
+    Compiler.available_syscode = 1
+    compilers_dict = {}
+    for i in range(compiler_count):
+        name = "compiler_" + str(i)
+        behaviour = name + " differ" if i >= compiler_count - differing else name
+        if host == "amber":
+            compilers_dict[name] = Compiler(name, name, "independent", " ", behaviour, [])
+        else:
+            compilers_dict[name] = Compiler(name, behaviour, "independent", " ", " ", [])
+    return compilers_dict
+
+
+def build_reducer(checks):
+    # Runs the interestingness test a fixed number of times and keeps the shader as it is
+    return Reducer("benchmark", "bash -c 'for i in $(seq " + str(checks) + "); do bash interesting.sh; done; "
+                                "cp test.comp test_reduced_final.comp'", "interesting.sh", "test.comp",
+                   "test_reduced_final.comp", [])
+
+
+def memory_usage(trace_memory):
+    # Peak of the python allocations of the scenario (traced) or of the resident memory of the process, in MB
+    if trace_memory:
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def stage_totals(batch_totals):
+    # {stage: (wall, cpu)} summed over the compilers
+    totals = {}
+    for (stage, _), (_, wall, cpu) in batch_totals.items():
+        total_wall, total_cpu = totals.get(stage, (0, 0))
+        totals[stage] = (total_wall + wall, total_cpu + cpu)
+    return totals
+
+
+def run_scenario(host, shader_count, compiler_count, differing=1, jobs=1, compile_jobs=1, pipeline_chunk=0,
+                 reductions=0, reduction_checks=5, trace_memory=False, verbose=False):
+    work_dir = tempfile.mkdtemp(prefix="glslsmith_benchmark_")
+    if trace_memory:
+        tracemalloc.start()
+    instrumentation.start()
+    try:
+        exec_dirs = prepare_environment(work_dir)
+        shader_tool = build_shader_tool(host)
+        compilers_dict = build_compilers(host, compiler_count, differing)
+        with open(os.devnull, "w") as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+            start = time.perf_counter()
+            reconditioner = Reconditioner(exec_dirs.graphicsfuzz)
+            exec_glslsmith(exec_dirs, compilers_dict, None, shader_tool, 0, shader_count,
+                           compile_jobs=compile_jobs, jobs=jobs, reconditioner=reconditioner,
+                           pipeline_chunk=pipeline_chunk)
+            wall = time.perf_counter() - start
+            stages = stage_totals(instrumentation.batch_totals)
+            kept_shaders = sorted(exec_dirs.keptshaderdir + file for file in os.listdir(exec_dirs.keptshaderdir))
+            reduction_wall = None
+            if reductions > 0 and kept_shaders:
+                start = time.perf_counter()
+                batch_reduction(build_reducer(reduction_checks), compilers_dict, exec_dirs,
+                                kept_shaders[:reductions], shader_tool)
+                reduction_wall = time.perf_counter() - start
+        memory = memory_usage(trace_memory)
+    finally:
+        instrumentation.stop()
+        if trace_memory:
+            tracemalloc.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    # The stages overlap when anything runs concurrently, the time left to the scripts is then unknown
+    sequential = jobs == 1 and compile_jobs == 1 and pipeline_chunk == 0
+    return {"host": host, "shaders": shader_count, "compilers": compiler_count, "wall": wall,
+            "shaders_per_second": shader_count / wall,
+            "stages": {stage: {"wall": stage_wall / shader_count, "cpu": stage_cpu / shader_count}
+                       for stage, (stage_wall, stage_cpu) in stages.items()},
+            "overhead": (wall - sum(stages.get(stage, (0, 0))[0] for stage in TOOL_STAGES)) / shader_count
+            if sequential else None,
+            "reduction_check": reduction_wall / (min(reductions, len(kept_shaders)) * reduction_checks)
+            if reduction_wall is not None else None,
+            "memory": memory}
+
+
+def scenario_key(result):
+    return result["host"] + "/" + str(result["shaders"]) + "x" + str(result["compilers"])
+
+
+def print_results(results):
+    stages = [stage for stage in Instrumentation.stages if any(stage in result["stages"] for result in results)]
+    header = ["scenario", "shaders/s", "overhead"] + stages + ["check", "memory"]
+    rows = []
+    for result in results:
+        rows.append([scenario_key(result), "{:.2f}".format(result["shaders_per_second"]),
+                     milliseconds(result["overhead"])]
+                    + [milliseconds(result["stages"][stage]["wall"]) if stage in result["stages"] else "-"
+                       for stage in stages]
+                    + [milliseconds(result["reduction_check"]), "{:.1f}MB".format(result["memory"])])
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+    print("Stages, overhead (time spent in the scripts) and checks in milliseconds per shader / per check")
+
+
+def milliseconds(duration):
+    return "{:.1f}".format(duration * 1000) if duration is not None else "-"
+
+
+def find_regressions(results, baseline, tolerance):
+    # Scenarios whose throughput dropped by more than the tolerance (a fraction) compared to the baseline
+    baseline_throughput = {scenario_key(result): result["shaders_per_second"] for result in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_throughput.get(scenario_key(result))
+        if reference is not None and result["shaders_per_second"] < reference * (1 - tolerance):
+            regressions.append((scenario_key(result), reference, result["shaders_per_second"]))
+    return regressions
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scripts end to end on stand-ins of the generator, the "
+                                                 "reconditioner and the shader tools (no GPU nor generator needed)")
+    parser.add_argument('--batch-sizes', dest="batch_sizes", default="10,50", type=parse_list,
+                        help="Comma-separated numbers of shaders per batch (by default: 10,50)")
+    parser.add_argument('--compiler-counts', dest="compiler_counts", default="2,4", type=parse_list,
+                        help="Comma-separated numbers of compilers (by default: 2,4)")
+    parser.add_argument('--hosts', dest="hosts", default="shadertrap",
+                        help="Comma-separated shader tools among shadertrap and amber (by default: shadertrap)")
+    parser.add_argument('--differing', dest="differing", default=1, type=int,
+                        help="Number of compilers disagreeing with the others, 0 to keep no shader (by default: 1)")
+    parser.add_argument('--jobs', dest="jobs", default=1, type=int, help="See exec_glslsmith.py (by default: 1)")
+    parser.add_argument('--compile-jobs', dest="compile_jobs", default=1, type=int,
+                        help="See exec_glslsmith.py (by default: 1)")
+    parser.add_argument('--pipeline-chunk', dest="pipeline_chunk", default=0, type=int,
+                        help="See exec_glslsmith.py (by default: 0)")
+    parser.add_argument('--reductions', dest="reductions", default=0, type=int,
+                        help="Number of kept shaders reduced after each batch (by default: 0)")
+    parser.add_argument('--reduction-checks', dest="reduction_checks", default=5, type=int,
+                        help="Number of interestingness checks of each reduction (by default: 5)")
+    parser.add_argument('--generator-latency', dest="generator_latency", default=0, type=float,
+                        help="Time taken by the generator per shader in seconds (by default: 0)")
+    parser.add_argument('--recondition-latency', dest="recondition_latency", default=0, type=float,
+                        help="Time taken by the reconditioner per shader in seconds (by default: 0)")
+    parser.add_argument('--driver-latency', dest="driver_latency", default=0, type=float,
+                        help="Time taken by the shader tool per execution in seconds (by default: 0)")
+    parser.add_argument('--shader-size', dest="shader_size", default=0, type=int,
+                        help="Minimum size of the generated shaders in bytes (by default: as small as possible)")
+    parser.add_argument('--buffer-size', dest="buffer_size", default=0, type=int,
+                        help="Minimum size of each dumped buffer in bytes (by default: as small as possible)")
+    parser.add_argument('--repeat', dest="repeat", default=1, type=int,
+                        help="Number of runs of each scenario, the fastest one is reported (by default: 1)")
+    parser.add_argument('--trace-memory', dest="trace_memory", action="store_true",
+                        help="Report the peak of the python allocations of each scenario (slows the scripts down) "
+                             "instead of the peak resident memory of the process")
+    parser.add_argument('--output', dest="output", default="", help="Write the results to the given JSON file")
+    parser.add_argument('--baseline', dest="baseline", default="",
+                        help="Compare the throughput to the results of a previous --output and exit with 1 on a "
+                             "regression")
+    parser.add_argument('--tolerance', dest="tolerance", default=0.2, type=float,
+                        help="Throughput drop tolerated compared to the baseline (by default: 0.2)")
+    parser.add_argument('--verbose', dest="verbose", action="store_true", help="Show the output of the scripts")
+    ns = parser.parse_args(sys.argv[1:])
+
+    results = []
+    with tool_settings(ns.generator_latency, ns.recondition_latency, ns.driver_latency, ns.shader_size,
+                       ns.buffer_size):
+        for host in ns.hosts.split(","):
+            for compiler_count in ns.compiler_counts:
+                for shader_count in ns.batch_sizes:
+                    runs = [run_scenario(host, shader_count, compiler_count, ns.differing, ns.jobs, ns.compile_jobs,
+                                         ns.pipeline_chunk, ns.reductions, ns.reduction_checks, ns.trace_memory,
+                                         ns.verbose) for _ in range(ns.repeat)]
+                    results.append(min(runs, key=lambda run: run["wall"]))
+                    print("Benchmarked " + scenario_key(results[-1]))
+    print_results(results)
+    if ns.output != "":
+        with open(ns.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if ns.baseline != "":
+        with open(ns.baseline, "r") as f:
+            regressions = find_regressions(results, json.load(f), ns.tolerance)
+        for scenario, reference, throughput in regressions:
+            print("Regression on " + scenario + ": " + "{:.2f}".format(throughput) + " shaders/s instead of " +
+                  "{:.2f}".format(reference))
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,8 @@ import os
 
 import reduction_helper
 from utils.file_utils import ensure_abs_path
-from utils.execution_utils import env_setup
+from utils.Configuration import env_setup
+from utils.ResultCache import ResultCache
 
 
 # TODO rewrite this to make a double dispatch to a python script from the shell (testing will be easier)
@@ -34,21 +35,26 @@ def main():
     parser.add_argument('--double_run', dest="double_run", action="store_true",
                         help="Run the program twice eliminating useless wrappers on the second run")
     parser.add_argument('--ref', type=int, dest="ref", default=-1, help="TODO")
+    parser.add_argument('--result-cache', dest="result_cache", default="",
+                        help="Directory of the execution result cache used by the interestingness test (by default: "
+                             "no cache)")
 
     ns, exec_dirs, compilers_dict, reducer, shader_tool = env_setup(parser)
 
     build_shell_test(compilers_dict, exec_dirs, shader_tool, ns.harness, ns.shader, ns.ref, ns.shellname,
-                     double_run=ns.double_run)
+                     double_run=ns.double_run, result_cache_dir=ns.result_cache)
 
 
 def build_shell_test(compilers_dict, exec_dirs, shader_tool, harness_name, shader_name, ref, shell_file,
                      double_run=False,
-                     log_name="reduction.log"):
+                     log_name="reduction.log", result_cache_dir="", server_socket="", runtime_stats=None):
     # Collect error code from the reduction process
     shell_file = ensure_abs_path(exec_dirs.execdir, shell_file)
     try:
+        result_cache = ResultCache(result_cache_dir) if result_cache_dir != "" else None
         reduction_helper.execute_reduction(compilers_dict, exec_dirs, shader_tool, harness_name, ref, True,
-                                           double_run=double_run, postprocessing=True)
+                                           double_run=double_run, postprocessing=True, result_cache=result_cache,
+                                           runtime_stats=runtime_stats)
     except SystemExit as e:
         error_code = str(e)
         print(error_code)
@@ -79,6 +85,13 @@ def build_shell_test(compilers_dict, exec_dirs, shader_tool, harness_name, shade
                         "SHADER_ROOT=$(echo $1 | sed -e 's/\\.[^.]*$//')\n" +
                         "SHADER=\"${SHADER_ROOT}.comp\"\n" +
                         "fi\n")
+            if server_socket != "":
+                # The checks are done by the interestingness server of the reduction, the shim exits with 0 if the
+                # shader is interesting
+                shell.write("exec python3 ${ROOT}/scripts/interestingness_client.py " + server_socket
+                            + " \"$SHADER\"\n")
+                shell.close()
+                return str(error_code)
             # Logging
             shell.write("python3 ${ROOT}/scripts/benchmark_helper.py --log ${ROOT}/" + log_name + "\n")
 
@@ -99,6 +112,10 @@ def build_shell_test(compilers_dict, exec_dirs, shader_tool, harness_name, shade
                 option = " --double-run"
             else:
                 option = ""
+            if result_cache_dir != "":
+                option += " --result-cache " + os.path.abspath(result_cache_dir)
+            # The compilers are only launched while the error code of the original shader can still be obtained
+            option += " --expected-error-code \"$ERROR_CODE\""
             shell.write("ERROR_CODE_IN_FILE=$( (python3 ${ROOT}/scripts/reduction_helper.py --config-file ${"
                         "ROOT}/scripts/config.xml --shader-name ${ROOT}/" + harness_name + " --host " + shader_tool.name
                         + option + " 2>&1 > /dev/null) || true)\n")
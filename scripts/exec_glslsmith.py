@@ -14,14 +14,31 @@
 
 import argparse
 import os
+import queue
 import shutil
+import socket
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
 import automate_reducer
 import splitter_merger
-from utils.analysis_utils import comparison_helper, attribute_compiler_results
-from utils.execution_utils import execute_compilation, call_glslsmith_generator, env_setup, \
-    call_glslsmith_reconditioner, single_compile
-from utils.file_utils import find_compiler_buffer_file, clean_files
+from fuzzing_coordinator import CoordinatorClient
+from reduction_helper import identify_crashes, difference_error_code
+from utils.BatchJournal import BatchJournal, journal
+from utils.analysis_utils import comparison_helper, attribute_compiler_results, finding_signature
+from utils.Configuration import env_setup
+from utils.execution_utils import execute_compilation, call_glslsmith_generator, call_glslsmith_reconditioner, \
+    single_compile
+from utils.file_utils import find_compiler_buffer_file, clean_files, find_generated_shaders
+from utils.Instrumentation import instrumentation
+from utils.Reconditioner import Reconditioner, is_reconditioned
+from utils.ResultCache import ResultCache
+from utils.ResultsIndex import ResultsIndex
+from utils.RuntimeStats import add_runtime_stats_arguments, load_runtime_stats
+from utils.SeedLedger import SeedLedger
 
 
 def validate_compiler(exec_dir, compiler, shader_tool):
@@ -37,18 +54,22 @@ def validate_compiler(exec_dir, compiler, shader_tool):
     return message
 
 
-def glsl_output(exec_dir, graphicsfuzz, shaderoutput, shader_tool, current_seed):
+def glsl_output(exec_dir, graphicsfuzz, shaderoutput, shader_tool, current_seed, reconditioner=None):
     # Give the files their seed name
     reconditioned_path = shaderoutput + "test_" + str(
         current_seed) + "_re" + shader_tool.file_extension
     glsl_path = shaderoutput + "test_" + current_seed + "_re" + ".comp"
-    # Recondition the shader
-    check, message = call_glslsmith_reconditioner(graphicsfuzz, exec_dir, shaderoutput + "test_" + str(
-        current_seed) + shader_tool.file_extension, reconditioned_path)
-    if not check:
-        print(message)
-        print("Shader " + current_seed + " cannot be parsed for post-processing")
-        exit(1)
+    # Recondition the shader (unless it has already been reconditioned with its batch)
+    shader_path = shaderoutput + "test_" + str(current_seed) + shader_tool.file_extension
+    if not is_reconditioned(shader_path, reconditioned_path):
+        if reconditioner is not None:
+            check, message = reconditioner.recondition(exec_dir, shader_path, reconditioned_path)
+        else:
+            check, message = call_glslsmith_reconditioner(graphicsfuzz, exec_dir, shader_path, reconditioned_path)
+        if not check:
+            print(message)
+            print("Shader " + current_seed + " cannot be parsed for post-processing")
+            exit(1)
     splitter_merger.split(shader_tool, reconditioned_path, glsl_path)
 
 
@@ -62,44 +83,236 @@ def syntax_check(compiler, exec_dir, graphicsfuzz, shaderoutput, shader_tool, cu
         print("Shader " + current_seed + " validated")
 
 
-def write_output_to_file(text, location):
-    with open(location, "r") as f:
-        lines = f.readlines()
-        lines.insert(1, text)
-    with open(location, "w") as f:
-        f.writelines(lines)
-
-
 def save_test_case(kept_shader_dir, dump_buffer_dir, kept_buffer_dir, compilers_dict, shader_location, current_seed,
-                   shader_tool):
+                   shader_tool, groups=None, error_code=None, timings=None, signature=None):
     # Move test
     shutil.move(shader_location,
                 kept_shader_dir + current_seed + shader_tool.file_extension)
 
     # Move buffers
+    kept_buffers = {}
     for compiler_name in compilers_dict:
-        shutil.move(dump_buffer_dir + compiler_name + "_" + current_seed + ".txt",
-                    kept_buffer_dir + compiler_name + "_" + current_seed + ".txt")
+        kept_buffers[compiler_name] = kept_buffer_dir + compiler_name + "_" + current_seed + ".txt"
+        shutil.move(dump_buffer_dir + compiler_name + "_" + current_seed + ".txt", kept_buffers[compiler_name])
 
+    # Register the test case in the results index of the output directory, the kept shader is left as generated and
+    # its attribution (responsible compiler(s), error code) is only recorded in the index
+    if groups is None:
+        groups = comparison_helper(list(kept_buffers.values()))
+    ResultsIndex(ResultsIndex.location(kept_shader_dir)).record(
+        current_seed, attribute_compiler_results(groups, compilers_dict), groups, kept_buffers,
+        kept_shader_dir + current_seed + shader_tool.file_extension, error_code, timings, signature)
 
-def exec_glslsmith(exec_dirs, compilers_dict, reducer, shader_tool, seed, shader_count, syntax_only=False, reduce=False,
-                   run_type="standard", glsl_only=False):
-    # go to generation location
-    if seed != -1:
-        seed = seed
+
+def pending_seeds(seeds, resumed=None):
+    # Seeds of a resumed batch which were not executed to completion
+    if resumed is None:
+        return seeds
+    return [current_seed for current_seed in seeds if current_seed not in resumed.completed]
+
+
+def already_generated(exec_dirs, shader_tool, seeds, resumed=None):
+    # The shaders generated before the interruption of a resumed batch are not generated again
+    return resumed is not None and all(
+        current_seed in resumed.generated and
+        os.path.isfile(exec_dirs.shaderoutput + "test_" + current_seed + shader_tool.file_extension)
+        for current_seed in seeds)
+
+
+def clean_interrupted_seeds(exec_dirs, compilers_dict, shader_tool, resumed):
+    # Remove what the interrupted seeds left behind: buffers in dumpbufferdir, test cases partially moved to
+    # keptshaderdir / keptbufferdir (their shader, kept as generated, is moved back to shaderoutput so that the rest of
+    # the batch is not generated again), their rows of the results index (a seed may be interrupted between its
+    # registration and the end of its saving) and the copies of the execution directory
+    interrupted_seeds = []
+    for i in range(resumed.shader_count):
+        current_seed = str(resumed.seed + i)
+        if current_seed in resumed.completed:
+            continue
+        interrupted_seeds.append(current_seed)
+        kept_shader = exec_dirs.keptshaderdir + current_seed + shader_tool.file_extension
+        if os.path.isfile(kept_shader):
+            shutil.move(kept_shader, exec_dirs.shaderoutput + "test_" + current_seed + shader_tool.file_extension)
+        for compiler_name in compilers_dict:
+            for buffer_dir in [exec_dirs.dumpbufferdir, exec_dirs.keptbufferdir]:
+                if os.path.isfile(buffer_dir + compiler_name + "_" + current_seed + ".txt"):
+                    os.remove(buffer_dir + compiler_name + "_" + current_seed + ".txt")
+        for sandbox in os.listdir(exec_dirs.execdir):
+            if sandbox.startswith("seed_" + current_seed + "_"):
+                shutil.rmtree(exec_dirs.execdir + sandbox, ignore_errors=True)
+    if interrupted_seeds and os.path.isfile(ResultsIndex.location(exec_dirs.keptshaderdir)):
+        ResultsIndex(ResultsIndex.location(exec_dirs.keptshaderdir)).forget(interrupted_seeds)
+
+
+def execute_seed(exec_dirs, compilers_dict, shader_tool, current_seed, run_type="standard", compile_jobs=1,
+                 reconditioner=None, harness=None, result_cache=None, runtime_stats=None):
+    # The stages of the seed are recorded with it (instrumentation)
+    with instrumentation.seed(current_seed):
+        return compile_and_compare(exec_dirs, compilers_dict, shader_tool, current_seed, run_type, compile_jobs,
+                                   reconditioner, harness, result_cache, runtime_stats)
+
+
+def compile_and_compare(exec_dirs, compilers_dict, shader_tool, current_seed, run_type="standard", compile_jobs=1,
+                        reconditioner=None, harness=None, result_cache=None, runtime_stats=None):
+    # Clean the execution platform and execute compilation
+    clean_files(exec_dirs.execdir, find_compiler_buffer_file(exec_dirs.execdir, compilers_dict))
+    clean_files(exec_dirs.execdir, ["tmp" + shader_tool.file_extension])
+    shader_location = exec_dirs.shaderoutput + "test_" + current_seed + shader_tool.file_extension
+    execution_start = time.perf_counter()
+    # Shaders reconditioned with their batch only need to go through the drivers
+    if harness is not None:
+        results = execute_compilation(compilers_dict, exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool, harness,
+                                      current_seed, exec_dirs.dumpbufferdir, "no_postprocessing",
+                                      compile_jobs=compile_jobs, result_cache=result_cache, runtime_stats=runtime_stats)
     else:
-        seed = int(time.time())
+        results = execute_compilation(compilers_dict, exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool,
+                                      shader_location,
+                                      current_seed, exec_dirs.dumpbufferdir, run_type, compile_jobs=compile_jobs,
+                                      reconditioner=reconditioner, result_cache=result_cache,
+                                      runtime_stats=runtime_stats)
+    timings = {"execution": time.perf_counter() - execution_start}
+    journal.executed(current_seed)
 
-    # generate programs and seed reporting
-    check, message = call_glslsmith_generator(exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_count,
-                                              exec_dirs.shaderoutput, seed, shader_tool)
-    if not check:
-        print(message)
+    # Compare outputs and save buffers
+    # Reference buffers for a given shader instance
+    buffers_files = []
+    for compiler_name in compilers_dict:
+        buffers_files.append(exec_dirs.dumpbufferdir + compiler_name + "_" + current_seed + ".txt")
+    # Compare and check back the results from the buffers
+    comparison_start = time.perf_counter()
+    with instrumentation.stage("comparison"):
+        values = comparison_helper(buffers_files)
+    timings["comparison"] = time.perf_counter() - comparison_start
+    journal.compared(current_seed, len(values) != 1)
+    if len(values) != 1:
+        print("Differences on shader: " + current_seed)
+        with instrumentation.stage("saving"):
+            # Same error code as the one the reduction of the shader looks for
+            error_code = identify_crashes(results, list(compilers_dict.values()))
+            if error_code == "0":
+                error_code = difference_error_code(values, compilers_dict)
+            # Findings of the same bug share their signature (see automate_reducer --representatives)
+            signature = finding_signature(error_code, attribute_compiler_results(values, compilers_dict),
+                                          {compiler_name: message for compiler_name, message
+                                           in zip(compilers_dict, results) if message not in ["no_crash", "timeout"]})
+            # Save the relevant buffers and shaders
+            save_test_case(exec_dirs.keptshaderdir, exec_dirs.dumpbufferdir, exec_dirs.keptbufferdir, compilers_dict,
+                           shader_location, current_seed, shader_tool, values, error_code, timings, signature)
+        journal.saved(current_seed)
+        return True
+    return False
+
+
+def execute_seed_in_sandbox(exec_dirs, compilers_dict, shader_tool, current_seed, run_type="standard",
+                            compile_jobs=1, reconditioner=None, harness=None, result_cache=None, runtime_stats=None):
+    # Each seed gets its own copy of the execution directory (tmp harness, buffer_results.txt and compiler buffers)
+    sandbox = tempfile.mkdtemp(prefix="seed_" + current_seed + "_", dir=exec_dirs.execdir) + "/"
+    try:
+        return execute_seed(exec_dirs.resolve(sandbox), compilers_dict, shader_tool, current_seed, run_type,
+                            compile_jobs, reconditioner, harness, result_cache, runtime_stats)
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def generate_chunks(exec_dirs, shader_tool, seed, shader_count, chunk_size, run_type, reconditioner, seed_queue,
+                    consumers, errors, resumed=None):
+    # Generate (and recondition) the batch chunk by chunk, each seed is handed over to the execution once generated
+    try:
+        for chunk_start in range(0, shader_count, chunk_size):
+            chunk_count = min(chunk_size, shader_count - chunk_start)
+            seeds = pending_seeds([str(seed + chunk_start + i) for i in range(chunk_count)], resumed)
+            if not seeds:
+                continue
+            if not already_generated(exec_dirs, shader_tool, seeds, resumed):
+                with instrumentation.stage("generation"):
+                    check, message = call_glslsmith_generator(exec_dirs.graphicsfuzz, exec_dirs.execdir, chunk_count,
+                                                              exec_dirs.shaderoutput, seed + chunk_start, shader_tool)
+                if not check:
+                    errors.append(message)
+                    return
+                print("Generation of " + str(chunk_count) + " shaders with seed:" + str(seed + chunk_start) + " done")
+                journal.generated(seeds)
+            shaders = find_generated_shaders(exec_dirs.shaderoutput, shader_tool.file_extension, seeds)
+            harnesses = {}
+            if run_type == "standard":
+                with instrumentation.stage("reconditioning"):
+                    harnesses = reconditioner.recondition_batch(exec_dirs.execdir, shaders, shader_tool)
+            for current_seed, shader in zip(seeds, shaders):
+                seed_queue.put((current_seed, harnesses.get(shader)))
+    finally:
+        # One end marker per consumer
+        for _ in range(consumers):
+            seed_queue.put(None)
+
+
+def consume_seeds(seed_queue, exec_dirs, compilers_dict, shader_tool, run_type, compile_jobs, reconditioner,
+                  isolated, result_cache=None, runtime_stats=None):
+    kept_seeds = []
+    while True:
+        item = seed_queue.get()
+        if item is None:
+            return kept_seeds
+        current_seed, harness = item
+        if isolated:
+            kept = execute_seed_in_sandbox(exec_dirs, compilers_dict, shader_tool, current_seed, run_type,
+                                           compile_jobs, reconditioner, harness, result_cache, runtime_stats)
+        else:
+            kept = execute_seed(exec_dirs, compilers_dict, shader_tool, current_seed, run_type, compile_jobs,
+                                reconditioner, harness, result_cache, runtime_stats)
+        if kept:
+            kept_seeds.append(current_seed)
+
+
+def execute_pipeline(exec_dirs, compilers_dict, shader_tool, seed, shader_count, run_type, compile_jobs, jobs,
+                     reconditioner, chunk_size, result_cache=None, runtime_stats=None, resumed=None):
+    # The generator runs in the background while the seeds are executed, the queue bounds the generated backlog
+    seed_queue = queue.Queue(maxsize=2 * chunk_size)
+    errors = []
+    producer = threading.Thread(target=generate_chunks, args=(exec_dirs, shader_tool, seed, shader_count, chunk_size,
+                                                              run_type, reconditioner, seed_queue, jobs, errors,
+                                                              resumed),
+                                daemon=True)
+    producer.start()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        consumers = [executor.submit(consume_seeds, seed_queue, exec_dirs, compilers_dict, shader_tool, run_type,
+                                     compile_jobs, reconditioner, jobs > 1, result_cache, runtime_stats)
+                     for _ in range(jobs)]
+        kept_seeds = [current_seed for consumer in consumers for current_seed in consumer.result()]
+    producer.join()
+    if errors:
+        print(errors[0])
         exit(1)
-    print("Generation of " + str(shader_count) + " shaders with seed:" + str(seed) + " done")
+    return sorted(kept_seeds, key=int)
+
+
+def generate_and_execute(exec_dirs, compilers_dict, shader_tool, seed, shader_count, syntax_only, run_type, glsl_only,
+                         compile_jobs, jobs, reconditioner, result_cache=None, runtime_stats=None, resumed=None):
+    # generate programs and seed reporting
+    seeds = pending_seeds([str(seed + i) for i in range(shader_count)], resumed)
+    if not already_generated(exec_dirs, shader_tool, seeds, resumed):
+        with instrumentation.stage("generation"):
+            check, message = call_glslsmith_generator(exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_count,
+                                                      exec_dirs.shaderoutput, seed, shader_tool)
+        if not check:
+            print(message)
+            exit(1)
+        print("Generation of " + str(shader_count) + " shaders with seed:" + str(seed) + " done")
+        journal.generated(seeds)
+
+    # Pre-recondition the batch (one driver process per shader), the harnesses are cached until their shader changes
+    harnesses = {}
+    if glsl_only or (run_type == "standard" and not syntax_only):
+        with instrumentation.stage("reconditioning"):
+            harnesses = reconditioner.recondition_batch(
+                exec_dirs.execdir, find_generated_shaders(exec_dirs.shaderoutput, shader_tool.file_extension, seeds),
+                shader_tool)
+    harnesses = [harnesses.get(exec_dirs.shaderoutput + "test_" + current_seed + shader_tool.file_extension)
+                 for current_seed in seeds]
+
     if glsl_only:
         for i in range(shader_count):
-            glsl_output(exec_dirs.execdir, exec_dirs.graphicsfuzz, exec_dirs.shaderoutput, shader_tool, str(seed + i))
+            glsl_output(exec_dirs.execdir, exec_dirs.graphicsfuzz, exec_dirs.shaderoutput, shader_tool, str(seed + i),
+                        reconditioner)
         print("Shaders successfully reconditioned and formatted as glsl")
         exit(0)
 
@@ -118,40 +331,133 @@ def exec_glslsmith(exec_dirs, compilers_dict, reducer, shader_tool, seed, shader
         exit(0)
 
     # Execute program compilation on each compiler and save the results for the batch
-    identified_shaders = []
-    for i in range(shader_count):
-        current_seed = str(seed + i)
-        # Clean the execution platform and execute compilation
-        clean_files(exec_dirs.execdir, find_compiler_buffer_file(exec_dirs.execdir, compilers_dict))
-        clean_files(exec_dirs.execdir, ["tmp" + shader_tool.file_extension])
-        shader_location = exec_dirs.shaderoutput + "test_" + current_seed + shader_tool.file_extension
-        _ = execute_compilation(compilers_dict, exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool,
-                                shader_location,
-                                current_seed, exec_dirs.dumpbufferdir, run_type)
-
-        # Compare outputs and save buffers
-        # Reference buffers for a given shader instance
-        buffers_files = []
-        for compiler_name in compilers_dict:
-            buffers_files.append(exec_dirs.dumpbufferdir + compiler_name + "_" + current_seed + ".txt")
-        # Compare and check back the results from the buffers
-        values = comparison_helper(buffers_files)
-        if len(values) != 1:
-            print("Differences on shader: " + current_seed)
-            # Register the shader for eventual reduction
-            identified_shaders.append(exec_dirs.keptshaderdir + current_seed + shader_tool.file_extension)
-            # Add a name comment in the shader to identify easily the responsible compiler(s)
-            write_output_to_file("# " + attribute_compiler_results(values, compilers_dict) + "\n", shader_location)
-            # Save the relevant buffers and shaders
-            save_test_case(exec_dirs.keptshaderdir, exec_dirs.dumpbufferdir, exec_dirs.keptbufferdir, compilers_dict,
-                           shader_location, current_seed, shader_tool)
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            kept = list(executor.map(execute_seed_in_sandbox, repeat(exec_dirs), repeat(compilers_dict),
+                                     repeat(shader_tool), seeds, repeat(run_type), repeat(compile_jobs),
+                                     repeat(reconditioner), harnesses, repeat(result_cache), repeat(runtime_stats)))
+    else:
+        kept = [execute_seed(exec_dirs, compilers_dict, shader_tool, current_seed, run_type, compile_jobs,
+                             reconditioner, harness, result_cache, runtime_stats)
+                for current_seed, harness in zip(seeds, harnesses)]
+    return [current_seed for current_seed, kept_seed in zip(seeds, kept) if kept_seed]
+
+
+def exec_glslsmith(exec_dirs, compilers_dict, reducer, shader_tool, seed, shader_count, syntax_only=False, reduce=False,
+                   run_type="standard", glsl_only=False, compile_jobs=1, jobs=1, reconditioner=None,
+                   pipeline_chunk=0, result_cache=None, runtime_stats=None, resumed=None, seed_ledger=None):
+    # go to generation location
+    if resumed is not None:
+        # The interrupted batch is executed again without its completed seeds
+        seed = resumed.seed
+        shader_count = resumed.shader_count
+        print("Resuming the batch with seed:" + str(seed) + " (" + str(len(resumed.completed)) + " of " +
+              str(shader_count) + " shaders already executed)")
+        clean_interrupted_seeds(exec_dirs, compilers_dict, shader_tool, resumed)
+        journal.resume_batch(resumed)
+    else:
+        # Without a given seed, the batch gets seeds not explored yet by the batches of the host (seed ledger)
+        if seed != -1:
+            if seed_ledger is not None:
+                seed_ledger.record(seed, shader_count)
+        elif seed_ledger is not None:
+            seed = seed_ledger.allocate(shader_count)
+        else:
+            seed = int(time.time())
+        journal.start_batch(seed, shader_count)
+    if reconditioner is None:
+        reconditioner = Reconditioner(exec_dirs.graphicsfuzz)
+
+    instrumentation.start_batch()
+    if pipeline_chunk > 0 and not glsl_only and not syntax_only:
+        kept_seeds = execute_pipeline(exec_dirs, compilers_dict, shader_tool, seed, shader_count, run_type,
+                                      compile_jobs, jobs, reconditioner, pipeline_chunk, result_cache, runtime_stats,
+                                      resumed)
+    else:
+        kept_seeds = generate_and_execute(exec_dirs, compilers_dict, shader_tool, seed, shader_count, syntax_only,
+                                          run_type, glsl_only, compile_jobs, jobs, reconditioner, result_cache,
+                                          runtime_stats, resumed)
+    if resumed is not None:
+        kept_seeds = sorted(resumed.kept + kept_seeds, key=int)
+    # Persist the runtimes of the batch
+    if runtime_stats is not None:
+        runtime_stats.save()
+    journal.end_batch()
+    instrumentation.end_batch(shader_count)
+    # Register the shaders for eventual reduction
+    identified_shaders = [exec_dirs.keptshaderdir + current_seed + shader_tool.file_extension
+                          for current_seed in kept_seeds]
 
     clean_files(exec_dirs.execdir, find_compiler_buffer_file(exec_dirs.execdir, compilers_dict))
     clean_files(exec_dirs.execdir, ["tmp" + shader_tool.file_extension])
 
     # reduce with the default reducer if specified
     if reduce:
-        automate_reducer.batch_reduction(reducer, compilers_dict, exec_dirs, identified_shaders, shader_tool)
+        automate_reducer.batch_reduction(reducer, compilers_dict, exec_dirs, identified_shaders, shader_tool,
+                                         runtime_stats=runtime_stats)
+    return kept_seeds
+
+
+def renew_lease(client, work, stop, expired):
+    # The lease is renewed until the batch is over, a worker that stops answering loses its batch
+    # Once the coordinator reports the lease as expired (the range is leased again to another worker), the renewal
+    # stops and expired is set
+    while not stop.wait(work["lease_time"] / 3):
+        try:
+            answer = client.renew(work["lease"])
+        except (OSError, ValueError):
+            continue
+        if not answer.get("ok"):
+            print("Lease on seeds " + str(work["seed"]) + " to " + str(work["seed"] + work["shader_count"] - 1) +
+                  " lost (" + str(answer.get("reason")) + "), the range is executed by another worker")
+            expired.set()
+            return
+
+
+def upload_findings(client, worker_name, exec_dirs, compilers_dict, shader_tool, kept_seeds):
+    # The kept shaders and buffers are uploaded with their metadata in the results index (and kept locally)
+    results_index = ResultsIndex(ResultsIndex.location(exec_dirs.keptshaderdir))
+    for current_seed in kept_seeds:
+        client.upload(worker_name, current_seed, exec_dirs.keptshaderdir + current_seed + shader_tool.file_extension,
+                      {compiler_name: exec_dirs.keptbufferdir + compiler_name + "_" + current_seed + ".txt"
+                       for compiler_name in compilers_dict},
+                      results_index.attribution(current_seed))
+
+
+def run_worker(client, worker_name, exec_dirs, compilers_dict, reducer, shader_tool, reduce=False,
+               run_type="standard", compile_jobs=1, jobs=1, reconditioner=None, pipeline_chunk=0, result_cache=None,
+               runtime_stats=None):
+    # Execute the batches leased by the coordinator until it has no more work
+    while True:
+        work = client.lease(worker_name)
+        if work.get("stop"):
+            print("No more batches from the coordinator")
+            return
+        if "wait" in work:
+            time.sleep(work["wait"])
+            continue
+        if "lease" not in work:
+            print("The coordinator refused to lease a batch: " + str(work.get("reason", work)))
+            return
+        stop = threading.Event()
+        expired = threading.Event()
+        renewal = threading.Thread(target=renew_lease, args=(client, work, stop, expired), daemon=True)
+        renewal.start()
+        try:
+            kept_seeds = exec_glslsmith(exec_dirs, compilers_dict, reducer, shader_tool, work["seed"],
+                                        work["shader_count"], False, reduce, run_type, False, compile_jobs, jobs,
+                                        reconditioner, pipeline_chunk, result_cache, runtime_stats)
+            # The findings of an expired lease are still valid, the coordinator replaces them if uploaded again
+            upload_findings(client, worker_name, exec_dirs, compilers_dict, shader_tool, kept_seeds)
+        finally:
+            stop.set()
+            renewal.join()
+        if expired.is_set():
+            continue
+        answer = client.complete(work["lease"], kept_seeds)
+        if not answer.get("ok"):
+            print("The batch of seed " + str(work["seed"]) + " was not completed by the coordinator (" +
+                  str(answer.get("reason")) + ")")
 
 
 def main():
@@ -160,11 +466,24 @@ def main():
     parser.add_argument('--seed', dest='seed', default=-1, type=int, help="Seed the random generator of GLSLsmith")
     parser.add_argument('--shader-count', dest='shadercount', default=50, type=int,
                         help="Specify the number of test per batch")
+    parser.add_argument('--seed-ledger', dest='seed_ledger', default="",
+                        help="File recording the seeds explored by the batches of the host, batches without a given "
+                             "seed only get unexplored seeds (by default: seeds.json in the glslsmith cache directory)")
     parser.add_argument('--syntax-only', dest='syntaxonly', action='store_true',
                         help="Compile only the first compiler of the provided list to verify the syntax through "
                              "ShaderTrap")
     parser.add_argument('--continuous', dest='continuous', action='store_true',
                         help="Launch the bug finding in never ending mode")
+    parser.add_argument('--coordinator', dest="coordinator", default="",
+                        help="Run as a worker of the given coordinator (HOST:PORT, see fuzzing_coordinator.py): the "
+                             "seeds and the shader count of the batches are leased from it and the kept shaders and "
+                             "buffers are uploaded to it")
+    parser.add_argument('--worker-name', dest="worker_name", default="",
+                        help="Name of the worker reported to the coordinator (by default: host name and process id)")
+    parser.add_argument('--resume', dest="resume", action="store_true",
+                        help="Resume the batch interrupted by the end of a previous run (see glslsmithoutput/"
+                             "journal.jsonl): its executed shaders are skipped and the files left by the interrupted "
+                             "ones are removed")
     parser.add_argument('--reduce', dest="reduce", action="store_true",
                         help="Reduce interesting shaders at the end of a batch")
     parser.add_argument("--reducer", dest="reducer", default="glsl-reduce",
@@ -174,6 +493,27 @@ def main():
     parser.add_argument('--glsl-only', dest="glsl_only", action="store_true",
                         help="Generate the files, recondition them on the go and split out the glsl shader out of the "
                              "harness")
+    parser.add_argument('--jobs', dest="jobs", default=1, type=int,
+                        help="Number of shaders executed concurrently, each one in its own copy of the execution "
+                             "directory (by default: 1)")
+    parser.add_argument('--pipeline-chunk', dest="pipeline_chunk", default=0, type=int,
+                        help="Generate the batch by chunks of the given size in the background and execute each "
+                             "shader as soon as it is generated (by default: 0, the whole batch is generated first)")
+    parser.add_argument('--result-cache', dest="result_cache", default="",
+                        help="Directory of the execution result cache, a harness already executed with the same "
+                             "compiler settings and drivers is not executed again (by default: no cache)")
+    parser.add_argument('--result-cache-size', dest="result_cache_size", default=10000, type=int,
+                        help="Maximum number of results kept in the execution result cache (by default: 10000)")
+    parser.add_argument('--compile-jobs', dest="compile_jobs", default=1, type=int,
+                        help="Number of compilers executed concurrently on each shader (by default: 1)")
+    add_runtime_stats_arguments(parser)
+    parser.add_argument('--timings', dest="timings", default="",
+                        help="Record the wall and CPU time of each stage (generation, reconditioning, driver, "
+                             "concatenation, comparison, saving) by seed and compiler in the given JSONL file and "
+                             "print a summary at the end of each batch")
+    parser.add_argument('--prometheus-file', dest="prometheus_file", default="",
+                        help="Export the stage timings and the throughput to the given file at the end of each batch "
+                             "(Prometheus textfile collector format)")
 
     ns, exec_dirs, compilers_dict, reducer, shader_tool = env_setup(parser)
     batch_nb = 1
@@ -186,12 +526,37 @@ def main():
             validate_compiler(exec_dirs.execdir, compiler, shader_tool)
         print("Compilers validated")
 
-    while batch_nb == 1 or ns.continuous:
+    result_cache = ResultCache(ns.result_cache, ns.result_cache_size) if ns.result_cache != "" else None
+    runtime_stats = load_runtime_stats(ns)
+    if ns.timings != "" or ns.prometheus_file != "":
+        instrumentation.start(ns.timings, ns.prometheus_file)
+    seed_ledger = SeedLedger(ns.seed_ledger if ns.seed_ledger != "" else SeedLedger.default_location())
+    # The progress of the batches is journaled to resume them after an interruption
+    resumed = None
+    if not ns.glsl_only and not ns.syntaxonly:
+        journal.start(BatchJournal.location(exec_dirs.keptshaderdir))
+        # The batches of the workers are resumed by the coordinator
+        resumed = journal.interrupted_batch() if ns.coordinator == "" else None
+        if resumed is not None and not ns.resume:
+            print("The previous batch (seed:" + str(resumed.seed) + ") was interrupted, pass --resume to resume it")
+            resumed = None
+    reconditioner = Reconditioner(exec_dirs.graphicsfuzz)
+    # The batches of a worker are leased by the coordinator, an interrupted batch is leased again to a worker
+    if ns.coordinator != "":
+        worker_name = ns.worker_name if ns.worker_name != "" else socket.gethostname() + ":" + str(os.getpid())
+        run_worker(CoordinatorClient(ns.coordinator), worker_name, exec_dirs, compilers_dict, reducer,
+                   shader_tool, ns.reduce, "add_id" if ns.double_run else "standard", ns.compile_jobs, ns.jobs,
+                   reconditioner, ns.pipeline_chunk, result_cache, runtime_stats)
+    while ns.coordinator == "" and (batch_nb == 1 or ns.continuous):
         print("Batch " + str(batch_nb))
         batch_nb += 1
         exec_glslsmith(exec_dirs, compilers_dict, reducer, shader_tool, ns.seed, ns.shadercount, ns.syntaxonly,
-                       ns.reduce, ns.double_run, ns.glsl_only)
+                       ns.reduce, "add_id" if ns.double_run else "standard", ns.glsl_only, ns.compile_jobs,
+                       ns.jobs, reconditioner, ns.pipeline_chunk, result_cache, runtime_stats, resumed,
+                       seed_ledger)
+        resumed = None
         print("Finished with batch " + str(batch_nb))
+    journal.stop()
 
 
 if __name__ == "__main__":
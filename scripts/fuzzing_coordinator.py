@@ -0,0 +1,272 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import base64
+import collections
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+
+from utils.ResultsIndex import ResultsIndex
+from utils.SeedLedger import SeedLedger
+
+
+class CoordinatorRequestHandler(socketserver.StreamRequestHandler):
+    # One request per connection: {"op": ...} answered by a JSON object
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        answer = self.server.coordinator.handle(request)
+        self.wfile.write((json.dumps(answer) + "\n").encode())
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# Hands out the seed ranges of the batches to the workers (exec_glslsmith.py --coordinator) and collects their findings
+# Ranges are allocated from a seed ledger and leased for lease_time seconds, a worker renews its lease while the batch
+# runs. The range of an expired lease (worker stopped, unreachable, ...) is leased again to another worker, up to
+# max_attempts times. The kept shaders and buffers uploaded by the workers are saved in the keptshaders and
+# keptbuffers directories of output_dir and registered in its results index with the metadata of the workers
+# Requests: lease {"worker"}, renew {"lease"}, upload {"worker", "seed", "shader_name", "shader", "buffers", "group",
+# "groups", "error_code", "timings", "signature"} (file contents in base64) and complete {"lease", "kept"}
+class FuzzingCoordinator:
+    def __init__(self, output_dir, shader_count=50, batches=0, lease_time=600, max_attempts=3, seed_ledger=None,
+                 host="127.0.0.1", port=0):
+        self.kept_shader_dir = os.path.join(output_dir, "keptshaders", "")
+        self.kept_buffer_dir = os.path.join(output_dir, "keptbuffers", "")
+        self.results_index = None
+        self.shader_count = shader_count
+        self.batches = batches
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.seed_ledger = seed_ledger if seed_ledger is not None else SeedLedger(SeedLedger.default_location())
+        self.host = host
+        self.port = port
+        # Ranges of expired leases: (seed, shader_count, attempts)
+        self.pending = collections.deque()
+        # lease: {"seed", "shader_count", "worker", "expires", "attempts"}
+        self.leases = {}
+        self.allocated = 0
+        self.completed = 0
+        self.failed = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def address(self):
+        return self.server.server_address[0] + ":" + str(self.server.server_address[1])
+
+    def start(self):
+        os.makedirs(self.kept_shader_dir, exist_ok=True)
+        os.makedirs(self.kept_buffer_dir, exist_ok=True)
+        self.results_index = ResultsIndex(ResultsIndex.location(self.kept_shader_dir))
+        self.server = CoordinatorServer((self.host, self.port), CoordinatorRequestHandler)
+        self.server.coordinator = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+    def handle(self, request):
+        operations = {"lease": self.lease, "renew": self.renew, "upload": self.upload, "complete": self.complete}
+        try:
+            return operations[request["op"]](request)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"ok": False, "reason": "invalid request " + str(e)}
+
+    def check_leases(self):
+        with self.lock:
+            self.expire_leases()
+
+    def expire_leases(self):
+        # Called with the lock held
+        now = time.monotonic()
+        for lease, work in list(self.leases.items()):
+            if work["expires"] > now:
+                continue
+            del self.leases[lease]
+            attempts = work["attempts"] + 1
+            if attempts >= self.max_attempts:
+                print("Seeds " + str(work["seed"]) + " to " + str(work["seed"] + work["shader_count"] - 1) +
+                      " abandoned after " + str(attempts) + " expired leases")
+                self.failed.append((work["seed"], work["shader_count"]))
+            else:
+                print("Lease of " + work["worker"] + " on seed " + str(work["seed"]) + " expired, leased again")
+                self.pending.append((work["seed"], work["shader_count"], attempts))
+        self.check_done()
+
+    def check_done(self):
+        if self.batches > 0 and self.completed + len(self.failed) >= self.batches:
+            self.done.set()
+
+    def lease(self, request):
+        with self.lock:
+            self.expire_leases()
+            if self.pending:
+                seed, shader_count, attempts = self.pending.popleft()
+            elif self.batches == 0 or self.allocated < self.batches:
+                seed, shader_count, attempts = self.seed_ledger.allocate(self.shader_count), self.shader_count, 0
+                self.allocated += 1
+            elif self.leases:
+                # Ranges still leased to other workers may expire
+                return {"wait": min(self.lease_time, 5)}
+            else:
+                return {"stop": True}
+            lease = uuid.uuid4().hex
+            self.leases[lease] = {"seed": seed, "shader_count": shader_count, "worker": request["worker"],
+                                  "expires": time.monotonic() + self.lease_time, "attempts": attempts}
+        print("Seeds " + str(seed) + " to " + str(seed + shader_count - 1) + " leased to " + request["worker"])
+        return {"lease": lease, "seed": seed, "shader_count": shader_count, "lease_time": self.lease_time}
+
+    def renew(self, request):
+        with self.lock:
+            if request["lease"] not in self.leases:
+                return {"ok": False, "reason": "expired"}
+            self.leases[request["lease"]]["expires"] = time.monotonic() + self.lease_time
+        return {"ok": True}
+
+    def upload(self, request):
+        # Findings are kept even if their lease expired meanwhile, uploading the same seed again replaces it
+        seed = str(int(request["seed"]))
+        shader_file = self.kept_shader_dir + seed + os.path.splitext(os.path.basename(request["shader_name"]))[1]
+        with open(shader_file, "wb") as f:
+            f.write(base64.b64decode(request["shader"]))
+        buffer_files = {}
+        for compiler_name, content in request["buffers"].items():
+            buffer_files[compiler_name] = self.kept_buffer_dir + os.path.basename(compiler_name) + "_" + seed + ".txt"
+            with open(buffer_files[compiler_name], "wb") as f:
+                f.write(base64.b64decode(content))
+        self.results_index.record(seed, request["group"], request["groups"], buffer_files, shader_file,
+                                  request.get("error_code"), request.get("timings"), request.get("signature"))
+        print("Shader " + seed + " uploaded by " + request["worker"] + " (" + request["group"] + ")")
+        return {"ok": True}
+
+    def complete(self, request):
+        with self.lock:
+            work = self.leases.pop(request["lease"], None)
+            if work is None:
+                # The range was leased again meanwhile, it is completed by the new lease
+                return {"ok": False, "reason": "expired"}
+            self.completed += 1
+            self.check_done()
+        print("Seeds " + str(work["seed"]) + " to " + str(work["seed"] + work["shader_count"] - 1) + " completed by " +
+              work["worker"] + " (" + str(len(request["kept"])) + " kept)")
+        return {"ok": True}
+
+
+# Connection of a worker to the coordinator, failed requests (coordinator restarting, network errors) are retried
+# with an exponential backoff before giving up
+class CoordinatorClient:
+    def __init__(self, address, retries=5, retry_delay=1.0, timeout=60):
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+    def request(self, request):
+        for attempt in range(self.retries + 1):
+            try:
+                with socket.create_connection(self.address, timeout=self.timeout) as client:
+                    client.sendall((json.dumps(request) + "\n").encode())
+                    with client.makefile("r") as answer:
+                        return json.loads(answer.readline())
+            except (OSError, ValueError):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def lease(self, worker):
+        return self.request({"op": "lease", "worker": worker})
+
+    def renew(self, lease):
+        return self.request({"op": "renew", "lease": lease})
+
+    def upload(self, worker, seed, shader_file, buffer_files, attribution):
+        request = {"op": "upload", "worker": worker, "seed": seed, "shader_name": os.path.basename(shader_file),
+                   "buffers": {}, "group": attribution["group"], "groups": attribution["groups"],
+                   "error_code": attribution["error_code"], "timings": attribution["timings"],
+                   "signature": attribution["signature"]}
+        with open(shader_file, "rb") as f:
+            request["shader"] = base64.b64encode(f.read()).decode()
+        for compiler_name, buffer_file in buffer_files.items():
+            with open(buffer_file, "rb") as f:
+                request["buffers"][compiler_name] = base64.b64encode(f.read()).decode()
+        return self.request(request)
+
+    def complete(self, lease, kept):
+        return self.request({"op": "complete", "lease": lease, "kept": kept})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hand out seed ranges to exec_glslsmith.py workers (--coordinator) "
+                                                 "and collect their findings")
+    parser.add_argument('--output', dest='output', default="coordinator_output",
+                        help="Directory receiving the kept shaders and buffers of the workers and their results index "
+                             "(by default: coordinator_output)")
+    parser.add_argument('--host', dest='host', default="127.0.0.1",
+                        help="Address to listen on (by default: 127.0.0.1, use 0.0.0.0 to serve other machines)")
+    parser.add_argument('--port', dest='port', default=7341, type=int, help="Port to listen on (by default: 7341)")
+    parser.add_argument('--shader-count', dest='shadercount', default=50, type=int,
+                        help="Number of seeds of each leased batch (by default: 50)")
+    parser.add_argument('--batches', dest='batches', default=0, type=int,
+                        help="Stop once the given number of batches are executed (by default: 0, never stop)")
+    parser.add_argument('--lease-time', dest='lease_time', default=600, type=float,
+                        help="Seconds after which a batch that was not renewed is leased again (by default: 600)")
+    parser.add_argument('--max-attempts', dest='max_attempts', default=3, type=int,
+                        help="Number of expired leases after which a batch is abandoned (by default: 3)")
+    parser.add_argument('--seed-ledger', dest='seed_ledger', default="",
+                        help="File recording the seeds already handed out (by default: seeds.json in the glslsmith "
+                             "cache directory)")
+    ns = parser.parse_args()
+
+    seed_ledger = SeedLedger(ns.seed_ledger if ns.seed_ledger != "" else SeedLedger.default_location())
+    with FuzzingCoordinator(ns.output, ns.shadercount, ns.batches, ns.lease_time, ns.max_attempts, seed_ledger,
+                            ns.host, ns.port) as coordinator:
+        print("Listening on " + coordinator.address)
+        try:
+            # Leases also expire while no worker asks for a batch
+            while not coordinator.done.wait(1):
+                coordinator.check_leases()
+        except KeyboardInterrupt:
+            pass
+    print(str(coordinator.completed) + " batches completed, " + str(len(coordinator.failed)) + " abandoned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Interestingness test shim: forwards the shader to an interestingness server and exits with 0 if it is interesting
+# Only standard modules are imported here as the shim is started for every reduction step
+import json
+import os
+import socket
+import sys
+
+
+def query(socket_path, shader):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps({"shader": os.path.abspath(shader)}) + "\n").encode())
+        with client.makefile("r") as answer:
+            return json.loads(answer.readline())
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: interestingness_client.py SOCKET SHADER")
+        exit(1)
+    try:
+        answer = query(sys.argv[1], sys.argv[2])
+    except (OSError, ValueError):
+        # No server (or no answer) means that the candidate cannot be interesting
+        print("Interestingness server not available")
+        exit(1)
+    print(answer["error_code"])
+    exit(0 if answer["interesting"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import uuid
+
+from benchmark_helper import count_calls
+from reduction_helper import compute_error_code
+from splitter_merger import HarnessTemplate
+from utils.Configuration import env_setup
+from utils.file_utils import ensure_abs_path
+
+
+class InterestingnessRequestHandler(socketserver.StreamRequestHandler):
+    # One request per connection: {"shader": path} answered by {"error_code": ..., "interesting": bool}
+    def handle(self):
+        try:
+            shader = json.loads(self.rfile.readline())["shader"]
+        except (ValueError, KeyError, TypeError):
+            return
+        error_code, interesting = self.server.interestingness.check(shader)
+        self.wfile.write((json.dumps({"error_code": error_code, "interesting": interesting}) + "\n").encode())
+
+
+# Interestingness test kept alive for a whole reduction
+# The configuration, the compilers and the harness surrounding the reduced shader are loaded once, each check then
+# only merges the candidate shader in the harness and runs the compilers (as done by reduction_helper.py), the
+# compilers are not launched anymore once the expected error code cannot be obtained
+# The reducer calls interestingness_client.py from its interestingness script, which exits with 0 if the error code
+# of the candidate is the expected one and 1 otherwise
+class InterestingnessServer:
+    def __init__(self, compilers_dict, exec_dirs, shader_tool, harness_name, error_code="", double_run=False,
+                 log_file="", result_cache=None, runtime_stats=None):
+        self.compilers_dict = compilers_dict
+        self.exec_dirs = exec_dirs
+        self.shader_tool = shader_tool
+        self.harness_name = ensure_abs_path(exec_dirs.execdir, harness_name)
+        self.error_code = error_code
+        self.double_run = double_run
+        self.log_file = log_file
+        self.result_cache = result_cache
+        self.runtime_stats = runtime_stats
+        # Unix socket paths are limited in length, the socket is not created in the execution directory
+        self.socket_path = os.path.join(tempfile.gettempdir(), "glslsmith_" + uuid.uuid4().hex + ".sock")
+        self.harness_template = None
+        self.server = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def load_harness(self):
+        # Locate the shader in the harness once, candidates are then merged in the template
+        self.harness_template = HarnessTemplate.load(self.shader_tool, self.harness_name)
+
+    def start(self):
+        self.load_harness()
+        self.server = socketserver.UnixStreamServer(self.socket_path, InterestingnessRequestHandler)
+        self.server.interestingness = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def check(self, shader):
+        # Same steps as the shell interestingness test: log the call, check that main remains, merge and compare
+        with self.lock:
+            if self.log_file != "":
+                count_calls(self.log_file)
+            try:
+                with open(shader, "r") as f:
+                    shader_text = f.read()
+            except OSError:
+                return "missing", False
+            if "main" not in shader_text:
+                return "no main", False
+            self.harness_template.write(self.harness_name, shader_text)
+            try:
+                error_code = compute_error_code(self.compilers_dict, self.exec_dirs, self.shader_tool,
+                                                self.harness_name, double_run=self.double_run,
+                                                result_cache=self.result_cache, expected_error_code=self.error_code,
+                                                runtime_stats=self.runtime_stats)
+            except Exception as e:
+                return "error " + str(e), False
+            return error_code, error_code == self.error_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the interestingness test of a reduction to "
+                                                 "interestingness_client.py")
+    parser.add_argument('--harness-name', dest='harness', default='test.shadertrap',
+                        help="Harness in which the reduced shaders are merged (by default: test.shadertrap)")
+    parser.add_argument('--error-code', dest='error_code', required=True,
+                        help="Error code that makes a reduced shader interesting")
+    parser.add_argument('--socket', dest='socket', default="",
+                        help="Path of the unix socket to listen on (by default: a new socket in the temporary "
+                             "directory)")
+    parser.add_argument('--log', dest="log", default="", help="Count the interestingness checks in the given file")
+    parser.add_argument('--double-run', dest="double_run", action="store_true",
+                        help="Run the program twice eliminating useless wrappers on the second run")
+    ns, exec_dirs, compilers_dict, reducer, shader_tool = env_setup(parser)
+
+    server = InterestingnessServer(compilers_dict, exec_dirs, shader_tool, ns.harness, ns.error_code, ns.double_run,
+                                   ns.log)
+    if ns.socket != "":
+        server.socket_path = ns.socket
+    with server:
+        print("Listening on " + server.socket_path)
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
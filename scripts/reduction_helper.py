@@ -16,8 +16,14 @@ import argparse
 import sys
 
 from utils.analysis_utils import comparison_helper, attribute_compiler_results
-from utils.execution_utils import execute_compilation, env_setup
-from utils.file_utils import clean_files, find_compiler_buffer_file
+from utils.Configuration import env_setup
+from utils.execution_utils import execute_compilation
+from utils.file_utils import clean_files, find_compiler_buffer_file, ensure_abs_path
+from utils.DigestCache import shared_digest_cache
+from utils.ResultCache import ResultCache
+
+# Error code reported when the compilation is stopped before the expected error code could be obtained
+EARLY_TERMINATION = "early termination"
 
 
 def identify_crashes(results, compilers):
@@ -51,8 +57,81 @@ def identify_crashes(results, compilers):
 # Other differences across compilation: 4000
 # Difference across specific reference and current compilation (dead code removal): 5000 + compiler code
 # Compiler not recognized: 9999
-def execute_reduction(compilers_dict, exec_dirs, shader_tool, shader_name, ref="", clean_dir=True, double_run=False,
-                      postprocessing=True):
+def can_still_match(expected_error_code, compilers, results, digests):
+    # Check if the expected error code can still be obtained given the results of the compilers already executed
+    if not expected_error_code.split()[0].isdigit():
+        return True
+    code = int(expected_error_code.split()[0])
+    crashed = [result != "no_crash" and result != "timeout" for result in results]
+    timed_out = [result == "timeout" for result in results]
+    if code == 1000:
+        # As in identify_crashes, time-outs count as crashes when no compiler succeeds
+        return all(result != "no_crash" for result in results)
+    if 1000 < code < 2000:
+        return all(crashed[i] == bool((code - 1000) >> compiler.compilercode & 1) for i, compiler in
+                   enumerate(compilers))
+    if any(crashed):
+        return False
+    if 2000 < code < 3000:
+        return all(timed_out[i] == bool((code - 2000) >> compiler.compilercode & 1) for i, compiler in
+                   enumerate(compilers))
+    if any(timed_out):
+        return False
+    if 3000 < code < 3099:
+        # A single compiler disagrees with all the others
+        others = set(digest for compiler, digest in zip(compilers, digests) if compiler.compilercode != code - 3000)
+        culprit = [digest for compiler, digest in zip(compilers, digests) if compiler.compilercode == code - 3000]
+        return len(others) <= 1 and not (culprit and culprit[0] in others)
+    if code == 3099:
+        # The angle compilers agree together and disagree with the independent ones
+        angle = set(digest for compiler, digest in zip(compilers, digests) if compiler.type == "angle")
+        independent = set(digest for compiler, digest in zip(compilers, digests) if compiler.type == "independent")
+        return len(angle) <= 1 and len(independent) <= 1 and not (angle & independent)
+    return True
+
+
+def difference_error_code(comparison_result, compilers_dict, base_error=3000):
+    # Error code of buffers differing in the groups of comparison_result (see comparison_helper)
+    group_compiler = attribute_compiler_results(comparison_result, compilers_dict)
+    if group_compiler == "angle":
+        return str(base_error + 99)
+    elif group_compiler == "more than two":
+        return str(base_error + 1000) + " " + str(comparison_result)
+    elif group_compiler in compilers_dict:
+        return str(base_error + compilers_dict[group_compiler].compilercode)
+    else:
+        return str(9999)
+
+
+def compile_until_mismatch(compilers_dict, exec_dirs, shader_tool, shader_name, run_type, expected_error_code,
+                           result_cache=None, runtime_stats=None):
+    # Launch the compilers one at a time (on a single reconditioned harness) and stop as soon as the expected error
+    # code cannot be obtained anymore, None is returned in that case
+    results = []
+    compilers = []
+    digests = []
+    for compiler_name, compiler in compilers_dict.items():
+        if not compilers:
+            results += execute_compilation({compiler_name: compiler}, exec_dirs.graphicsfuzz, exec_dirs.execdir,
+                                           shader_tool, shader_name, run_type=run_type, result_cache=result_cache,
+                                           runtime_stats=runtime_stats)
+            if results[0] in ["missing", "failed_reconditioning"]:
+                return results * len(compilers_dict)
+            if run_type != "no_postprocessing":
+                shader_name = exec_dirs.execdir + "tmp" + shader_tool.file_extension
+        else:
+            results += execute_compilation({compiler_name: compiler}, exec_dirs.graphicsfuzz, exec_dirs.execdir,
+                                           shader_tool, shader_name, run_type="no_postprocessing",
+                                           result_cache=result_cache, runtime_stats=runtime_stats)
+        compilers.append(compiler)
+        digests.append(shared_digest_cache.file_digest(exec_dirs.execdir + compiler_name + ".txt"))
+        if not can_still_match(expected_error_code, compilers, results, digests):
+            return None
+    return results
+
+
+def compute_error_code(compilers_dict, exec_dirs, shader_tool, shader_name, ref="", clean_dir=True, double_run=False,
+                       postprocessing=True, result_cache=None, expected_error_code="", runtime_stats=None):
     # Clean the execution directory
     clean_files(exec_dirs.execdir, find_compiler_buffer_file(exec_dirs.execdir, compilers_dict))
 
@@ -63,11 +142,21 @@ def execute_reduction(compilers_dict, exec_dirs, shader_tool, shader_name, ref="
         run_type = "no_postprocessing"
     else:
         run_type = "standard"
-    results = execute_compilation(compilers_dict, exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool, shader_name,
-                                  run_type=run_type)
+    # With an expected error code, the compilers are only launched while the expected code can be obtained (the
+    # double run compiles the shader twice with all the compilers and is not stopped early)
+    if expected_error_code != "" and not double_run:
+        results = compile_until_mismatch(compilers_dict, exec_dirs, shader_tool, shader_name, run_type,
+                                         expected_error_code, result_cache, runtime_stats)
+    else:
+        results = execute_compilation(compilers_dict, exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool,
+                                      shader_name, run_type=run_type, result_cache=result_cache,
+                                      runtime_stats=runtime_stats)
 
     # Check for compilation / crash / timeout errors
-    error_code = identify_crashes(results, list(compilers_dict.values()))
+    if results is None:
+        error_code = EARLY_TERMINATION
+    else:
+        error_code = identify_crashes(results, list(compilers_dict.values()))
 
     # Check for miscompilation / difference with a reference
     if error_code == "0":
@@ -78,28 +167,27 @@ def execute_reduction(compilers_dict, exec_dirs, shader_tool, shader_name, ref="
         base_error = 3000
         # Add the reference buffer if needed
         if ref != "":
-            buffers.append(ref)
+            buffers.append(ensure_abs_path(exec_dirs.execdir, ref))
             base_error = 5000
         # Compare the buffers
         comparison_result = comparison_helper(buffers)
         if len(comparison_result) >= 2:
             # Miscompilation checks (base_error - 3000) / Difference with reference (base_error - 5000)
             print(comparison_result)
-            group_compiler = attribute_compiler_results(comparison_result, compilers_dict)
-            if group_compiler == "angle":
-                error_code = str(base_error + 99)
-            elif group_compiler == "more than two":
-                error_code = str(base_error + 1000) + " " + str(comparison_result)
-            elif group_compiler in compilers_dict:
-                error_code = str(base_error + compilers_dict[group_compiler].compilercode)
-            else:
-                error_code = str(9999)
+            error_code = difference_error_code(comparison_result, compilers_dict, base_error)
 
     # Clean the resulting files if necessary
     if clean_dir:
         clean_files(exec_dirs.execdir, find_compiler_buffer_file(exec_dirs.execdir, compilers_dict))
         clean_files(exec_dirs.execdir, ["tmp" + shader_tool.file_extension])
 
+    return error_code
+
+
+def execute_reduction(compilers_dict, exec_dirs, shader_tool, shader_name, ref="", clean_dir=True, double_run=False,
+                      postprocessing=True, result_cache=None, expected_error_code="", runtime_stats=None):
+    error_code = compute_error_code(compilers_dict, exec_dirs, shader_tool, shader_name, ref, clean_dir, double_run,
+                                    postprocessing, result_cache, expected_error_code, runtime_stats)
     if error_code == "0":
         print("No difference between shaders")
         exit(0)
@@ -120,10 +208,17 @@ def main():
                         help="Do not clean buffers and post-processed shaders after execution")
     parser.add_argument('--double-run', dest="double_run", action="store_true",
                         help="Run the program twice eliminating useless wrappers on the second run")
+    parser.add_argument('--result-cache', dest="result_cache", default="",
+                        help="Directory of the execution result cache shared with exec_glslsmith (by default: no "
+                             "cache)")
+    parser.add_argument('--expected-error-code', dest="expected_error_code", default="",
+                        help="Stop launching compilers as soon as the given error code cannot be obtained anymore "
+                             "(the reported error code is then \"" + EARLY_TERMINATION + "\")")
     ns, exec_dirs, compilers_dict, reducer, shader_tool = env_setup(parser)
 
+    result_cache = ResultCache(ns.result_cache) if ns.result_cache != "" else None
     execute_reduction(compilers_dict, exec_dirs, shader_tool, ns.shader, ns.ref, ns.clean, ns.double_run,
-                      ns.postprocessing)
+                      ns.postprocessing, result_cache, ns.expected_error_code)
 
 
 if __name__ == "__main__":
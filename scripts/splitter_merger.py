@@ -13,55 +13,99 @@
 # limitations under the License.
 
 import argparse
-import re
 import sys
 
-from utils.execution_utils import env_setup
+from utils.Configuration import env_setup
+from utils.file_utils import ensure_abs_path
 
 
-def get_glslcode_from_shadertrap(shadertrap_text):
-    shadertrap_reg = re.compile(r".*DECLARE_SHADER shader KIND COMPUTE\n(.*)END\n.*", re.DOTALL)
-    match_object = shadertrap_reg.match(shadertrap_text)
-    return match_object.group(1)
+SHADERTRAP_DECLARATION = "DECLARE_SHADER shader KIND COMPUTE\n"
+AMBER_DECLARATION = "SHADER compute "
+AMBER_LANGUAGE = " GLSL\n"
+SHADER_END = "END\n"
 
 
-def get_glslcode_from_amber(amber_text):
-    amber_reg = re.compile(r"SHADER compute (.*?) GLSL\n(.*?)END\n", re.DOTALL)
-    match_object = amber_reg.search(amber_text)
-    return match_object.group(2)
+def locate_glslcode_in_shadertrap(shadertrap_text):
+    # Offsets of the shader, from the last shader declaration to the last END (as the greedy
+    # ".*DECLARE_SHADER shader KIND COMPUTE\n(.*)END\n.*" would match)
+    start = shadertrap_text.rindex(SHADERTRAP_DECLARATION) + len(SHADERTRAP_DECLARATION)
+    return start, shadertrap_text.rindex(SHADER_END, start)
 
 
-def get_glslcode(shader_tool, text):
+def locate_glslcode_in_amber(amber_text):
+    # Offsets of the first compute shader, up to its first END (as "SHADER compute (.*?) GLSL\n(.*?)END\n" would match)
+    declaration = amber_text.index(AMBER_DECLARATION)
+    start = amber_text.index(AMBER_LANGUAGE, declaration + len(AMBER_DECLARATION)) + len(AMBER_LANGUAGE)
+    return start, amber_text.index(SHADER_END, start)
+
+
+def locate_glslcode(shader_tool, text):
     if shader_tool.name == "shadertrap":
-        glsl_lines = get_glslcode_from_shadertrap(text)
-        return glsl_lines
+        return locate_glslcode_in_shadertrap(text)
     elif shader_tool.name == "amber":
-        glsl_lines = get_glslcode_from_amber(text)
-        return glsl_lines
+        return locate_glslcode_in_amber(text)
     else:
         print("Host format not recognized")
         exit(1)
 
 
+def get_glslcode_from_shadertrap(shadertrap_text):
+    start, end = locate_glslcode_in_shadertrap(shadertrap_text)
+    return shadertrap_text[start:end]
+
+
+def get_glslcode_from_amber(amber_text):
+    start, end = locate_glslcode_in_amber(amber_text)
+    return amber_text[start:end]
+
+
+def get_glslcode(shader_tool, text):
+    start, end = locate_glslcode(shader_tool, text)
+    return text[start:end]
+
+
+# Harness cut around its shader (prefix + shader + suffix)
+# The shader is located once with plain string searches (no regex backtracking on large harnesses), another shader is
+# then merged by a single concatenation, the template can be reused for all the merges of a reduction
+class HarnessTemplate:
+    def __init__(self, prefix, shader, suffix):
+        self.prefix = prefix
+        self.shader = shader
+        self.suffix = suffix
+
+    @staticmethod
+    def from_text(shader_tool, text):
+        start, end = locate_glslcode(shader_tool, text)
+        return HarnessTemplate(text[:start], text[start:end], text[end:])
+
+    @staticmethod
+    def load(shader_tool, harness_file):
+        with open(harness_file, "r") as f:
+            return HarnessTemplate.from_text(shader_tool, f.read())
+
+    def merge(self, shader_text):
+        return self.prefix + shader_text + self.suffix
+
+    def write(self, harness_file, shader_text):
+        with open(harness_file, "w") as f:
+            f.write(self.merge(shader_text))
+
+
 def split(shader_tool, source_file, output_file):
-    f = open(source_file, "r")
-    lines = f.read()
-    f.close()
-    g = open(output_file, "w")
-    g.write(get_glslcode(shader_tool, lines))
-    g.close()
-
-
-def merge(shader_tool, harness_file, shader_file):
-    g = open(shader_file, "r")
-    lines = g.read()
-    g.close()
-    f = open(harness_file, 'r')
-    output_lines = f.read()
-    f.close()
-    f = open(harness_file, "w")
-    f.write(output_lines.replace(get_glslcode(shader_tool, output_lines), lines))
-    f.close()
+    # The template of the harness is returned for later merges
+    template = HarnessTemplate.load(shader_tool, source_file)
+    with open(output_file, "w") as f:
+        f.write(template.shader)
+    return template
+
+
+def merge(shader_tool, harness_file, shader_file, template=None):
+    # The template of a harness with the same surroundings (e.g. returned by split) saves parsing the harness again
+    with open(shader_file, "r") as f:
+        shader_text = f.read()
+    if template is None:
+        template = HarnessTemplate.load(shader_tool, harness_file)
+    template.write(harness_file, shader_text)
 
 
 def main():
@@ -73,7 +117,7 @@ def main():
                              "location")
     parser.add_argument("--merge", dest="merge_files", nargs=2,
                         help="first argument is the shadertrap code, second is the glsl code")
-    ns, _, _, _, shader_tool = env_setup(parser)
+    ns, exec_dirs, _, _, shader_tool = env_setup(parser)
     ns = parser.parse_args(sys.argv[1:])
 
     if not ns.split_file and not ns.merge_files:
@@ -82,10 +126,13 @@ def main():
     if ns.split_file and ns.merge_files:
         print("Please provide only one operation at a time, see --help for the available operations")
         exit(1)
+    # Relative files are located in the execution directory
     if ns.split_file:
-        split(shader_tool, ns.split_file[0], ns.split_file[1])
+        split(shader_tool, ensure_abs_path(exec_dirs.execdir, ns.split_file[0]),
+              ensure_abs_path(exec_dirs.execdir, ns.split_file[1]))
     if ns.merge_files:
-        merge(shader_tool, ns.merge_files[0], ns.merge_files[1])
+        merge(shader_tool, ensure_abs_path(exec_dirs.execdir, ns.merge_files[0]),
+              ensure_abs_path(exec_dirs.execdir, ns.merge_files[1]))
 
 
 if __name__ == "__main__":
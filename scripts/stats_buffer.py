@@ -13,10 +13,13 @@
 # limitations under the License.
 
 import argparse
+import hashlib
 import os
 
+from utils.DigestCache import DigestCache
+from utils.ResultsIndex import ResultsIndex
 from utils.analysis_utils import attribute_compiler_results, comparison_helper
-from utils.execution_utils import env_setup
+from utils.Configuration import env_setup
 from utils.file_utils import get_compiler_name, get_seed
 
 
@@ -39,13 +42,32 @@ def extract_seed_from_buffer_files(files):
     return res
 
 
-def stats_buffers(buffer_dir, shader_dir, compilers_dict, shader_tools, verbose):
+def init_compiler_differences(compilers_dict):
     compiler_differences = {}
     for compiler_name in compilers_dict:
         compiler_differences[compiler_name] = 0
     compiler_differences["angle"] = 0
     compiler_differences["more than two"] = 0
     compiler_differences["compiler groups"] = 0
+    return compiler_differences
+
+
+def print_summary(compilers_dict, compiler_differences):
+    print("========= SUMMARY ================================================================")
+    for compiler_name in compilers_dict:
+        print(compiler_name + " different values: " + str(compiler_differences[compiler_name]))
+    print("angle different values: " + str(compiler_differences["angle"]))
+    print("more than two groups of values: " + str(compiler_differences["more than two"]))
+    print("compiler groups: " + str(compiler_differences["compiler groups"]))
+
+
+def stats_buffers(buffer_dir, shader_dir, compilers_dict, shader_tools, verbose, digest_cache=None,
+                  results_index=None):
+    # Answer from the results index when available, the buffers and shaders are not read again
+    if results_index is not None:
+        stats_from_index(results_index, compilers_dict, verbose)
+        return
+    compiler_differences = init_compiler_differences(compilers_dict)
     # Get a list of the files in the directory
     seeds = extract_seed_from_buffer_files(os.listdir(buffer_dir))
 
@@ -54,7 +76,7 @@ def stats_buffers(buffer_dir, shader_dir, compilers_dict, shader_tools, verbose)
         correct_seed_buffers = []
         for compiler_name in compilers_dict:
             correct_seed_buffers.append(buffer_dir + compiler_name + "_" + seed + ".txt")
-        results = comparison_helper(correct_seed_buffers)
+        results = comparison_helper(correct_seed_buffers, digest_cache)
         # Read back results from the comparison and attribute the defect to a group
         group_name = attribute_compiler_results(results, compilers_dict)
         compiler_differences[group_name] += 1
@@ -69,21 +91,73 @@ def stats_buffers(buffer_dir, shader_dir, compilers_dict, shader_tools, verbose)
                 break
 
     # Print a summary
-    print("========= SUMMARY ================================================================")
-    for compiler_name in compilers_dict:
-        print(compiler_name + " different values: " + str(compiler_differences[compiler_name]))
-    print("angle different values: " + str(compiler_differences["angle"]))
-    print("more than two groups of values: " + str(compiler_differences["more than two"]))
-    print("compiler groups: " + str(compiler_differences["compiler groups"]))
+    print_summary(compilers_dict, compiler_differences)
+
+
+def stats_from_index(results_index, compilers_dict, verbose):
+    findings = results_index.findings()
+    print(str(len(findings)) + " different seeds")
+    for seed, group_name, groups, shader_lines in findings:
+        if verbose and group_name in ["more than two", "compiler groups"]:
+            print(groups)
+        if shader_lines is not None:
+            print("Group: " + group_name + ", lines: " + str(shader_lines) + ", seed: " + seed)
+    compiler_differences = init_compiler_differences(compilers_dict)
+    compiler_differences.update(results_index.group_counts())
+    print_summary(compilers_dict, compiler_differences)
+    print_buckets(results_index.bucket_counts())
+
+
+def print_buckets(bucket_counts):
+    # Findings sharing their error code, differing compilers and crash messages (see automate_reducer
+    # --representatives)
+    print("========= BUCKETS ================================================================")
+    print(str(len(bucket_counts)) + " buckets")
+    for signature, error_code, group_name, count in bucket_counts:
+        print(signature + ": " + str(count) + " findings, group: " + group_name + ", error code: " +
+              (error_code if error_code is not None else "unknown"))
+
+
+def rebuild_index(results_index, buffer_dir, shader_dir, compilers_dict, shader_tools, digest_cache=None):
+    # Index the kept shaders and buffers already present in the output directories
+    results_index.clear()
+    buffer_files = os.listdir(buffer_dir)
+    seeds = extract_seed_from_buffer_files(buffer_files) if buffer_files else []
+    for seed in seeds:
+        buffers = {compiler_name: buffer_dir + compiler_name + "_" + seed + ".txt" for compiler_name in compilers_dict}
+        groups = comparison_helper(list(buffers.values()), digest_cache)
+        shader_file = next((shader_dir + seed + tool.file_extension for tool in shader_tools
+                            if os.path.isfile(shader_dir + seed + tool.file_extension)), None)
+        results_index.record(seed, attribute_compiler_results(groups, compilers_dict), groups, buffers, shader_file)
+    print("Results index rebuilt with " + str(len(seeds)) + " seeds")
 
 
 def main():  # pragma: no cover
     parser = argparse.ArgumentParser(description="Print stats and info about difference showing buffers")
     parser.add_argument('--verbose', dest="verbose", action="store_true", help="Gives the detail of agreeing compiler "
                                                                                "for non-trivial case")
-
-    ns, exec_dirs, compilers_dict, _, shader_tools = env_setup(parser)
-    stats_buffers(exec_dirs.keptbufferdir, exec_dirs.keptshaderdir, compilers_dict, shader_tools, ns.verbose)
+    parser.add_argument('--rebuild-index', dest="rebuild_index", action="store_true",
+                        help="Rebuild the results index from the kept shaders and buffers before reporting")
+    parser.add_argument('--no-index', dest="use_index", action="store_false",
+                        help="Compare the kept buffers again instead of answering from the results index")
+    parser.add_argument('--hash-algorithm', dest="hash_algorithm", default="blake2b",
+                        choices=sorted(algorithm for algorithm in hashlib.algorithms_guaranteed
+                                       if not algorithm.startswith("shake_")),
+                        help="Hash function used to compare the buffers (by default: blake2b)")
+
+    ns, exec_dirs, compilers_dict, _, shader_tool = env_setup(parser)
+    shader_tools = [shader_tool]
+    digest_cache = DigestCache(ns.hash_algorithm)
+    results_index = None
+    index_location = ResultsIndex.location(exec_dirs.keptshaderdir)
+    if ns.rebuild_index:
+        results_index = ResultsIndex(index_location)
+        rebuild_index(results_index, exec_dirs.keptbufferdir, exec_dirs.keptshaderdir, compilers_dict, shader_tools,
+                      digest_cache)
+    elif ns.use_index and os.path.isfile(index_location):
+        results_index = ResultsIndex(index_location)
+    stats_buffers(exec_dirs.keptbufferdir, exec_dirs.keptshaderdir, compilers_dict, shader_tools, ns.verbose,
+                  digest_cache, results_index)
 
 
 if __name__ == "__main__":
@@ -15,8 +15,9 @@
 import argparse
 import re
 
-from utils.execution_utils import env_setup, call_glslsmith_reconditioner
-from utils.file_utils import clean_files
+from utils.Configuration import env_setup
+from utils.execution_utils import call_glslsmith_reconditioner
+from utils.file_utils import clean_files, ensure_abs_path
 from splitter_merger import split
 
 
@@ -51,6 +52,7 @@ def print_file_report(shader_file):
 
 def stats_shader(graphicsfuzz, exec_dir, shader_tool, shader, harness_file):
     shader_file = exec_dir + r'tmp.glsl'
+    harness_file = ensure_abs_path(exec_dir, harness_file)
     # Post-process the shader
     check_passed, message = call_glslsmith_reconditioner(graphicsfuzz, exec_dir, shader, harness_file)
     if not check_passed:
@@ -74,7 +76,9 @@ def main():
     ns, exec_dirs, _, _, shader_tool = env_setup(parser)
 
     harness_file = r'tmp' + shader_tool.file_extension
-    stats_shader(exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool, ns.shader, harness_file)
+    # The shader is located in the execution directory when relative
+    stats_shader(exec_dirs.graphicsfuzz, exec_dirs.execdir, shader_tool, ensure_abs_path(exec_dirs.execdir, ns.shader),
+                 harness_file)
 
 
 if __name__ == "__main__":
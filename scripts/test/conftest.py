@@ -26,6 +26,12 @@ def pytest_addoption(parser):
     parser.addoption("--config_file", action="store")
 
 
+@pytest.fixture(scope="session", autouse=True)
+def config_cache(tmp_path_factory):
+    # The parsed configurations are cached out of the home directory (also for the scripts started by the tests)
+    os.environ["GLSLSMITH_CACHE_DIR"] = str(tmp_path_factory.mktemp("config_cache"))
+
+
 @pytest.fixture(scope="session")
 def conf(request):
     conf_path = request.config.getoption("--config_file")
@@ -97,3 +103,13 @@ def prepare_tmp_env(execdirs, tmpdir):
     keptbufferdir = str(tmpdir.join("keptbuffers")) + "/"
     settings = DirSettings(execdirs.graphicsfuzz, execdir, shaderoutput, dumpbufferdir, keptbufferdir, keptshaderdir)
     return settings
+
+
+def prepare_fake_graphicsfuzz(tmpdir):
+    # Expose the stand-in drivers from testdata/fake_tools at the location of the graphicsfuzz drivers
+    drivers = tmpdir.mkdir("graphicsfuzz").mkdir("graphicsfuzz").mkdir("target").mkdir("graphicsfuzz").mkdir(
+        "python").mkdir("drivers")
+    for tool in os.listdir("testdata/fake_tools"):
+        if tool.startswith("glslsmith-"):
+            os.symlink(os.path.abspath("testdata/fake_tools/" + tool), str(drivers.join(tool)))
+    return str(tmpdir.join("graphicsfuzz")) + "/"
@@ -0,0 +1,96 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+
+import pytest
+
+from scripts.utils import execution_utils
+from scripts.utils.AndroidTransport import AndroidTransport, PUSH_FAILED
+from scripts.utils.Compiler import Compiler
+from scripts.utils.ShaderTool import ShaderTool
+from scripts.utils.execution_utils import DevicePool
+
+
+@pytest.fixture
+def fake_device(tmpdir, monkeypatch):
+    # The fake adb runs the device in a local directory holding the fake ShaderTrap
+    device = str(tmpdir.mkdir("device"))
+    shutil.copy("testdata/fake_tools/shadertrap", device + "/shadertrap")
+    monkeypatch.setenv("PATH", os.path.abspath("testdata/fake_tools") + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("FAKE_ADB_DEVICE", device)
+    monkeypatch.setenv("FAKE_ADB_LOG", str(tmpdir.join("adb.log")))
+    yield device
+    AndroidTransport.close_all()
+    DevicePool.reset()
+
+
+def adb_calls(tmpdir):
+    with open(str(tmpdir.join("adb.log")), "r") as f:
+        return [line.split()[0] for line in f]
+
+
+def test_execute_compilation(tmpdir, fake_device, capsys):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "android", " ", " ", []),
+                      "b": Compiler("b", "b differ", "android", " ", " ", []),
+                      "c": Compiler("c", "c crash", "android", " ", " ", [])}
+    exec_dir = str(tmpdir.mkdir("exec")) + "/"
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", exec_dir + "shader_1.shadertrap")
+    messages = execution_utils.execute_compilation(compilers_dict, "", exec_dir, shader_tool, "shader_1.shadertrap",
+                                                   run_type="no_postprocessing")
+    assert messages[0:2] == ["no_crash", "no_crash"]
+    assert "simulated crash" in messages[2]
+    assert tmpdir.join("exec", "a.txt").read() == "buffer_0"
+    assert tmpdir.join("exec", "b.txt").read() == "b differ buffer_0"
+    assert tmpdir.join("exec", "c.txt").read() == "crash"
+    # One push, one session and one pull for the three compilers, nothing is left on the device
+    assert adb_calls(tmpdir) == ["exec-in", "shell", "exec-out"]
+    assert os.listdir(fake_device) == ["shadertrap"]
+    # The session is kept for the next shaders
+    execution_utils.single_compile(exec_dir, compilers_dict["a"], "shader_1.shadertrap", shader_tool)
+    assert adb_calls(tmpdir) == ["exec-in", "shell", "exec-out", "exec-in", "exec-out"]
+    assert tmpdir.join("exec", "buffer_results.txt").read() == "buffer_0"
+    capsys.readouterr()
+
+
+def test_timeout(tmpdir, fake_device, capsys):
+    exec_dir = str(tmpdir.mkdir("exec")) + "/"
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", exec_dir + "shader_1.shadertrap")
+    local_dirs = [str(tmpdir.mkdir("timeout")), str(tmpdir.mkdir("a"))]
+    jobs = [(exec_dir + "shader_1.shadertrap",
+             "/data/local/tmp/shadertrap " + exec_dir + "shader_1.shadertrap --require-vendor-renderer-substring "
+             + renderer, local_dir) for renderer, local_dir in zip(["timeout", "a"], local_dirs)]
+    results = AndroidTransport.get().execute(jobs, [1, 10])
+    # The stuck command is stopped and the following one is sent to a new session
+    assert results[0] is None
+    assert results[1][0:2] == (0, "SUCCESS!\n")
+    assert adb_calls(tmpdir) == ["exec-in", "shell", "shell", "shell", "exec-out"]
+    assert sorted(os.listdir(local_dirs[1])) == ["buffer_0.txt", "buffer_ids.txt"]
+    assert os.listdir(fake_device) == ["shadertrap"]
+    capsys.readouterr()
+
+
+def test_push_failed(tmpdir, fake_device, monkeypatch):
+    tmpdir.join("failures").write("exec-in")
+    monkeypatch.setenv("FAKE_ADB_FAILURES", str(tmpdir.join("failures")))
+    exec_dir = str(tmpdir.mkdir("exec")) + "/"
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", exec_dir + "shader_1.shadertrap")
+    results = AndroidTransport.get().execute([(exec_dir + "shader_1.shadertrap", "/data/local/tmp/shadertrap " +
+                                               exec_dir + "shader_1.shadertrap", exec_dir)], [10])
+    # Nothing runs on the device and the job is reported as lost
+    assert results == [(255, PUSH_FAILED, 0)]
+    assert AndroidTransport.lost(results[0])
+    assert adb_calls(tmpdir) == ["exec-in", "exec-out"]
@@ -0,0 +1,64 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+
+from scripts.utils.BatchJournal import BatchJournal
+
+
+def test_location():
+    assert BatchJournal.location("/root/glslsmithoutput/keptshaders/") == "/root/glslsmithoutput/journal.jsonl"
+
+
+def test_disabled(tmpdir):
+    batch_journal = BatchJournal()
+    batch_journal.path = str(tmpdir.join("journal.jsonl"))
+    batch_journal.start_batch(0, 2)
+    batch_journal.generated(["0", "1"])
+    assert not tmpdir.join("journal.jsonl").exists()
+
+
+def test_interrupted_batch(tmpdir):
+    batch_journal = BatchJournal()
+    batch_journal.start(str(tmpdir.join("journal.jsonl")))
+    assert batch_journal.interrupted_batch() is None
+    batch_journal.start_batch(5, 4)
+    batch_journal.generated(["5", "6", "7"])
+    batch_journal.executed("5")
+    batch_journal.compared("5", False)
+    batch_journal.executed("6")
+    batch_journal.compared("6", True)
+    batch_journal.saved("6")
+    batch_journal.executed("7")
+    batch_journal.compared("7", True)
+    progress = batch_journal.interrupted_batch()
+    assert (progress.seed, progress.shader_count) == (5, 4)
+    assert progress.generated == {"5", "6", "7"}
+    assert progress.completed == {"5", "6"}
+    assert progress.kept == ["6"]
+
+    # A line cut by the interruption is dropped when the batch is resumed
+    with open(str(tmpdir.join("journal.jsonl")), "a") as f:
+        f.write('{"event": "sav')
+    assert batch_journal.interrupted_batch() == progress
+    batch_journal.resume_batch(progress)
+    batch_journal.saved("7")
+    with open(str(tmpdir.join("journal.jsonl")), "r") as f:
+        assert all(json.loads(line) for line in f)
+    assert batch_journal.interrupted_batch().kept == ["6", "7"]
+
+    # The batch is over, a new one replaces it
+    batch_journal.end_batch()
+    assert batch_journal.interrupted_batch() is None
+    batch_journal.start_batch(9, 1)
+    assert batch_journal.interrupted_batch() == (9, 1, set(), set(), [])
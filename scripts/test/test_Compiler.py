@@ -68,3 +68,8 @@ def test_load_compilers_settings():
     assert compiler_2.ldpath == "/abacus/build/lib/x86_64-linux-gnu"
     assert compiler_2.vkfilename == " "
     assert compiler_2.otherenvs == []
+    assert compiler_2.devices == []
+
+    # Test android compiler with its devices
+    assert compilers[2].type == "android"
+    assert compilers[2].devices == ["SERIAL0", "SERIAL1"]
@@ -0,0 +1,75 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import shutil
+
+# The settings classes are taken from the configuration module to compare objects of the same classes
+from scripts.utils import Configuration
+from scripts.utils.Configuration import load_configuration, cache_location, Compiler, DirSettings, Reducer, \
+    ShaderTool
+
+
+def test_load_configuration(tmpdir, mocker, monkeypatch):
+    monkeypatch.setenv("GLSLSMITH_CACHE_DIR", str(tmpdir.join("cache")))
+    config = str(tmpdir.join("config.xml"))
+    shutil.copy("testdata/xml_files/fake_config.xml", config)
+    parse = mocker.spy(Configuration, "parse_configuration")
+
+    # Same settings as the ones of each settings class
+    Compiler.available_syscode = 1
+    configuration = load_configuration(config)
+    Compiler.available_syscode = 1
+    assert list(configuration.compilers) == Compiler.load_compilers_settings(config)
+    assert configuration.exec_dirs == DirSettings.load_dir_settings(config)
+    assert list(configuration.reducers) == Reducer.load_reducers_settings(config)
+    assert list(configuration.shader_tools) == ShaderTool.load_shader_tools(config)
+    assert os.path.isfile(cache_location(config))
+    assert parse.call_count == 1
+
+    # The cached configuration is not parsed again, the compilers are numbered as if they had just been parsed
+    Compiler.available_syscode = 5
+    cached = load_configuration(config)
+    assert parse.call_count == 1
+    assert [compiler.compilercode for compiler in cached.compilers] == [5, 6]
+    assert Compiler.available_syscode == 7
+    assert cached.exec_dirs == configuration.exec_dirs
+    # The cache only holds plain data, each load builds new settings objects
+    with open(cache_location(config)) as f:
+        assert json.load(f)["configuration"]["shader_tools"][0][0] == configuration.shader_tools[0].name
+    assert load_configuration(config).compilers[0] is not cached.compilers[0]
+
+    # A modified configuration is parsed again
+    with open(config, "r") as f:
+        text = f.read()
+    with open(config, "w") as f:
+        f.write(text.replace("<renderer>ana</renderer>", "<renderer>anna</renderer>"))
+    assert load_configuration(config).compilers[0].renderer == "anna"
+    assert parse.call_count == 2
+    assert load_configuration(config).compilers[0].renderer == "anna"
+    assert parse.call_count == 2
+
+
+def test_load_configuration_unusable_cache(tmpdir, monkeypatch):
+    config = "testdata/xml_files/fake_config.xml"
+    # A corrupted cache is replaced
+    monkeypatch.setenv("GLSLSMITH_CACHE_DIR", str(tmpdir))
+    with open(cache_location(config), "w") as f:
+        f.write("corrupted")
+    assert load_configuration(config).compilers[0].name == "a"
+    assert load_configuration(config).compilers[0].name == "a"
+    # The configuration is still loaded when the cache cannot be written
+    tmpdir.join("file").write("")
+    monkeypatch.setenv("GLSLSMITH_CACHE_DIR", str(tmpdir.join("file")))
+    assert load_configuration(config).compilers[1].name == "bas"
@@ -0,0 +1,137 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import threading
+
+import pytest
+
+from scripts.utils import execution_utils
+from scripts.utils.Compiler import Compiler
+from scripts.utils.ShaderTool import ShaderTool
+# The pools used by the compilation
+from scripts.utils.execution_utils import DevicePool
+
+
+@pytest.fixture
+def fake_devices(tmpdir, monkeypatch):
+    # Each serial of the fake adb is a sub-directory holding the fake ShaderTrap, "dead" has no directory
+    devices = str(tmpdir.mkdir("devices"))
+    for serial in ["dev1", "dev2"]:
+        os.mkdir(devices + "/" + serial)
+        shutil.copy("testdata/fake_tools/shadertrap", devices + "/" + serial + "/shadertrap")
+    monkeypatch.setenv("PATH", os.path.abspath("testdata/fake_tools") + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("FAKE_ADB_DEVICE", devices)
+    monkeypatch.setenv("FAKE_ADB_LOG", str(tmpdir.join("adb.log")))
+    yield devices
+    DevicePool.reset()
+
+
+def adb_devices(tmpdir):
+    # Serials of the devices that received a round trip
+    with open(str(tmpdir.join("adb.log")), "r") as f:
+        return sorted(line.split()[1] for line in f if line.split()[2] == "exec-in")
+
+
+def compile_shader(tmpdir, compilers_dict):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    exec_dir = str(tmpdir.mkdir("exec")) + "/"
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", exec_dir + "shader_1.shadertrap")
+    messages = execution_utils.execute_compilation(compilers_dict, "", exec_dir, shader_tool, "shader_1.shadertrap",
+                                                   run_type="no_postprocessing")
+    return messages, {compiler_name: tmpdir.join("exec", compiler_name + ".txt").read()
+                      for compiler_name in compilers_dict}
+
+
+def test_acquire():
+    pool = DevicePool(["dev1", "dev2"])
+    # The least loaded device is given first
+    assert [pool.acquire(), pool.acquire(), pool.acquire()] == ["dev1", "dev2", "dev1"]
+    DevicePool.release("dev1")
+    DevicePool.release("dev1")
+    assert pool.acquire() == "dev1"
+    DevicePool.reset()
+
+
+def test_spread_over_devices(tmpdir, fake_devices, capsys):
+    compilers_dict = {"a": Compiler("a", "a", "android", " ", " ", [], ["dev1", "dev2"]),
+                      "b": Compiler("b", "b differ", "android", " ", " ", [], ["dev1", "dev2"])}
+    messages, buffers = compile_shader(tmpdir, compilers_dict)
+    assert messages == ["no_crash", "no_crash"]
+    assert buffers == {"a": "buffer_0", "b": "b differ buffer_0"}
+    assert adb_devices(tmpdir) == ["dev1", "dev2"]
+    assert DevicePool.in_flight == {"dev1": 0, "dev2": 0}
+    capsys.readouterr()
+
+
+def test_quarantine(tmpdir, fake_devices, capsys):
+    compilers_dict = {"a": Compiler("a", "a", "android", " ", " ", [], ["dead", "dev2"]),
+                      "b": Compiler("b", "b differ", "android", " ", " ", [], ["dev2"])}
+    messages, buffers = compile_shader(tmpdir, compilers_dict)
+    # The shader of the unresponsive device is executed again on the other one
+    assert messages == ["no_crash", "no_crash"]
+    assert buffers == {"a": "buffer_0", "b": "b differ buffer_0"}
+    assert adb_devices(tmpdir) == ["dead", "dev2", "dev2"]
+    assert list(DevicePool.quarantined_until) == ["dead"]
+    assert "Device dead is unresponsive" in capsys.readouterr().out
+    # The quarantined device is not used anymore
+    assert DevicePool.get(compilers_dict["a"]).acquire() == "dev2"
+
+
+@pytest.mark.parametrize("failure", ["exec-in", "shell"])
+def test_lost_jobs(tmpdir, fake_devices, monkeypatch, capsys, failure):
+    # A failed push or a closed session on a healthy device is never reported as a crash, the jobs run again
+    tmpdir.join("failures").write(failure)
+    monkeypatch.setenv("FAKE_ADB_FAILURES", str(tmpdir.join("failures")))
+    compilers_dict = {"a": Compiler("a", "a", "android", " ", " ", [], ["dev1"]),
+                      "b": Compiler("b", "b differ", "android", " ", " ", [], ["dev1"])}
+    messages, buffers = compile_shader(tmpdir, compilers_dict)
+    assert messages == ["no_crash", "no_crash"]
+    assert buffers == {"a": "buffer_0", "b": "b differ buffer_0"}
+    assert adb_devices(tmpdir) == ["dev1", "dev1"]
+    assert DevicePool.quarantined_until == {}
+    capsys.readouterr()
+
+
+def test_quarantine_losing_device(tmpdir, fake_devices, monkeypatch, capsys):
+    tmpdir.join("failures").write("exec-in\nexec-in\nexec-in")
+    monkeypatch.setenv("FAKE_ADB_FAILURES", str(tmpdir.join("failures")))
+    messages, buffers = compile_shader(tmpdir, {"a": Compiler("a", "a", "android", " ", " ", [], ["dev1", "dev2"])})
+    # The device answers its checks but loses every round trip, the job ends on the other device
+    assert messages == ["no_crash"]
+    assert buffers == {"a": "buffer_0"}
+    assert adb_devices(tmpdir) == ["dev1", "dev1", "dev1", "dev2"]
+    assert list(DevicePool.quarantined_until) == ["dev1"]
+    assert "Device dev1 keeps losing its jobs" in capsys.readouterr().out
+
+
+def test_acquire_checks_without_lock(mocker):
+    # The health check of a device at the end of its quarantine does not hold the lock of the pools
+    def take_lock(lock_taken):
+        lock_taken.append(DevicePool.condition.acquire(timeout=1))
+        if lock_taken[0]:
+            DevicePool.condition.release()
+
+    def health_check(serial):
+        lock_taken = []
+        thread = threading.Thread(target=take_lock, args=(lock_taken,))
+        thread.start()
+        thread.join()
+        return lock_taken[0]
+    mocker.patch.object(DevicePool, "health_check", side_effect=health_check)
+    DevicePool.quarantined_until["dev1"] = 0
+    assert DevicePool(["dev1"]).acquire() == "dev1"
+    assert DevicePool.quarantined_until == {}
+    DevicePool.reset()
@@ -0,0 +1,63 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import hashlib
+import os
+import shutil
+
+from scripts.utils.DigestCache import DigestCache
+
+
+def test_file_digest(tmpdir):
+    content = b"buffer_0 " * 1000
+    tmpdir.join("buffer.txt").write_binary(content)
+    assert DigestCache(chunk_size=7).file_digest(str(tmpdir.join("buffer.txt"))) == hashlib.blake2b(
+        content).hexdigest()
+    assert DigestCache("md5").file_digest(str(tmpdir.join("buffer.txt"))) == hashlib.md5(content).hexdigest()
+
+
+def test_digest_reuse(tmpdir, mocker):
+    digest_cache = DigestCache()
+    hash_spy = mocker.spy(digest_cache, "new_hash")
+    tmpdir.join("buffer.txt").write("buffer_0")
+    # Recently modified files are hashed again
+    digest = digest_cache.file_digest(str(tmpdir.join("buffer.txt")))
+    assert digest_cache.file_digest(str(tmpdir.join("buffer.txt"))) == digest
+    assert hash_spy.call_count == 2
+    # Older files are hashed once, even when moved
+    os.utime(tmpdir.join("buffer.txt"), (0, 0))
+    digest_cache.file_digest(str(tmpdir.join("buffer.txt")))
+    shutil.move(str(tmpdir.join("buffer.txt")), str(tmpdir.join("a_0.txt")))
+    assert digest_cache.file_digest(str(tmpdir.join("a_0.txt"))) == digest
+    assert hash_spy.call_count == 3
+    # A modification changes the identity of the file
+    tmpdir.join("a_0.txt").write("buffer_10")
+    os.utime(tmpdir.join("a_0.txt"), (0, 0))
+    assert digest_cache.file_digest(str(tmpdir.join("a_0.txt"))) == hashlib.blake2b(b"buffer_10").hexdigest()
+
+
+def test_register(tmpdir, mocker):
+    digest_cache = DigestCache()
+    tmpdir.join("buffer.txt").write("buffer_0")
+    # Recently written files are not remembered
+    digest_cache.register(str(tmpdir.join("buffer.txt")), hashlib.blake2b(b"buffer_0"))
+    assert digest_cache.digests == {}
+    os.utime(tmpdir.join("buffer.txt"), (0, 0))
+    digest_cache.register(str(tmpdir.join("buffer.txt")), hashlib.blake2b(b"buffer_0"))
+    hash_spy = mocker.spy(digest_cache, "new_hash")
+    assert digest_cache.file_digest(str(tmpdir.join("buffer.txt"))) == hashlib.blake2b(b"buffer_0").hexdigest()
+    assert hash_spy.call_count == 0
+    # Digests of another algorithm are ignored
+    digest_cache.clear()
+    digest_cache.register(str(tmpdir.join("buffer.txt")), hashlib.md5(b"buffer_0"))
+    assert digest_cache.digests == {}
@@ -32,3 +32,13 @@ def test_load_dir_settings():
     assert dir_settings.keptbufferdir == "./glslsmithoutput/keptbuffers/"
     assert dir_settings.keptshaderdir == "./glslsmithoutput/keptshaders/"
 
+
+
+def test_resolve():
+    dir_settings = DirSettings("/graphicsfuzz/", "/exec", "./shaders/", "buffers/", "/kept/buffers/", "../keptshaders/")
+    resolved = dir_settings.resolve()
+    assert resolved == DirSettings("/graphicsfuzz/", "/exec/", "/exec/shaders/", "/exec/buffers/", "/kept/buffers/",
+                                   "/keptshaders/")
+    # Swapping the execution directory keeps the other directories from the original one
+    assert dir_settings.resolve("/sandbox/").execdir == "/sandbox/"
+    assert dir_settings.resolve("/sandbox/").shaderoutput == "/exec/shaders/"
@@ -0,0 +1,63 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from scripts.utils.Instrumentation import Instrumentation
+
+
+def test_stage(tmpdir):
+    instrumentation = Instrumentation()
+    # Nothing is recorded before the instrumentation is started
+    with instrumentation.stage("generation"):
+        pass
+    assert instrumentation.run_totals == {}
+    instrumentation.start(str(tmpdir.join("timings.jsonl")))
+    instrumentation.start_batch()
+    with instrumentation.seed(12):
+        with instrumentation.stage("driver", "a"):
+            pass
+        instrumentation.record("driver", 2.0, 0, "b")
+    with instrumentation.stage("generation"):
+        pass
+    with open(str(tmpdir.join("timings.jsonl")), "r") as f:
+        records = [json.loads(line) for line in f]
+    assert [(record["batch"], record["stage"], record["seed"], record["compiler"]) for record in records] == \
+        [(1, "driver", "12", "a"), (1, "driver", "12", "b"), (1, "generation", "", "")]
+    assert records[1]["wall"] == 2.0
+    assert instrumentation.batch_totals[("driver", "b")] == (1, 2.0, 0)
+
+
+def test_end_batch(tmpdir, capsys):
+    instrumentation = Instrumentation()
+    instrumentation.start(prometheus_file=str(tmpdir.join("glslsmith.prom")))
+    for batch in range(2):
+        instrumentation.start_batch()
+        instrumentation.record("driver", 1.0, 0.5, "a")
+        instrumentation.record("driver", 3.0, 0.5, "b")
+        instrumentation.record("comparison", 0.25, 0.25)
+        instrumentation.end_batch(10)
+    outputs = capsys.readouterr().out
+    assert "Executed 10 shaders in" in outputs
+    assert "  driver: 4.00s wall, 1.00s cpu" in outputs
+    assert "  Slowest compilers: b (3.000s), a (1.000s)" in outputs
+    # The exported totals are the ones of the whole run
+    metrics = tmpdir.join("glslsmith.prom").read().splitlines()
+    assert "glslsmith_stage_calls_total{stage=\"driver\",compiler=\"b\"} 2" in metrics
+    assert "glslsmith_stage_wall_seconds_total{stage=\"driver\",compiler=\"b\"} 6.0" in metrics
+    assert "glslsmith_stage_cpu_seconds_total{stage=\"comparison\",compiler=\"\"} 0.5" in metrics
+    assert "glslsmith_shaders_total 20" in metrics
+    # The samples of a metric follow its description
+    assert metrics.index("# TYPE glslsmith_stage_wall_seconds_total counter") == \
+        metrics.index("glslsmith_stage_wall_seconds_total{stage=\"comparison\",compiler=\"\"} 0.5") - 1
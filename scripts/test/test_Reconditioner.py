@@ -0,0 +1,59 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+
+from scripts.test.conftest import prepare_fake_graphicsfuzz
+from scripts.utils.Reconditioner import Reconditioner
+from scripts.utils.ShaderTool import ShaderTool
+from scripts.utils.file_utils import find_generated_shaders
+
+
+def test_recondition(tmpdir, capsys):
+    graphicsfuzz = prepare_fake_graphicsfuzz(tmpdir)
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", str(tmpdir) + "/shader.shadertrap")
+    reconditioner = Reconditioner(graphicsfuzz)
+    for run_type in ["standard", "add_id", "reduced"]:
+        assert reconditioner.recondition(str(tmpdir), "shader.shadertrap", "tmp.shadertrap", run_type)[0] is True
+        assert os.path.isfile(tmpdir.join("tmp.shadertrap"))
+        os.remove(tmpdir.join("tmp.shadertrap"))
+    check, message = reconditioner.recondition(str(tmpdir), "missing.shadertrap", "tmp.shadertrap")
+    assert check is False
+    assert "not found" in message
+    capsys.readouterr()
+
+
+def test_recondition_batch(tmpdir, capsys):
+    graphicsfuzz = prepare_fake_graphicsfuzz(tmpdir)
+    shader_output = str(tmpdir.mkdir("shaders")) + "/"
+    shader_tool = ShaderTool("shadertrap", "shadertrap", ".shadertrap")
+    for seed in [3, 4]:
+        shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                    shader_output + "test_" + str(seed) + ".shadertrap")
+    shaders = find_generated_shaders(shader_output, ".shadertrap", [3, 4, 5])
+    reconditioner = Reconditioner(graphicsfuzz)
+    harnesses = reconditioner.recondition_batch(str(tmpdir), shaders, shader_tool)
+    # The missing shader is left out of the batch
+    assert harnesses == {shader_output + "test_3.shadertrap": shader_output + "test_3_re.shadertrap",
+                         shader_output + "test_4.shadertrap": shader_output + "test_4_re.shadertrap"}
+    assert "test_5.shadertrap cannot be parsed" in capsys.readouterr().out
+
+    # Cached harnesses are reused until the shader changes
+    os.utime(shader_output + "test_3_re.shadertrap", (0, 1000))
+    os.utime(shader_output + "test_3.shadertrap", (0, 1000))
+    os.utime(shader_output + "test_4_re.shadertrap", (0, 1000))
+    os.utime(shader_output + "test_4.shadertrap", (0, 2000))
+    assert reconditioner.recondition_batch(str(tmpdir), shaders[0:2], shader_tool) == harnesses
+    assert os.path.getmtime(shader_output + "test_3_re.shadertrap") == 1000
+    assert os.path.getmtime(shader_output + "test_4_re.shadertrap") > 2000
@@ -40,3 +40,20 @@ def test_load_reducers_settings():
     assert reducers[1].input_file == "test.comp"
     assert reducers[1].output_files == "test_reduced_final.comp"
     assert reducers[1].extra_files_to_build == ["test.json"]
+
+
+def test_relocate():
+    reducer = Reducer("glsl-reduce", "/root/graphicsfuzz/glsl-reduce /root/test.json /root/interesting.sh "
+                                     "--output=/root/ --no-ub-guards", "interesting.sh", "test.comp",
+                      "test_reduced_final.comp", ["test.json"])
+    relocated = reducer.relocate("/root/", "/root/sandbox/")
+    # Only the reduction files and the output directory are moved
+    assert relocated.command == "/root/graphicsfuzz/glsl-reduce /root/sandbox/test.json /root/sandbox/interesting.sh " \
+                                "--output=/root/sandbox/ --no-ub-guards"
+    assert reducer.command.startswith("/root/graphicsfuzz/glsl-reduce /root/test.json")
+    relocated.command = reducer.command
+    assert relocated == reducer
+    # Relative commands are not changed
+    reducer = Reducer("picire", "picire --input test.comp --test interesting.sh", "interesting.sh", "test.comp",
+                      "test.comp", [])
+    assert reducer.relocate("/root/", "/root/sandbox/") == reducer
@@ -0,0 +1,103 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+from scripts.utils.Compiler import Compiler
+from scripts.utils.ResultCache import ResultCache
+from scripts.utils.ShaderTool import ShaderTool
+
+
+def test_key(tmpdir):
+    shader_tool = ShaderTool("shadertrap", "shadertrap", ".shadertrap")
+    tmpdir.join("harness_1").write("a")
+    tmpdir.join("harness_2").write("b")
+    compiler = Compiler("a", "a", "independent", " ", " ", [])
+    key = ResultCache.key(compiler, shader_tool, str(tmpdir.join("harness_1")), "standard", 10)
+    assert key == ResultCache.key(compiler, shader_tool, str(tmpdir.join("harness_1")), "standard", 10)
+    # The harness content, the compiler settings, the run type and the timeout are part of the key
+    assert key != ResultCache.key(compiler, shader_tool, str(tmpdir.join("harness_2")), "standard", 10)
+    assert key != ResultCache.key(Compiler("a", "a", "independent", " ", " ", ["X=1"]), shader_tool,
+                                  str(tmpdir.join("harness_1")), "standard", 10)
+    assert key != ResultCache.key(compiler, shader_tool, str(tmpdir.join("harness_1")), "add_id", 10)
+    assert key != ResultCache.key(compiler, shader_tool, str(tmpdir.join("harness_1")), "standard", 3)
+
+
+def test_store_and_lookup(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")))
+    tmpdir.join("buffer_results.txt").write("buffer_0")
+    assert cache.lookup("key", {}, str(tmpdir.join("restored.txt"))) is None
+    cache.store("key", {}, str(tmpdir.join("buffer_results.txt")), False, False, "no_crash")
+    assert cache.lookup("key", {}, str(tmpdir.join("restored.txt"))) == (False, False, "no_crash")
+    assert tmpdir.join("restored.txt").read() == "buffer_0"
+    # Identical buffers are stored once
+    cache.store("other_key", {}, str(tmpdir.join("buffer_results.txt")), True, False, "crash message")
+    assert len(os.listdir(cache.blobs_dir)) == 1
+    assert cache.lookup("other_key", {}, str(tmpdir.join("restored.txt"))) == (True, False, "crash message")
+
+
+def test_driver_invalidation(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")))
+    tmpdir.mkdir("lib").join("libvulkan.so").write("")
+    compiler = Compiler("a", "a", "independent", str(tmpdir.join("lib")), " ", [])
+    shader_tool = ShaderTool("shadertrap", str(tmpdir.join("shadertrap")), ".shadertrap")
+    tmpdir.join("shadertrap").write("")
+    tmpdir.join("buffer_results.txt").write("buffer_0")
+    drivers = cache.driver_fingerprint(compiler, shader_tool)
+    assert sorted(drivers) == [str(tmpdir.join("lib", "libvulkan.so")), str(tmpdir.join("shadertrap"))]
+    cache.store("key", drivers, str(tmpdir.join("buffer_results.txt")), False, False, "no_crash")
+    assert cache.lookup("key", cache.driver_fingerprint(compiler, shader_tool), str(tmpdir.join("out"))) is not None
+    # Updating a library drops the results computed with the previous version
+    os.utime(tmpdir.join("lib", "libvulkan.so"), ns=(0, 0))
+    assert cache.lookup("key", cache.driver_fingerprint(compiler, shader_tool), str(tmpdir.join("out"))) is None
+    assert os.listdir(cache.entries_dir) == []
+
+
+def test_driver_fingerprint(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")))
+    tmpdir.mkdir("lib").join("libvulkan.so").write("")
+    compiler = Compiler("a", "a", "independent", str(tmpdir.join("lib")), " ", [])
+    shader_tool = ShaderTool("shadertrap", str(tmpdir.join("shadertrap")), ".shadertrap")
+    drivers = cache.driver_fingerprint(compiler, shader_tool)
+    assert list(drivers) == [str(tmpdir.join("lib", "libvulkan.so"))]
+    # The library directories are listed once per run
+    tmpdir.join("lib", "libother.so").write("")
+    assert cache.driver_fingerprint(compiler, shader_tool) == drivers
+    assert len(ResultCache(str(tmpdir.join("cache"))).driver_fingerprint(compiler, shader_tool)) == 2
+    # The listed files are checked on every call
+    os.utime(tmpdir.join("lib", "libvulkan.so"), (0, 0))
+    assert cache.driver_fingerprint(compiler, shader_tool) == {str(tmpdir.join("lib", "libvulkan.so")): 0}
+    os.remove(tmpdir.join("lib", "libvulkan.so"))
+    assert cache.driver_fingerprint(compiler, shader_tool) == {}
+
+
+def test_eviction(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")), max_entries=4)
+    for i in range(4):
+        tmpdir.join("buffer_results.txt").write("buffer_" + str(i))
+        cache.store("key_" + str(i), {}, str(tmpdir.join("buffer_results.txt")), False, False, "no_crash")
+        os.utime(cache.entry_path("key_" + str(i)), (i, i))
+    # A lookup makes the entry the most recently used one
+    assert cache.lookup("key_0", {}, str(tmpdir.join("out"))) is not None
+    tmpdir.join("buffer_results.txt").write("buffer_4")
+    cache.store("key_4", {}, str(tmpdir.join("buffer_results.txt")), False, False, "no_crash")
+    # Going over the bound evicts the least recently used entries down to 90% of the bound
+    assert sorted(os.listdir(cache.entries_dir)) == ["key_0.json", "key_3.json", "key_4.json"]
+    assert len(os.listdir(cache.blobs_dir)) == 3
+    assert cache.entry_count == 3
+    # Storing an entry again does not count it twice
+    cache.store("key_4", {}, str(tmpdir.join("buffer_results.txt")), False, False, "no_crash")
+    assert cache.entry_count == 3
+    cache.invalidate()
+    assert os.listdir(cache.entries_dir) == []
+    assert os.listdir(cache.blobs_dir) == []
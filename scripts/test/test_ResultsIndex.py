@@ -0,0 +1,105 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import sqlite3
+
+from scripts.utils.ResultsIndex import ResultsIndex
+
+
+def test_location():
+    assert ResultsIndex.location("/root/glslsmithoutput/keptshaders/") == "/root/glslsmithoutput/results.sqlite"
+
+
+def test_record(tmpdir):
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    tmpdir.join("a_1.txt").write("buffer_0")
+    tmpdir.join("b_1.txt").write("crash")
+    tmpdir.join("c_1.txt").write("timeout")
+    tmpdir.join("1.shadertrap").write("# b\nline\nline\n")
+    buffers = {"a": str(tmpdir.join("a_1.txt")), "b": str(tmpdir.join("b_1.txt")), "c": str(tmpdir.join("c_1.txt")),
+               "missing": str(tmpdir.join("missing_1.txt"))}
+    results_index.record("1", "more than two", [["a"], ["b"], ["c"]], buffers, str(tmpdir.join("1.shadertrap")))
+    results_index.record("10", "a", [["a"], ["b", "c"]], {})
+    results_index.record("2", "b", [["a", "c"], ["b"]], {}, str(tmpdir.join("missing.shadertrap")))
+    assert results_index.findings() == [("1", "more than two", [["a"], ["b"], ["c"]], 3),
+                                        ("2", "b", [["a", "c"], ["b"]], None),
+                                        ("10", "a", [["a"], ["b", "c"]], None)]
+    assert {compiler: status for compiler, (_, status) in results_index.buffers("1").items()} == {
+        "a": "ok", "b": "crash", "c": "timeout"}
+    assert results_index.group_counts() == {"more than two": 1, "a": 1, "b": 1}
+
+    # Recording a seed again updates it and keeps its creation time
+    with sqlite3.connect(str(tmpdir.join("results.sqlite"))) as connection:
+        created = connection.execute("SELECT created FROM findings WHERE seed = '10'").fetchone()[0]
+    results_index.record("10", "b", [["a", "c"], ["b"]], {})
+    assert results_index.group_counts() == {"more than two": 1, "b": 2}
+    with sqlite3.connect(str(tmpdir.join("results.sqlite"))) as connection:
+        assert connection.execute("SELECT created FROM findings WHERE seed = '10'").fetchone()[0] == created
+    results_index.forget(["1", "3"])
+    assert [finding[0] for finding in results_index.findings()] == ["2", "10"]
+    assert results_index.buffers("1") == {}
+    results_index.clear()
+    assert results_index.findings() == []
+
+
+def test_attribution(tmpdir):
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    tmpdir.join("a_1.txt").write("buffer_0")
+    tmpdir.join("b_1.txt").write("buffer_1")
+    results_index.record("1", "b", [["a"], ["b"]], {"a": str(tmpdir.join("a_1.txt")), "b": str(tmpdir.join("b_1.txt"))},
+                         error_code="3002", timings={"execution": 2.0, "comparison": 0.5})
+    results_index.record("2", "a", [["a"], ["b"]], {})
+    attribution = results_index.attribution("1")
+    assert attribution["group"] == "b"
+    assert attribution["groups"] == [["a"], ["b"]]
+    assert attribution["error_code"] == "3002"
+    assert attribution["timings"] == {"execution": 2.0, "comparison": 0.5}
+    assert sorted(attribution["digests"]) == ["a", "b"]
+    assert attribution["digests"]["a"] != attribution["digests"]["b"]
+    assert results_index.attribution("2")["error_code"] is None
+    assert results_index.attribution("2")["timings"] is None
+    assert results_index.attribution("3") is None
+
+
+def test_migration(tmpdir):
+    # Index written before the error codes and the timings were recorded
+    with sqlite3.connect(str(tmpdir.join("results.sqlite"))) as connection:
+        connection.execute("CREATE TABLE findings (seed TEXT PRIMARY KEY, group_name TEXT, groups TEXT, "
+                           "shader_file TEXT, shader_size INTEGER, shader_lines INTEGER, created REAL, updated REAL)")
+        connection.execute("INSERT INTO findings VALUES ('1', 'a', '[[\"a\"], [\"b\"]]', NULL, NULL, NULL, 0, 0)")
+    connection.close()
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    assert results_index.findings() == [("1", "a", [["a"], ["b"]], None)]
+    assert results_index.attribution("1")["error_code"] is None
+    results_index.record("2", "b", [["a"], ["b"]], {}, error_code="3002")
+    assert results_index.attribution("2")["error_code"] == "3002"
+    # The findings recorded before the signatures are not in any bucket
+    assert results_index.buckets() == {results_index.attribution("2")["signature"]: [("2", None)]}
+
+
+def test_buckets(tmpdir):
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    for seed, size in [("1", 30), ("2", 10), ("3", 20)]:
+        tmpdir.join(seed + ".shadertrap").write("x" * size)
+    results_index.record("1", "b", [["a"], ["b"]], {}, str(tmpdir.join("1.shadertrap")), "3002", signature="s1")
+    results_index.record("2", "b", [["a"], ["b"]], {}, str(tmpdir.join("2.shadertrap")), "3002", signature="s1")
+    results_index.record("3", "a", [["a"], ["b"]], {}, str(tmpdir.join("3.shadertrap")), "1001", signature="s2")
+    results_index.record("4", "b", [["a"], ["b"]], {}, None, "3002", signature="s1")
+    # The smallest shaders first
+    assert results_index.buckets() == {"s1": [("2", 10), ("1", 30), ("4", None)], "s2": [("3", 20)]}
+    assert results_index.bucket_counts() == [("s1", "3002", "b", 3), ("s2", "1001", "a", 1)]
+    assert results_index.attribution("3")["signature"] == "s2"
+    # Without signature, the findings with the same error code and group share a bucket
+    results_index.record("5", "c", [["a", "b"], ["c"]], {}, error_code="3003")
+    results_index.record("6", "c", [["a", "b"], ["c"]], {}, error_code="3003")
+    assert results_index.attribution("5")["signature"] == results_index.attribution("6")["signature"]
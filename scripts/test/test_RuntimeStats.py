@@ -0,0 +1,64 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from scripts.utils.RuntimeStats import RuntimeStats
+
+
+def test_timeout():
+    runtime_stats = RuntimeStats(percentile=90, safety_factor=2, min_timeout=1, max_timeout=30, min_samples=10)
+    # The default timeout is used until enough runtimes are known
+    for runtime in range(1, 10):
+        runtime_stats.record("a", runtime)
+    assert runtime_stats.percentile_runtime("a") is None
+    assert runtime_stats.timeout("a", 10) == 10
+    runtime_stats.record("a", 10)
+    assert runtime_stats.percentile_runtime("a") == 9
+    assert runtime_stats.timeout("a", 10) == 18
+    # The timeouts are bounded
+    for _ in range(10):
+        runtime_stats.record("b", 0.01)
+        runtime_stats.record("c", 100)
+    assert runtime_stats.timeout("b") == 1
+    assert runtime_stats.timeout("c") == 30
+    assert runtime_stats.timeout("d", 100) == 30
+
+
+def test_for_reduction():
+    runtime_stats = RuntimeStats(safety_factor=2, min_samples=1)
+    runtime_stats.record("a", 10)
+    reduction_stats = runtime_stats.for_reduction()
+    # The first runtime of the reduction is the reference of the compiler
+    reduction_stats.record("a", 2)
+    reduction_stats.record("a", 5)
+    assert reduction_stats.timeout("a") == 4
+    assert reduction_stats.timeout("b", 10) == 10
+    # The runtimes are shared with the original statistics, which are not tightened
+    assert runtime_stats.samples["a"] == [10, 2, 5]
+    assert runtime_stats.timeout("a") == 20
+
+
+def test_save(tmpdir):
+    stats_file = str(tmpdir.join("runtimes.json"))
+    runtime_stats = RuntimeStats(stats_file, max_samples=3)
+    for runtime in range(5):
+        runtime_stats.record("a", runtime)
+    runtime_stats.save()
+    with open(stats_file, "r") as f:
+        assert json.load(f) == {"a": [2, 3, 4]}
+    assert RuntimeStats(stats_file).samples == {"a": [2, 3, 4]}
+    # Unreadable statistics are ignored
+    tmpdir.join("runtimes.json").write("{")
+    assert RuntimeStats(stats_file).samples == {}
@@ -0,0 +1,69 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import multiprocessing
+
+from scripts.utils.SeedLedger import SeedLedger
+
+
+def test_merge():
+    assert SeedLedger.merge([], 5, 10) == [(5, 10)]
+    assert SeedLedger.merge([(0, 5), (20, 30)], 5, 10) == [(0, 10), (20, 30)]
+    assert SeedLedger.merge([(0, 5), (20, 30)], 3, 25) == [(0, 30)]
+    assert SeedLedger.merge([(0, 5), (20, 30)], 10, 15) == [(0, 5), (10, 15), (20, 30)]
+
+
+def test_first_free():
+    intervals = [(0, 5), (8, 10), (20, 30)]
+    assert SeedLedger.first_free(intervals, 0, 3) == 5
+    assert SeedLedger.first_free(intervals, 0, 4) == 10
+    assert SeedLedger.first_free(intervals, 12, 8) == 12
+    assert SeedLedger.first_free(intervals, 12, 9) == 30
+    assert SeedLedger.first_free([], 100, 50) == 100
+
+
+def test_allocate(tmpdir):
+    seed_ledger = SeedLedger(str(tmpdir.join("ledger").join("seeds.json")))
+    # Batches started within the same second get disjoint ranges
+    assert seed_ledger.allocate(50, 1000) == 1000
+    assert seed_ledger.allocate(50, 1010) == 1050
+    seed_ledger.record(1200, 10)
+    assert seed_ledger.allocate(101, 1100) == 1210
+    assert seed_ledger.allocate(100, 1100) == 1100
+    assert seed_ledger.explored() == [(1000, 1311)]
+    seed_ledger.record(2000, 10)
+    assert json.loads(tmpdir.join("ledger").join("seeds.json").read()) == {"explored": [[1000, 1311], [2000, 2010]]}
+    # Allocations from the current time
+    assert seed_ledger.allocate(10) >= 2010
+
+
+def test_corrupted_ledger(tmpdir, capsys):
+    tmpdir.join("seeds.json").write("{\"explored\": [[0,")
+    seed_ledger = SeedLedger(str(tmpdir.join("seeds.json")))
+    assert seed_ledger.allocate(10, 0) == 0
+    assert seed_ledger.explored() == [(0, 10)]
+    assert "cannot be read" in capsys.readouterr().out
+
+
+def allocate_ranges(path, count):
+    return [SeedLedger(path).allocate(10, 0) for _ in range(count)]
+
+
+def test_concurrent_processes(tmpdir):
+    path = str(tmpdir.join("seeds.json"))
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        seeds = [seed for seeds in pool.starmap(allocate_ranges, [(path, 5)] * 4) for seed in seeds]
+    # 20 disjoint ranges of 10 seeds
+    assert sorted(seeds) == list(range(0, 200, 10))
+    assert SeedLedger(path).explored() == [(0, 200)]
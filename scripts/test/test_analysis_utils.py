@@ -1,7 +1,9 @@
 import pytest
 
 from scripts.utils.Compiler import Compiler
-from scripts.utils.analysis_utils import attribute_compiler_results, comparison_helper
+from scripts.utils.DigestCache import DigestCache
+from scripts.utils.analysis_utils import attribute_compiler_results, comparison_helper, normalize_crash_message, \
+    finding_signature
 
 
 @pytest.mark.parametrize("seed, group",
@@ -20,6 +22,8 @@ def test_comparison_helper(seed, group):
     file_list = list(
         map(lambda text: "testdata/keptbuf/" + text + "_" + str(seed) + ".txt", ["a", "a_x", "b", "c", "d"]))
     assert comparison_helper(file_list) == group
+    # The grouping does not depend on the hash function
+    assert comparison_helper(file_list, DigestCache("md5")) == group
 
 
 @pytest.mark.parametrize("results, group", [([["a", "b"], ["c"]], "c"),
@@ -36,3 +40,21 @@ def test_attribute_compiler_results(results, group):
                      "e": Compiler("e", "e", "independent", "", "", []),
                      "f": Compiler("f", "f", "angle", "", "", [])}
     assert attribute_compiler_results(results, compiler_dict) == group
+
+
+def test_normalize_crash_message():
+    assert normalize_crash_message("Segmentation fault at 0x7ffd2a3c in /tmp/seed_12_abc/tmp.shadertrap line 42\n") \
+        == "Segmentation fault at ADDR in PATH line N"
+    # Only the first lines are kept, blank lines and spacing are ignored
+    assert normalize_crash_message("a\n\n  b   c\nd\ne\n") == "a\nb c\nd"
+
+
+def test_finding_signature():
+    signature = finding_signature("1004", "b", {"b": "Assertion failed at 0x1234 (seed 12)"})
+    assert len(signature) == 16
+    # Same bug on another shader
+    assert finding_signature("1004", "b", {"b": "Assertion failed at 0xabcd (seed 555)"}) == signature
+    assert finding_signature("1004", "b", {"b": "Segmentation fault"}) != signature
+    assert finding_signature("1002", "b", {"b": "Assertion failed at 0x1234 (seed 12)"}) != signature
+    assert finding_signature("3002", "b") == finding_signature("3002", "b", {})
+    assert finding_signature("3002", "b") != finding_signature("3002", "c")
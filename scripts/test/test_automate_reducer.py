@@ -18,7 +18,11 @@ import sys
 import pytest
 
 from scripts.automate_reducer import get_files_to_reduce, run_reduction, batch_reduction, main
-from scripts.test.conftest import prepare_tmp_env
+from scripts.test.conftest import prepare_tmp_env, prepare_fake_graphicsfuzz
+from scripts.utils.Compiler import Compiler
+from scripts.utils.Reducer import Reducer
+from scripts.utils.ResultsIndex import ResultsIndex
+from scripts.utils.ShaderTool import ShaderTool
 from scripts.utils.file_utils import ensure_abs_path
 
 
@@ -50,6 +54,24 @@ def test_get_files_to_reduce(tmpdir, conf, use_kept, test_shader, keptshaders, e
         assert all([execdirs.keptshaderdir in f for f in files])
 
 
+@pytest.mark.parametrize("representatives, expected", [
+    (0, ["1", "2", "5", "6"]), (1, ["6"]), (2, ["2", "5", "6"]), (3, ["1", "2", "5", "6"])])
+def test_get_files_to_reduce_representatives(tmpdir, conf, capsys, representatives, expected):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    results_index = ResultsIndex(ResultsIndex.location(execdirs.keptshaderdir))
+    # Bucket s1: 2 (the smallest), 3 (already reduced) and 1, bucket s2: 4 (already reduced) and 5, 6 is not indexed
+    for seed, size, signature in [("1", 30, "s1"), ("2", 10, "s1"), ("3", 20, "s1"), ("4", 5, "s2"), ("5", 50, "s2")]:
+        tmpdir.join("keptshaders").join(seed + ".shadertrap").write("x" * size)
+        results_index.record(seed, "b", [["a"], ["b"]], {}, execdirs.keptshaderdir + seed + ".shadertrap",
+                             signature=signature)
+    for file in ["3_re.shadertrap", "4_re.shadertrap", "6.shadertrap"]:
+        tmpdir.join("keptshaders").join(file).write("x")
+    files = get_files_to_reduce(True, "", execdirs.keptshaderdir, representatives)
+    assert sorted(os.path.basename(file) for file in files) == sorted(seed + ".shadertrap" for seed in expected)
+    if representatives > 0:
+        assert "4 shaders to reduce in 2 buckets, " + str(len(expected)) + " of them reduced" in capsys.readouterr().out
+
+
 @pytest.mark.parametrize("error_code, expect_reduction, success, message",
                          [(0, False, False, "No error"),
                           (3001, True, True, "Reduction finished"),
@@ -134,6 +156,48 @@ def test_batch_reduction(capsys, mocker, conf, tmpdir, files_to_reduce, simulate
         pytest.mark.skip("No test for Amber")
 
 
+@pytest.mark.parametrize("time_budget", [None, 1])
+def test_batch_reduction_jobs(conf, tmpdir, capsys, time_budget):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    execdirs.graphicsfuzz = prepare_fake_graphicsfuzz(tmpdir)
+    os.symlink(os.getcwd(), execdirs.execdir + "scripts")
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+    files_to_reduce = []
+    for i in range(3):
+        files_to_reduce.append(execdirs.keptshaderdir + str(i) + ".shadertrap")
+        shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", files_to_reduce[-1])
+    # The fake reducer keeps the shader as it is if it is interesting
+    if time_budget is None:
+        command = "bash -c 'bash interesting.sh && cp test.comp test_reduced_final.comp'"
+    else:
+        command = "sleep 30"
+    reducer = Reducer("fake", command, "interesting.sh", "test.comp", "test_reduced_final.comp", [])
+    batch_reduction(reducer, compilers_dict, execdirs, files_to_reduce, shader_tool, jobs=2, time_budget=time_budget)
+
+    # The sandboxes are removed, the logs (written by the interestingness checks) and the reducer outputs are kept
+    kept_files = ["scripts"] + ["fake_" + str(i) + ".out" for i in range(3)]
+    if time_budget is None:
+        kept_files += ["fake_" + str(i) + ".log" for i in range(3)]
+    assert sorted(os.listdir(execdirs.execdir)) == sorted(kept_files)
+    if time_budget is None:
+        assert sorted(os.listdir(execdirs.keptshaderdir)) == sorted([str(i) + ".shadertrap" for i in range(3)]
+                                                                    + [str(i) + "_re.shadertrap" for i in range(3)])
+        with open(execdirs.execdir + "fake_0.log", "r") as f:
+            assert f.readlines()[1].strip() == "1"
+    else:
+        assert sorted(os.listdir(execdirs.keptshaderdir)) == [str(i) + ".shadertrap" for i in range(3)]
+        assert "Reduction stopped after the time budget of 1s" in capsys.readouterr().out
+
+
+def test_batch_reduction_jobs_without_server(conf, tmpdir):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    with pytest.raises(SystemExit):
+        batch_reduction(conf["reducers"][0], conf["compilers"], execdirs, [], conf["shadertools"][0],
+                        interestingness_server=False, jobs=2)
+
+
 @pytest.mark.parametrize("files, use_execdir, expected", [
     (["test_42.shadertrap"], True, ["test_42.shadertrap", "test_42_re.shadertrap"]),
     (["test.shadertrap", "test2.shadertrap"], False,
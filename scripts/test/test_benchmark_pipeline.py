@@ -0,0 +1,69 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import pytest
+
+from scripts.benchmark_pipeline import run_scenario, tool_settings, find_regressions, build_compilers
+
+
+@pytest.mark.parametrize("host", ["shadertrap", "amber"])
+def test_run_scenario(host):
+    with tool_settings(buffer_size=1000):
+        result = run_scenario(host, 3, 2, reductions=1, reduction_checks=2)
+    assert result["shaders"] == 3
+    assert result["compilers"] == 2
+    assert result["shaders_per_second"] > 0
+    # Every shader is executed and kept (the last compiler differs), the reduction is timed
+    assert {"generation", "reconditioning", "driver", "comparison", "saving"} <= set(result["stages"])
+    assert result["overhead"] is not None
+    assert result["reduction_check"] > 0
+    assert result["memory"] > 0
+
+
+def test_run_scenario_concurrent():
+    result = run_scenario("shadertrap", 2, 2, differing=0, jobs=2, trace_memory=True)
+    # Nothing is kept and the time left to the scripts is unknown when the shaders overlap
+    assert "saving" not in result["stages"]
+    assert result["overhead"] is None
+    assert result["reduction_check"] is None
+
+
+def test_tool_settings():
+    os.environ["FAKE_DRIVER_LATENCY"] = "3"
+    try:
+        with tool_settings(driver_latency=0.5, buffer_size=10):
+            assert os.environ["FAKE_DRIVER_LATENCY"] == "0.5"
+            assert os.environ["FAKE_BUFFER_SIZE"] == "10"
+        assert os.environ["FAKE_DRIVER_LATENCY"] == "3"
+        assert "FAKE_BUFFER_SIZE" not in os.environ
+    finally:
+        del os.environ["FAKE_DRIVER_LATENCY"]
+
+
+def test_build_compilers():
+    compilers = build_compilers("shadertrap", 3, 2)
+    assert [compiler.renderer for compiler in compilers.values()] == ["compiler_0", "compiler_1 differ",
+                                                                      "compiler_2 differ"]
+    compilers = build_compilers("amber", 2)
+    assert [compiler.vkfilename for compiler in compilers.values()] == ["compiler_0", "compiler_1 differ"]
+
+
+def test_find_regressions():
+    baseline = [{"host": "shadertrap", "shaders": 10, "compilers": 2, "shaders_per_second": 10.0},
+                {"host": "shadertrap", "shaders": 10, "compilers": 4, "shaders_per_second": 5.0}]
+    results = [{"host": "shadertrap", "shaders": 10, "compilers": 2, "shaders_per_second": 8.5},
+               {"host": "shadertrap", "shaders": 10, "compilers": 4, "shaders_per_second": 3.0},
+               {"host": "amber", "shaders": 10, "compilers": 2, "shaders_per_second": 1.0}]
+    assert find_regressions(results, baseline, 0.2) == [("shadertrap/10x4", 5.0, 3.0)]
@@ -19,7 +19,7 @@ import sys
 
 from scripts.test.conftest import prepare_tmp_env
 from scripts.create_shell_code import build_shell_test, main
-from scripts.utils.execution_utils import build_compiler_dict
+from scripts.utils.Configuration import build_compiler_dict
 from scripts.utils.file_utils import clean_files, ensure_abs_path
 
 
@@ -53,7 +53,8 @@ def test_build_shell_test_error(tmpdir, mocker, conf):
         assert lines[0] == "#!/usr/bin/env bash\n"
         assert lines[18] == "ERROR_CODE_IN_FILE=$( (python3 ${ROOT}/scripts/reduction_helper.py --config-file ${" \
                             "ROOT}/scripts/config.xml --shader-name ${ROOT}/test.shadertrap --host " +\
-                            conf["shadertools"][0].name + " 2>&1 > /dev/null) || true)\n"
+                            conf["shadertools"][0].name + " --expected-error-code \"$ERROR_CODE\" 2>&1 > /dev/null) " \
+                            "|| true)\n"
     os.remove(os.path.join(execdirs.execdir, "interesting.sh"))
     # Test double-run option
     assert build_shell_test(build_compiler_dict(conf["compilers"]), execdirs, conf["shadertools"][0], "test.shadertrap",
@@ -65,7 +66,8 @@ def test_build_shell_test_error(tmpdir, mocker, conf):
         assert lines[0] == "#!/usr/bin/env bash\n"
         assert lines[18] == "ERROR_CODE_IN_FILE=$( (python3 ${ROOT}/scripts/reduction_helper.py --config-file ${" \
                             "ROOT}/scripts/config.xml --shader-name ${ROOT}/test.shadertrap --host " +\
-                            conf["shadertools"][0].name + " --double-run 2>&1 > /dev/null) || true)\n"
+                            conf["shadertools"][0].name + " --double-run --expected-error-code \"$ERROR_CODE\" 2>&1 " \
+                            "> /dev/null) || true)\n"
 
 
 def test_main(conf):
@@ -1,15 +1,20 @@
 import copy
+import json
 import os.path
 import shutil
 import sys
 
 import pytest
-from scripts.exec_glslsmith import write_output_to_file, glsl_output, validate_compiler, syntax_check, save_test_case, \
-    exec_glslsmith, main
-from scripts.test.conftest import compare_files, restrict_compilers, prepare_tmp_env
+from scripts.exec_glslsmith import glsl_output, validate_compiler, syntax_check, save_test_case, exec_glslsmith, main, \
+    instrumentation, journal, clean_interrupted_seeds
+from scripts.test.conftest import compare_files, restrict_compilers, prepare_tmp_env, prepare_fake_graphicsfuzz
+from scripts.utils.BatchJournal import BatchJournal
 from scripts.utils.Compiler import Compiler
+from scripts.utils.Configuration import build_compiler_dict
+from scripts.utils.Reconditioner import Reconditioner
+from scripts.utils.ResultsIndex import ResultsIndex
+from scripts.utils.SeedLedger import SeedLedger
 from scripts.utils.ShaderTool import ShaderTool
-from scripts.utils.execution_utils import build_compiler_dict
 from scripts.utils.file_utils import ensure_abs_path, clean_files
 
 
@@ -66,14 +71,6 @@ def test_glsl_output(tmpdir, conf):
         assert e.value.code == 1
 
 
-@pytest.mark.parametrize("text, location, result", [
-    ("# cp1", "file1.txt", "file1_result.txt"), ("# Whatever\n", "file2.shadertrap", "file2_result.shadertrap")])
-def test_write_output_to_file(tmpdir, text, location, result):
-    shutil.copy("testdata/exec_glslsmith/" + location, str(tmpdir) + "/" + location)
-    write_output_to_file(text, str(tmpdir) + "/" + location)
-    compare_files("testdata/exec_glslsmith/" + result, str(tmpdir) + "/" + location)
-
-
 def test_save_test_case(tmpdir, compilers_dict):
     tmpdir.mkdir("dumpshaders")
     tmpdir.mkdir("keptshaders")
@@ -91,12 +88,22 @@ def test_save_test_case(tmpdir, compilers_dict):
 
     save_test_case(str(tmpdir) + "/keptshaders/", str(tmpdir) + "/dumpbuffers/", str(tmpdir) + "/keptbuffers/",
                    compilers_dict, str(tmpdir) + "/dumpshaders/test.shadertrap", "1",
-                   ShaderTool("shadertrap", "shadertrap/unused", ".shadertrap"))
-    assert os.path.isfile(tmpdir.join("keptshaders/1.shadertrap"))
+                   ShaderTool("shadertrap", "shadertrap/unused", ".shadertrap"), error_code="3001",
+                   timings={"execution": 1.5, "comparison": 0.25})
+    # The kept shader is the generated one
+    compare_files("testdata/exec_glslsmith/test_0.shadertrap", str(tmpdir.join("keptshaders/1.shadertrap")))
     for name in name_list:
         assert os.path.isfile(tmpdir.join("keptbuffers/" + name + "_1.txt"))
 
     assert len(os.listdir(tmpdir.join("dumpshaders"))) == 0
+
+    # The test case is registered in the results index of the output directory
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    assert [finding[0] for finding in results_index.findings()] == ["1"]
+    assert sorted(results_index.buffers("1")) == sorted(name_list)
+    attribution = results_index.attribution("1")
+    assert attribution["error_code"] == "3001"
+    assert attribution["timings"] == {"execution": 1.5, "comparison": 0.25}
     assert len(os.listdir(tmpdir.join("dumpbuffers"))) == 0
 
 
@@ -221,3 +228,226 @@ def test_main(conf, tmpdir, capsys):
                         [compiler.name + "_0.txt", compiler.name + "_1.txt"])
     finally:
         os.chdir(script_location)
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_exec_glslsmith_jobs(mocker, conf, tmpdir, capsys, jobs):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+
+    def fake_generation(graphicsfuzz, exec_dir, shader_count, output_directory, seed, host):
+        for i in range(shader_count):
+            shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                        output_directory + "test_" + str(seed + i) + ".shadertrap")
+        return True, "SUCCESS!"
+
+    mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', side_effect=fake_generation)
+    reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+    exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, 10, 4, jobs=jobs,
+                   reconditioner=reconditioner)
+    # Every seed is kept with the buffers of each compiler and the sandboxes are removed
+    assert sorted(os.listdir(execdirs.keptshaderdir)) == [str(seed) + ".shadertrap" for seed in range(10, 14)]
+    assert len(os.listdir(execdirs.keptbufferdir)) == 4 * len(compilers_dict)
+    assert len(os.listdir(execdirs.dumpbufferdir)) == 0
+    assert len(os.listdir(execdirs.execdir)) == 0
+    # The findings of the same bug (same shader on the same compilers) share their bucket
+    assert len(ResultsIndex(ResultsIndex.location(execdirs.keptshaderdir)).buckets()) == 1
+    outputs = capsys.readouterr().out
+    for seed in range(10, 14):
+        assert "Differences on shader: " + str(seed) in outputs
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_exec_glslsmith_pipeline(mocker, conf, tmpdir, capsys, jobs):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+
+    def fake_generation(graphicsfuzz, exec_dir, shader_count, output_directory, seed, host):
+        for i in range(shader_count):
+            shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                        output_directory + "test_" + str(seed + i) + ".shadertrap")
+        return True, "SUCCESS!"
+
+    generator = mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', side_effect=fake_generation)
+    reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+    exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, 10, 7, jobs=jobs,
+                   reconditioner=reconditioner, pipeline_chunk=3)
+    # The batch is generated by chunks and every seed is executed
+    assert [call.args[2] for call in generator.call_args_list] == [3, 3, 1]
+    assert [call.args[4] for call in generator.call_args_list] == [10, 13, 16]
+    assert sorted(os.listdir(execdirs.keptshaderdir)) == sorted(str(seed) + ".shadertrap" for seed in range(10, 17))
+    assert len(os.listdir(execdirs.keptbufferdir)) == 7 * len(compilers_dict)
+    assert len(os.listdir(execdirs.dumpbufferdir)) == 0
+    outputs = capsys.readouterr().out
+    for seed in range(10, 17):
+        assert "Differences on shader: " + str(seed) in outputs
+
+
+def test_exec_glslsmith_pipeline_generation_error(mocker, conf, tmpdir, capsys):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+
+    def fake_generation(graphicsfuzz, exec_dir, shader_count, output_directory, seed, host):
+        if seed != 0:
+            return False, "Generation error"
+        for i in range(shader_count):
+            shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                        output_directory + "test_" + str(seed + i) + ".shadertrap")
+        return True, "SUCCESS!"
+
+    mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', side_effect=fake_generation)
+    reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+    with pytest.raises(SystemExit) as e:
+        exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, 0, 4,
+                       reconditioner=reconditioner, pipeline_chunk=2)
+    assert e.value.code == 1
+    # The chunk generated before the error is still executed
+    assert sorted(os.listdir(execdirs.keptshaderdir)) == ["0.shadertrap", "1.shadertrap"]
+    assert "Generation error" in capsys.readouterr().out
+
+
+def test_exec_glslsmith_instrumentation(mocker, conf, tmpdir, capsys):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+
+    def fake_generation(graphicsfuzz, exec_dir, shader_count, output_directory, seed, host):
+        for i in range(shader_count):
+            shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                        output_directory + "test_" + str(seed + i) + ".shadertrap")
+        return True, "SUCCESS!"
+
+    mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', side_effect=fake_generation)
+    instrumentation.start(str(tmpdir.join("timings.jsonl")), str(tmpdir.join("glslsmith.prom")))
+    try:
+        reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+        exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, 10, 4, jobs=2, compile_jobs=2,
+                       reconditioner=reconditioner)
+    finally:
+        instrumentation.stop()
+    with open(str(tmpdir.join("timings.jsonl")), "r") as f:
+        records = [json.loads(line) for line in f]
+    # Every stage is recorded, the drivers by seed and compiler (also from the threads of the compilers)
+    assert set(record["stage"] for record in records) == {"generation", "reconditioning", "driver", "concatenation",
+                                                          "comparison", "saving"}
+    assert sorted((record["seed"], record["compiler"]) for record in records if record["stage"] == "driver") == \
+        [(str(seed), compiler) for seed in range(10, 14) for compiler in ["a", "b"]]
+    assert all(record["wall"] >= 0 for record in records)
+    assert "glslsmith_shaders_total 4" in tmpdir.join("glslsmith.prom").read()
+    outputs = capsys.readouterr().out
+    assert "Executed 4 shaders in" in outputs
+    assert "Slowest compilers: " in outputs
+
+
+def test_exec_glslsmith_resume(mocker, conf, tmpdir, capsys):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+    generator = mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', return_value=(True, "SUCCESS!"))
+
+    # Batch interrupted after saving 10 and 11, while executing 12 (buffers left in dumpbufferdir) and 13 (copy of
+    # the execution directory left in execdir)
+    for seed in ["10", "11"]:
+        shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", execdirs.keptshaderdir + seed + ".shadertrap")
+    for seed in ["12", "13"]:
+        shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                    execdirs.shaderoutput + "test_" + seed + ".shadertrap")
+    tmpdir.join("bufferoutput").join("a_12.txt").write("partial")
+    os.mkdir(execdirs.execdir + "seed_13_x")
+    journal_path = str(tmpdir.join("journal.jsonl"))
+    with open(journal_path, "w") as f:
+        f.write("\n".join(json.dumps(entry) for entry in [
+            {"event": "batch", "seed": 10, "shader_count": 4}] + [
+            {"event": "generated", "seed": str(seed)} for seed in range(10, 14)] + [
+            {"event": "compared", "seed": "10", "kept": True}, {"event": "saved", "seed": "10"},
+            {"event": "compared", "seed": "11", "kept": True}, {"event": "saved", "seed": "11"},
+            {"event": "executed", "seed": "12"}]) + "\n" + '{"event": "comp')
+
+    journal.start(journal_path)
+    try:
+        resumed = journal.interrupted_batch()
+        reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+        exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, -1, 50,
+                       reconditioner=reconditioner, resumed=resumed)
+        # The batch is over
+        assert journal.interrupted_batch() is None
+    finally:
+        journal.stop()
+    # Only the interrupted seeds are executed, their shaders are not generated again
+    generator.assert_not_called()
+    assert sorted(os.listdir(execdirs.keptshaderdir)) == [str(seed) + ".shadertrap" for seed in range(10, 14)]
+    assert sorted(os.listdir(execdirs.keptbufferdir)) == sorted(compiler + "_" + seed + ".txt"
+                                                                for compiler in ["a", "b"] for seed in ["12", "13"])
+    assert len(os.listdir(execdirs.dumpbufferdir)) == 0
+    assert len(os.listdir(execdirs.execdir)) == 0
+    outputs = capsys.readouterr().out
+    assert "Resuming the batch with seed:10 (2 of 4 shaders already executed)" in outputs
+    assert "Differences on shader: 11" not in outputs
+    assert "Differences on shader: 13" in outputs
+
+
+def test_clean_interrupted_seeds(conf, tmpdir):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", "shadertrap/unused", ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b", "independent", " ", " ", [])}
+    journal_path = str(tmpdir.join("journal.jsonl"))
+    batch_journal = BatchJournal()
+    batch_journal.start(journal_path)
+    batch_journal.start_batch(0, 2)
+    batch_journal.generated(["0", "1"])
+    batch_journal.compared("0", True)
+    batch_journal.saved("0")
+    batch_journal.compared("1", True)
+    # 1 was interrupted while moving its buffers
+    for seed in ["0", "1"]:
+        tmpdir.join("keptshaders").join(seed + ".shadertrap").write("shader")
+        tmpdir.join("keptbuffers").join("a_" + seed + ".txt").write("buffer")
+    tmpdir.join("keptbuffers").join("b_0.txt").write("buffer")
+    tmpdir.join("bufferoutput").join("b_1.txt").write("buffer")
+    # 1 was already registered in the results index
+    results_index = ResultsIndex(ResultsIndex.location(execdirs.keptshaderdir))
+    for seed in ["0", "1"]:
+        results_index.record(seed, "a", [["a"], ["b"]], {"a": execdirs.keptbufferdir + "a_" + seed + ".txt"})
+    resumed = batch_journal.interrupted_batch()
+    clean_interrupted_seeds(execdirs, compilers_dict, shader_tool, resumed)
+    assert [finding[0] for finding in results_index.findings()] == ["0"]
+    assert results_index.buffers("1") == {}
+    assert os.listdir(execdirs.keptshaderdir) == ["0.shadertrap"]
+    assert sorted(os.listdir(execdirs.keptbufferdir)) == ["a_0.txt", "b_0.txt"]
+    assert len(os.listdir(execdirs.dumpbufferdir)) == 0
+    # The shader of 1 is restored instead of being generated again
+    assert resumed.generated == {"0", "1"}
+    assert os.path.isfile(execdirs.shaderoutput + "test_1.shadertrap")
+
+
+def test_exec_glslsmith_seed_ledger(mocker, conf, tmpdir, capsys):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", [])}
+
+    def fake_generation(graphicsfuzz, exec_dir, shader_count, output_directory, seed, host):
+        for i in range(shader_count):
+            shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap",
+                        output_directory + "test_" + str(seed + i) + ".shadertrap")
+        return True, "SUCCESS!"
+
+    generator = mocker.patch('scripts.exec_glslsmith.call_glslsmith_generator', side_effect=fake_generation)
+    seed_ledger = SeedLedger(str(tmpdir.join("seeds.json")))
+    # Batches without a given seed never run the same seeds, batches with a seed are recorded as given
+    reconditioner = Reconditioner(prepare_fake_graphicsfuzz(tmpdir))
+    for seed in [-1, -1, 5]:
+        exec_glslsmith(execdirs, compilers_dict, conf["reducers"][0], shader_tool, seed, 2,
+                       reconditioner=reconditioner, seed_ledger=seed_ledger)
+    first_seed, second_seed, third_seed = [call.args[4] for call in generator.call_args_list]
+    assert second_seed == first_seed + 2
+    assert third_seed == 5
+    assert seed_ledger.explored() == [(5, 7), (first_seed, first_seed + 4)]
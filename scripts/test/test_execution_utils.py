@@ -20,16 +20,19 @@ import sys
 import pytest
 
 from scripts.utils import execution_utils
+from scripts.utils.Compiler import Compiler
+from scripts.utils.Configuration import build_compiler_dict, select_reducer, select_shader_tool, env_setup
 from scripts.utils.Reducer import Reducer
+from scripts.utils.ResultCache import ResultCache
+from scripts.utils.RuntimeStats import RuntimeStats
 from scripts.utils.ShaderTool import ShaderTool
-from scripts.utils.execution_utils import select_reducer, select_shader_tool, env_setup, find_amber_buffers, \
-    prepare_amber_command, prepare_shadertrap_command, collect_process_return, single_compile, call_glslsmith_generator, \
-    call_glslsmith_reconditioner
+from scripts.utils.execution_utils import find_amber_buffers, prepare_amber_command, prepare_shadertrap_command, \
+    collect_process_return, single_compile, call_glslsmith_generator, call_glslsmith_reconditioner
 
 
 def test_build_compiler_dict(compilers_list, compilers_dict):
-    assert execution_utils.build_compiler_dict(compilers_list, []) == compilers_dict
-    assert execution_utils.build_compiler_dict(compilers_list, ["a", "d_x", "f"]) == {"a": compilers_dict["a"],
+    assert build_compiler_dict(compilers_list, []) == compilers_dict
+    assert build_compiler_dict(compilers_list, ["a", "d_x", "f"]) == {"a": compilers_dict["a"],
                                                                                       "d_x": compilers_dict["d_x"],
                                                                                       "f": compilers_dict["f"]}
 
@@ -230,7 +233,7 @@ def test_execute_compilation(tmpdir, conf, capsys):
     # Non existing file (except error)
     tmpdir.mkdir("empty")
     shader_tool: ShaderTool = conf["shadertools"][0]
-    compilers_dict = execution_utils.build_compiler_dict(conf["compilers"])
+    compilers_dict = build_compiler_dict(conf["compilers"])
     assert execution_utils.execute_compilation(compilers_dict, conf["exec_dirs"].graphicsfuzz,
                                                str(tmpdir.join("empty")) + "/",
                                                shader_tool, "empty.shadertrap") == ["missing"] * len(compilers_dict)
@@ -288,3 +291,97 @@ def test_execute_compilation(tmpdir, conf, capsys):
     assert os.path.isfile(str(tmpdir.join("add_id")) + "/tmp" + shader_tool.file_extension)
     assert filecmp.cmp("testdata/execution_utils/tmp" + shader_tool.file_extension,
                        str(tmpdir.join("add_id")) + "/tmp" + shader_tool.file_extension, shallow=False)
+
+
+def test_execute_compilation_parallel(tmpdir, capsys):
+    # Use a stand-in for ShaderTrap to check the buffers of each compiler without the real drivers
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", []),
+                      "c": Compiler("c", "c crash", "independent", " ", " ", [])}
+    results = {}
+    for compile_jobs in [1, 3]:
+        run_dir = str(tmpdir.mkdir("jobs_" + str(compile_jobs))) + "/"
+        shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", run_dir + "shader_1.shadertrap")
+        messages = execution_utils.execute_compilation(compilers_dict, "", run_dir, shader_tool, "shader_1.shadertrap",
+                                                       run_type="no_postprocessing", compile_jobs=compile_jobs)
+        assert messages[0:2] == ["no_crash", "no_crash"]
+        assert "simulated crash" in messages[2]
+        results[compile_jobs] = {}
+        for compiler_name in compilers_dict:
+            with open(run_dir + compiler_name + ".txt", "r") as f:
+                results[compile_jobs][compiler_name] = f.read()
+        # Scratch directories are removed once the compilers are done
+        assert not any(os.path.isdir(run_dir + f) for f in os.listdir(run_dir))
+    assert results[1] == results[3]
+    assert results[3]["c"] == "crash"
+    capsys.readouterr()
+
+
+def test_single_compile_keeps_working_directory(tmpdir, capsys):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    script_location = os.getcwd()
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", str(tmpdir) + "/shader_1.shadertrap")
+    # Relative shader names are taken from the execution directory
+    assert single_compile(str(tmpdir), Compiler("a", "a", "independent", " ", " ", []), "shader_1.shadertrap",
+                          shader_tool) == (False, False, "no_crash")
+    assert os.getcwd() == script_location
+    assert tmpdir.join("buffer_results.txt").read() == "buffer_0"
+    assert not os.path.isfile(tmpdir.join("buffer_0.txt"))
+    crash, timeout, message = single_compile(str(tmpdir), Compiler("b", "b crash", "independent", " ", " ", []),
+                                             str(tmpdir) + "/shader_1.shadertrap", shader_tool)
+    assert crash is True and timeout is False
+    assert "simulated crash" in message
+    assert tmpdir.join("buffer_results.txt").read() == "crash"
+    capsys.readouterr()
+
+
+def test_execute_compilation_result_cache(mocker, tmpdir, capsys):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b crash", "independent", " ", " ", [])}
+    result_cache = ResultCache(str(tmpdir.join("cache")))
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", str(tmpdir) + "/shader_1.shadertrap")
+    compile_spy = mocker.spy(execution_utils, "single_compile")
+    for compile_jobs in [1, 2, 1]:
+        messages = execution_utils.execute_compilation(compilers_dict, "", str(tmpdir), shader_tool,
+                                                       "shader_1.shadertrap", run_type="no_postprocessing",
+                                                       compile_jobs=compile_jobs, result_cache=result_cache)
+        assert messages[0] == "no_crash"
+        assert "simulated crash" in messages[1]
+        assert tmpdir.join("a.txt").read() == "buffer_0"
+        assert tmpdir.join("b.txt").read() == "crash"
+    # Only the first execution went through the shader tool
+    assert compile_spy.call_count == 2
+    capsys.readouterr()
+
+
+def test_cached_compile_timeout(mocker, tmpdir):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    result_cache = ResultCache(str(tmpdir.join("cache")))
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", str(tmpdir) + "/shader_1.shadertrap")
+    compile_spy = mocker.spy(execution_utils, "single_compile")
+    for _ in range(2):
+        assert execution_utils.cached_compile(str(tmpdir), Compiler("b", "b timeout", "independent", " ", " ", []),
+                                              "shader_1.shadertrap", shader_tool, timeout=0.5,
+                                              run_type="no_postprocessing", result_cache=result_cache)[1] is True
+    # Time-outs are executed again
+    assert compile_spy.call_count == 2
+    assert os.listdir(result_cache.entries_dir) == []
+
+
+def test_execute_compilation_runtime_stats(tmpdir, capsys):
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b timeout", "independent", " ", " ", [])}
+    runtime_stats = RuntimeStats(min_timeout=0.1, max_timeout=2)
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", str(tmpdir) + "/shader_1.shadertrap")
+    # The fake timeout sleeps for a minute, the bounded timeout stops it after 2s
+    messages = execution_utils.execute_compilation(compilers_dict, "", str(tmpdir), shader_tool, "shader_1.shadertrap",
+                                                   run_type="no_postprocessing", runtime_stats=runtime_stats)
+    assert messages == ["no_crash", "timeout"]
+    assert tmpdir.join("b.txt").read() == "timeout"
+    # Only the completed execution is recorded
+    assert list(runtime_stats.samples) == ["a"]
+    assert 0 < runtime_stats.samples["a"][0] < 2
+    capsys.readouterr()
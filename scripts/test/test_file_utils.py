@@ -11,12 +11,13 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import hashlib
 import os.path
 
 import pytest
 
 from scripts.utils.file_utils import get_compiler_name, get_seed, concatenate_files, find_file, clean_files, \
-    ensure_abs_path
+    ensure_abs_path, find_generated_shaders, get_reconditioned_name
 
 
 def test_concatenate_files(tmpdir):
@@ -82,3 +83,37 @@ def test_ensure_abs_path(tmpdir):
     assert ensure_abs_path(tmpdir, os.getcwd()) == os.getcwd()
     assert ensure_abs_path(tmpdir, "./execdir/") == str(tmpdir.join("execdir")) + "/"
     assert ensure_abs_path(tmpdir, "./file") == str(tmpdir.join("file"))
+
+
+def test_find_generated_shaders(tmpdir):
+    for name in ["test_10.shadertrap", "test_9.shadertrap", "test_9_re.shadertrap", "test_9_re.comp", "test_1.amber"]:
+        tmpdir.join(name).write("")
+    shader_output = str(tmpdir) + "/"
+    assert find_generated_shaders(shader_output, ".shadertrap") == [shader_output + "test_9.shadertrap",
+                                                                    shader_output + "test_10.shadertrap"]
+    assert find_generated_shaders(shader_output, ".amber", [1, 2]) == [shader_output + "test_1.amber",
+                                                                       shader_output + "test_2.amber"]
+
+
+def test_get_reconditioned_name():
+    assert get_reconditioned_name("shaders/test_1.shadertrap", ".shadertrap") == "shaders/test_1_re.shadertrap"
+
+
+@pytest.mark.parametrize("kernel_copy", [True, False])
+def test_concatenate_files_streaming(tmpdir, mocker, kernel_copy):
+    buffers = []
+    for i in [10, 2, 1, 0]:
+        buffers.append(tmpdir.join("buffer_" + str(i)))
+        buffers[-1].write("buffer_" + str(i) + "\n" * i)
+    if not kernel_copy:
+        mocker.patch("os.copy_file_range", side_effect=OSError, create=True)
+        mocker.patch("os.sendfile", side_effect=OSError, create=True)
+    # The buffers are concatenated in their natural order
+    concatenate_files(str(tmpdir.join("result.txt")), [str(buffer) for buffer in buffers])
+    expected = "".join("buffer_" + str(i) + "\n" * i for i in [0, 1, 2, 10])
+    assert tmpdir.join("result.txt").read() == expected
+    # The running digest matches the written content
+    file_hash = hashlib.blake2b()
+    concatenate_files(str(tmpdir.join("result.txt")), [str(buffer) for buffer in buffers], file_hash)
+    assert tmpdir.join("result.txt").read() == expected
+    assert file_hash.hexdigest() == hashlib.blake2b(expected.encode()).hexdigest()
@@ -0,0 +1,167 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import base64
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from scripts.benchmark_pipeline import prepare_environment, build_shader_tool, build_compilers
+from scripts.exec_glslsmith import run_worker, renew_lease
+from scripts.fuzzing_coordinator import FuzzingCoordinator, CoordinatorClient
+from scripts.utils.Reconditioner import Reconditioner
+from scripts.utils.ResultsIndex import ResultsIndex
+from scripts.utils.SeedLedger import SeedLedger
+
+
+def build_coordinator(tmpdir, **settings):
+    return FuzzingCoordinator(str(tmpdir.join("coordinator")), seed_ledger=SeedLedger(str(tmpdir.join("seeds.json"))),
+                              **settings)
+
+
+def test_leases(tmpdir, capsys):
+    with build_coordinator(tmpdir, shader_count=10, batches=2) as coordinator:
+        client = CoordinatorClient(coordinator.address)
+        first = client.lease("w1")
+        second = client.lease("w2")
+        # Disjoint ranges, no more batches to hand out while the leases run
+        assert first["shader_count"] == second["shader_count"] == 10
+        assert abs(first["seed"] - second["seed"]) >= 10
+        assert client.lease("w3") == {"wait": 5}
+        assert client.renew(first["lease"]) == {"ok": True}
+        assert client.complete(first["lease"], ["1"]) == {"ok": True}
+        assert client.complete(first["lease"], ["1"])["ok"] is False
+        assert client.renew(first["lease"])["ok"] is False
+        assert not coordinator.done.is_set()
+        assert client.complete(second["lease"], [])["ok"]
+        assert coordinator.done.is_set()
+        assert client.lease("w1") == {"stop": True}
+        assert client.request({"op": "unknown"})["ok"] is False
+    capsys.readouterr()
+
+
+def test_lease_expiry(tmpdir, capsys):
+    with build_coordinator(tmpdir, shader_count=5, batches=1, lease_time=0.2, max_attempts=2) as coordinator:
+        client = CoordinatorClient(coordinator.address)
+        first = client.lease("stopped")
+        time.sleep(0.3)
+        # The range of the expired lease is leased again, the late completion is refused
+        second = client.lease("w2")
+        assert second["seed"] == first["seed"]
+        assert client.complete(first["lease"], [])["ok"] is False
+        time.sleep(0.3)
+        # Abandoned after max_attempts expired leases
+        coordinator.check_leases()
+        assert coordinator.failed == [(first["seed"], 5)]
+        assert coordinator.done.is_set()
+        assert client.lease("w2") == {"stop": True}
+    assert "abandoned after 2 expired leases" in capsys.readouterr().out
+
+
+def test_upload(tmpdir, capsys):
+    with build_coordinator(tmpdir) as coordinator:
+        client = CoordinatorClient(coordinator.address)
+        tmpdir.join("12.shadertrap").write("shader")
+        tmpdir.join("a_12.txt").write("buffer_a")
+        tmpdir.join("b_12.txt").write("buffer_b")
+        attribution = {"group": "b", "groups": [["a"], ["b"]], "error_code": "3002", "timings": {"execution": 1.0},
+                       "signature": "0123456789abcdef"}
+        assert client.upload("w1", "12", str(tmpdir.join("12.shadertrap")),
+                              {"a": str(tmpdir.join("a_12.txt")), "b": str(tmpdir.join("b_12.txt"))},
+                              attribution) == {"ok": True}
+        # Names cannot leave the output directories
+        assert client.request({"op": "upload", "worker": "w1", "seed": "../1", "shader_name": "1.shadertrap",
+                               "shader": base64.b64encode(b"x").decode(), "buffers": {}, "group": "a",
+                               "groups": []})["ok"] is False
+    assert tmpdir.join("coordinator").join("keptshaders").join("12.shadertrap").read() == "shader"
+    assert tmpdir.join("coordinator").join("keptbuffers").join("b_12.txt").read() == "buffer_b"
+    results_index = ResultsIndex(str(tmpdir.join("coordinator").join("results.sqlite")))
+    uploaded = results_index.attribution("12")
+    assert (uploaded["group"], uploaded["error_code"], uploaded["timings"], uploaded["signature"]) == \
+        ("b", "3002", {"execution": 1.0}, "0123456789abcdef")
+    assert sorted(uploaded["digests"]) == ["a", "b"]
+    capsys.readouterr()
+
+
+def test_client_retries(tmpdir):
+    with build_coordinator(tmpdir) as coordinator:
+        address = coordinator.address
+    client = CoordinatorClient(address, retries=2, retry_delay=0.01)
+    with pytest.raises(OSError):
+        client.lease("w1")
+
+
+def fuzzing_worker(address, work_dir, worker_name):
+    # Worker process on the stand-in tools, each worker has its own directories
+    exec_dirs = prepare_environment(work_dir)
+    reconditioner = Reconditioner(exec_dirs.graphicsfuzz)
+    run_worker(CoordinatorClient(address), worker_name, exec_dirs, build_compilers("shadertrap", 2),
+               None, build_shader_tool("shadertrap"), reconditioner=reconditioner)
+
+
+def test_workers(tmpdir, capsys):
+    with build_coordinator(tmpdir, shader_count=3, batches=5) as coordinator:
+        # Several worker processes on this machine
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=fuzzing_worker,
+                                   args=(coordinator.address, str(tmpdir.join("worker_" + str(i))), "worker_" + str(i)))
+                   for i in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(120)
+        assert [worker.exitcode for worker in workers] == [0, 0, 0]
+        assert coordinator.done.is_set()
+        assert coordinator.completed == 5
+    # Every seed of the 5 batches is executed once and kept (one of the compilers differs)
+    kept_shaders = os.listdir(str(tmpdir.join("coordinator").join("keptshaders")))
+    assert len(kept_shaders) == 15
+    assert len(os.listdir(str(tmpdir.join("coordinator").join("keptbuffers")))) == 30
+    results_index = ResultsIndex(str(tmpdir.join("coordinator").join("results.sqlite")))
+    assert sorted(finding[0] + ".shadertrap" for finding in results_index.findings()) == sorted(kept_shaders)
+    assert sum(results_index.group_counts().values()) == 15
+    # The metadata of the workers is uploaded with the findings
+    assert all(results_index.attribution(finding[0])["error_code"] is not None and
+               "execution" in results_index.attribution(finding[0])["timings"]
+               for finding in results_index.findings())
+    capsys.readouterr()
+
+
+def test_worker_refused_lease(tmpdir, capsys):
+    # An invalid lease request is reported instead of crashing the worker
+    with build_coordinator(tmpdir) as coordinator:
+        client = CoordinatorClient(coordinator.address)
+        client.lease = lambda worker: client.request({"op": "lease"})
+        run_worker(client, "worker", None, {}, None, None)
+    assert "The coordinator refused to lease a batch: invalid request" in capsys.readouterr().out
+
+
+def test_renew_expired_lease(tmpdir, capsys):
+    with build_coordinator(tmpdir, lease_time=0.1) as coordinator:
+        client = CoordinatorClient(coordinator.address)
+        work = client.lease("worker")
+        work["lease_time"] = 0.3
+        time.sleep(0.2)
+        coordinator.check_leases()
+        stop = threading.Event()
+        expired = threading.Event()
+        renewal = threading.Thread(target=renew_lease, args=(client, work, stop, expired))
+        renewal.start()
+        # The renewal stops by itself once the coordinator reports the lease as expired
+        renewal.join(5)
+        assert not renewal.is_alive()
+        assert expired.is_set()
+    assert "lost (expired)" in capsys.readouterr().out
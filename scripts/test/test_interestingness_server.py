@@ -0,0 +1,90 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import subprocess
+
+from scripts.create_shell_code import build_shell_test
+from scripts.interestingness_server import InterestingnessServer
+from scripts.reduction_helper import compute_error_code
+from scripts.splitter_merger import split
+from scripts.test.conftest import prepare_tmp_env, prepare_fake_graphicsfuzz
+from scripts.utils.Compiler import Compiler
+from scripts.utils.ShaderTool import ShaderTool
+
+
+def prepare_reduction(conf, tmpdir):
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+    execdirs.graphicsfuzz = prepare_fake_graphicsfuzz(tmpdir)
+    shader_tool = ShaderTool("shadertrap", os.path.abspath("testdata/fake_tools/shadertrap"), ".shadertrap")
+    compilers_dict = {"a": Compiler("a", "a", "independent", " ", " ", []),
+                      "b": Compiler("b", "b differ", "independent", " ", " ", [])}
+    shutil.copy("testdata/shadertrap_shaders/shader_1.shadertrap", execdirs.execdir + "test.shadertrap")
+    split(shader_tool, execdirs.execdir + "test.shadertrap", str(tmpdir.join("test.comp")))
+    error_code = compute_error_code(compilers_dict, execdirs, shader_tool, execdirs.execdir + "test.shadertrap")
+    return execdirs, shader_tool, compilers_dict, error_code
+
+
+def run_client(socket_path, shader):
+    return subprocess.run(["python3", "interestingness_client.py", socket_path, shader], capture_output=True,
+                          text=True)
+
+
+def test_interestingness_server(conf, tmpdir, capsys):
+    execdirs, shader_tool, compilers_dict, error_code = prepare_reduction(conf, tmpdir)
+    assert error_code.startswith("30")
+    with open(execdirs.execdir + "test.shadertrap", "r") as f:
+        harness = f.read()
+    tmpdir.join("no_main.comp").write("void f() {}\n")
+    log_file = str(tmpdir.join("reduction.log"))
+    with InterestingnessServer(compilers_dict, execdirs, shader_tool, "test.shadertrap", error_code,
+                               log_file=log_file) as server:
+        process = run_client(server.socket_path, str(tmpdir.join("test.comp")))
+        assert process.returncode == 0
+        assert process.stdout.strip() == error_code
+        # The candidate is merged in the harness
+        with open(execdirs.execdir + "test.shadertrap", "r") as f:
+            assert f.read() == harness
+        assert run_client(server.socket_path, str(tmpdir.join("no_main.comp"))).returncode == 1
+        assert run_client(server.socket_path, str(tmpdir.join("missing.comp"))).returncode == 1
+        # Another expected error code makes the same shader uninteresting
+        server.error_code = "3001"
+        assert run_client(server.socket_path, str(tmpdir.join("test.comp"))).returncode == 1
+        socket_path = server.socket_path
+    assert not os.path.exists(socket_path)
+    # Every check is counted in the log
+    with open(log_file, "r") as f:
+        assert f.readlines()[1].strip() == "4"
+    # Without server the candidate is not interesting
+    assert run_client(socket_path, str(tmpdir.join("test.comp"))).returncode == 1
+    capsys.readouterr()
+
+
+def test_interestingness_script(conf, tmpdir, capsys):
+    execdirs, shader_tool, compilers_dict, error_code = prepare_reduction(conf, tmpdir)
+    # The interestingness script calls the client from the scripts directory of the execution directory
+    os.symlink(os.getcwd(), execdirs.execdir + "scripts")
+    server = InterestingnessServer(compilers_dict, execdirs, shader_tool, "test.shadertrap")
+    server.error_code = build_shell_test(compilers_dict, execdirs, shader_tool, "test.shadertrap", "test.comp", "",
+                                         "interesting.sh", server_socket=server.socket_path)
+    assert server.error_code == error_code
+    with server:
+        process = subprocess.run(["bash", execdirs.execdir + "interesting.sh"], cwd=str(tmpdir), capture_output=True,
+                                 text=True)
+        assert process.returncode == 0
+        tmpdir.join("test.comp").write("void f() {}\n")
+        process = subprocess.run(["bash", execdirs.execdir + "interesting.sh"], cwd=str(tmpdir), capture_output=True,
+                                 text=True)
+        assert process.returncode == 1
+    capsys.readouterr()
@@ -17,7 +17,8 @@ import sys
 
 import pytest
 
-from scripts.reduction_helper import identify_crashes, execute_reduction, main
+from scripts.reduction_helper import identify_crashes, execute_reduction, main, can_still_match, compute_error_code, \
+    EARLY_TERMINATION
 from scripts.test.conftest import prepare_tmp_env
 from scripts.utils.file_utils import clean_files
 
@@ -98,6 +99,54 @@ def test_execute_reduction(tmpdir, conf, mocker, compilers_dict, results, buffer
         assert e.value.code == str(expected)
 
 
+@pytest.mark.parametrize("expected_error_code, results, digests, expected",
+                         [("1000", ["crash", "crash"], ["x", "y"], True),
+                          ("1000", ["crash", "no_crash"], ["x", "y"], False),
+                          ("1000", ["crash", "timeout"], ["x", "y"], True),
+                          ("1000", ["timeout", "no_crash"], ["x", "y"], False),
+                          ("1016", ["no_crash", "no_crash", "no_crash"], ["x", "x", "x"], True),
+                          ("1016", ["no_crash", "crash"], ["x", "y"], False),
+                          ("2016", ["no_crash", "no_crash", "no_crash", "timeout"], ["x", "x", "x", "y"], True),
+                          ("2016", ["timeout"], ["x"], False),
+                          ("3004", ["no_crash", "no_crash", "no_crash"], ["x", "x", "x"], True),
+                          ("3004", ["no_crash", "no_crash", "no_crash", "no_crash"], ["x", "x", "x", "x"], False),
+                          ("3004", ["no_crash", "no_crash"], ["x", "y"], False),
+                          ("3004", ["no_crash", "crash"], ["x", "y"], False),
+                          ("3099", ["no_crash", "no_crash", "no_crash"], ["x", "x", "y"], True),
+                          ("3099", ["no_crash", "no_crash"], ["x", "y"], False),
+                          ("4000 [['a'], ['ba', 'd_x'], ['c']]", ["no_crash", "no_crash"], ["x", "y"], True),
+                          ("4000 [['a'], ['ba', 'd_x'], ['c']]", ["no_crash", "timeout"], ["x", "y"], False),
+                          ("no main", ["crash"], ["x"], True)])
+def test_can_still_match(compilers_list, expected_error_code, results, digests, expected):
+    assert can_still_match(expected_error_code, compilers_list[0:len(results)], results, digests) == expected
+
+
+@pytest.mark.parametrize("buffers_content, first_result, expected, expected_calls",
+                         [(["0 0", "0 0", "0 0", "0 1"], "no_crash", "3004", 4),
+                          (["0 0", "0 1", "0 0", "0 1"], "no_crash", EARLY_TERMINATION, 2),
+                          (["0 0", "0 0", "0 0", "0 1"], "crash", EARLY_TERMINATION, 1)])
+def test_compute_error_code_early_termination(tmpdir, conf, mocker, compilers_dict, buffers_content, first_result,
+                                              expected, expected_calls):
+    compiler_names = ["a", "ba", "c", "d_x"]
+    compilers = {k: compilers_dict[k] for k in compiler_names}
+    execdirs = prepare_tmp_env(conf["exec_dirs"], tmpdir)
+
+    # Each compilation only writes the buffer of the compilers it was given
+    def generate_buffers(compilers_to_run, *args, **kwargs):
+        results = []
+        for compiler in compilers_to_run:
+            index = compiler_names.index(compiler)
+            with open(execdirs.execdir + compiler + ".txt", "w") as fid:
+                fid.write(buffers_content[index])
+            results.append(first_result if index == 0 else "no_crash")
+        return results
+
+    compilation = mocker.patch("scripts.reduction_helper.execute_compilation", side_effect=generate_buffers)
+    assert compute_error_code(compilers, execdirs, conf["shadertools"][0], "test.shadertrap", clean_dir=False,
+                              expected_error_code="3004") == expected
+    assert compilation.call_count == expected_calls
+
+
 def test_main(conf):
     if conf["shadertools"][0].name == "shadertrap":
         test_file = "test_identical.shadertrap"
@@ -18,7 +18,7 @@ import sys
 import pytest
 
 from scripts.splitter_merger import get_glslcode_from_shadertrap, get_glslcode, split, merge, get_glslcode_from_amber, \
-    main
+    main, HarnessTemplate
 from scripts.test.conftest import load_file
 from scripts.utils.ShaderTool import ShaderTool
 
@@ -65,6 +65,36 @@ def test_merge(tmpdir, tool):
         assert f.read() == load_file("splitter_merger/shader_1" + tool.file_extension)
 
 
+@pytest.mark.parametrize("tool", [(ShaderTool("shadertrap", "/shadertrap/bin/shadertrap", ".shadertrap")),
+                                  (ShaderTool("amber", "/amber/bin/amber", ".amber"))])
+def test_harness_template(tmpdir, tool):
+    template = HarnessTemplate.from_text(tool, load_file("splitter_merger/empty" + tool.file_extension))
+    assert template.prefix + template.shader + template.suffix == load_file("splitter_merger/empty" +
+                                                                            tool.file_extension)
+    assert template.merge(load_file("splitter_merger/shader_1.glsl")) == load_file("splitter_merger/shader_1" +
+                                                                                   tool.file_extension)
+    # The template returned by split is reused by merge, only the shader of the harness is replaced
+    template = split(tool, "testdata/splitter_merger/empty" + tool.file_extension, tmpdir.join("empty.glsl"))
+    tmpdir.join("harness" + tool.file_extension).write("")
+    merge(tool, tmpdir.join("harness" + tool.file_extension), "testdata/splitter_merger/shader_1.glsl", template)
+    with open(tmpdir.join("harness" + tool.file_extension), "r") as f:
+        assert f.read() == load_file("splitter_merger/shader_1" + tool.file_extension)
+
+
+def test_harness_template_shader_text_in_harness():
+    # The shader is replaced where it is declared only, even if its text appears elsewhere in the harness
+    harness = "# END\nDECLARE_SHADER shader KIND COMPUTE\nEND\nEND\n"
+    template = HarnessTemplate.from_text(ShaderTool("shadertrap", "", ".shadertrap"), harness)
+    assert template.shader == "END\n"
+    assert template.merge("void main() {}\n") == "# END\nDECLARE_SHADER shader KIND COMPUTE\nvoid main() {}\nEND\n"
+    harness = "#!amber\nSHADER compute s GLSL\nmain\nEND\nSHADER compute t GLSL\nother\nEND\n"
+    template = HarnessTemplate.from_text(ShaderTool("amber", "", ".amber"), harness)
+    assert template.shader == "main\n"
+    assert template.merge("x\n") == "#!amber\nSHADER compute s GLSL\nx\nEND\nSHADER compute t GLSL\nother\nEND\n"
+    with pytest.raises(ValueError):
+        HarnessTemplate.from_text(ShaderTool("amber", "", ".amber"), "#!amber\nSHADER compute s GLSL\nmain\n")
+
+
 def test_main(tmpdir, conf):
     scripts_path = os.getcwd()
     with pytest.raises(SystemExit) as e:
@@ -96,3 +126,19 @@ def test_main(tmpdir, conf):
     os.chdir(scripts_path)
     with open(tmpdir.join("empty" + file_extension), "r") as f:
         assert f.read() == load_file("splitter_merger/shader_1" + file_extension)
+
+
+
+def test_main_relative_files(tmpdir, conf):
+    # Relative files are located in the execution directory, not in the working directory
+    file_extension = conf["shadertools"][0].file_extension
+    execdir = str(tmpdir.mkdir("exec")) + "/"
+    with open(conf["conf_path"], "r") as f:
+        tmpdir.join("config.xml").write(f.read().replace("<execdir>./</execdir>", "<execdir>" + execdir + "</execdir>"))
+    shutil.copy("testdata/splitter_merger/shader_1" + file_extension, execdir + "shader_orig" + file_extension)
+    sys.argv = ["splitter_merger.py", "--config-file", str(tmpdir.join("config.xml")), "--split",
+                "shader_orig" + file_extension, "shader_split.glsl"]
+    main()
+    with open(execdir + "shader_split.glsl", "r") as f:
+        assert load_file("splitter_merger/shader_1.glsl") == f.read()
+    assert not os.path.isfile("shader_split.glsl")
@@ -15,8 +15,9 @@ import os
 
 import pytest
 
-from scripts.stats_buffer import report_line_nb, extract_seed_from_buffer_files, stats_buffers
+from scripts.stats_buffer import report_line_nb, extract_seed_from_buffer_files, stats_buffers, rebuild_index
 from scripts.utils.Compiler import Compiler
+from scripts.utils.ResultsIndex import ResultsIndex
 from scripts.utils.ShaderTool import ShaderTool
 
 
@@ -35,7 +36,7 @@ def test_extract_seed_from_buffer_files(file_list, unique_seed):
     assert extract_seed_from_buffer_files(file_list) == unique_seed
 
 
-def test_stats_buffers_and_main(capsys):
+def test_stats_buffers_and_main(tmpdir, capsys):
     # Prepare compilers for the scenario
     compiler_dict = {"a": Compiler("a", "a", "angle", "", "", []),
                      "b": Compiler("b", "b", "independent", "", "", []),
@@ -87,3 +88,18 @@ def test_stats_buffers_and_main(capsys):
     assert len(outputs.out.splitlines()) == 24
     for line in verbose_lines:
         assert line in str(outputs.out)
+
+    # The same report is given from a results index built from the directories, followed by the buckets of findings
+    results_index = ResultsIndex(str(tmpdir.join("results.sqlite")))
+    rebuild_index(results_index, "testdata/keptbuf/", "testdata/keptshad/", compiler_dict, shadertools)
+    assert "Results index rebuilt with 12 seeds" in capsys.readouterr().out
+    for verbose, expected_lines in [(False, lines), (True, verbose_lines)]:
+        stats_buffers("testdata/keptbuf/", "testdata/keptshad/", compiler_dict, shadertools, verbose,
+                      results_index=results_index)
+        outputs = capsys.readouterr()
+        assert len(outputs.out.splitlines()) == (35 if verbose else 32)
+        for line in expected_lines:
+            assert line in str(outputs.out)
+        assert "9 buckets\n" in outputs.out
+        assert ": 3 findings, group: a, error code: unknown\n" in outputs.out
+        assert ": 2 findings, group: angle, error code: unknown\n" in outputs.out
@@ -0,0 +1,195 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import queue
+import signal
+import subprocess
+import tarfile
+import threading
+import time
+import uuid
+
+DEVICE_ROOT = "/data/local/tmp/"
+# Output of the commands that were still pending when the adb session was lost
+SESSION_CLOSED = "adb session closed"
+# Output of the commands of a round trip whose shaders could not be pushed
+PUSH_FAILED = "adb push failed"
+
+
+# Transport to an android device kept for the whole run
+# A single "adb shell" session is kept open and the commands are written to it one after the other (several commands
+# are written at once, the shell runs them in order and an end marker with the exit status follows the output of
+# each of them). The shaders of a round trip are pushed as one tar stream ("adb exec-in") and the buffers are pulled
+# back as one tar stream ("adb exec-out"), which also removes the files of the round trip from the device
+# One round trip therefore costs three adb calls whatever the number of shaders, instead of 4 + N calls per shader
+class AndroidTransport:
+    end_marker = "__glslsmith_done__"
+    transports = {}
+    transports_lock = threading.Lock()
+
+    def __init__(self, serial=""):
+        self.serial = serial
+        self.session = None
+        self.session_output = None
+        # A device runs a single round trip at a time
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get(serial=""):
+        # Transports are shared by all the compilations of the process
+        with AndroidTransport.transports_lock:
+            if serial not in AndroidTransport.transports:
+                AndroidTransport.transports[serial] = AndroidTransport(serial)
+            return AndroidTransport.transports[serial]
+
+    @staticmethod
+    def close_all():
+        with AndroidTransport.transports_lock:
+            for transport in AndroidTransport.transports.values():
+                transport.close()
+            AndroidTransport.transports.clear()
+
+    def adb_command(self, *args):
+        return ["adb"] + (["-s", self.serial] if self.serial != "" else []) + list(args)
+
+    def start_session(self):
+        # The session gets its own process group so that it can be stopped with what it runs locally
+        self.session = subprocess.Popen(self.adb_command("shell"), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, text=True, start_new_session=True)
+        self.session_output = queue.Queue()
+        threading.Thread(target=AndroidTransport.read_session, args=(self.session, self.session_output),
+                         daemon=True).start()
+
+    @staticmethod
+    def read_session(session, session_output):
+        for line in session.stdout:
+            session_output.put(line)
+        session_output.put(None)
+
+    def stop_session(self):
+        if self.session is None:
+            return
+        try:
+            os.killpg(self.session.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.session.wait()
+        self.session = None
+
+    def close(self):
+        with self.lock:
+            self.stop_session()
+
+    def push(self, files, remote_dir):
+        # files: {name in remote_dir: local path}
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for name, path in files.items():
+                tar.add(path, arcname=name)
+        process_return = subprocess.run(self.adb_command("exec-in", "mkdir -p " + remote_dir + " && tar -x -C " +
+                                                         remote_dir),
+                                        input=archive.getvalue(), capture_output=True)
+        return process_return.returncode == 0
+
+    def pull_and_clean(self, remote_dir, local_dirs):
+        # local_dirs: {job directory in remote_dir: local directory}, the buffer files of each job are extracted to
+        # its local directory and remote_dir is removed from the device
+        process_return = subprocess.run(self.adb_command("exec-out", "cd " + remote_dir + " && tar -c */buffer_* "
+                                                         "2>/dev/null; cd " + DEVICE_ROOT + " && rm -rf " +
+                                                         remote_dir),
+                                        capture_output=True)
+        if process_return.stdout == b"":
+            return
+        with tarfile.open(fileobj=io.BytesIO(process_return.stdout), mode="r") as tar:
+            for member in tar.getmembers():
+                job_dir = member.name.split("/")[0]
+                if not member.isfile() or job_dir not in local_dirs:
+                    continue
+                with open(os.path.join(local_dirs[job_dir], os.path.basename(member.name)), "wb") as f:
+                    f.write(tar.extractfile(member).read())
+
+    def read_result(self, deadline):
+        # (exit status, output) of the next command, None if the command did not finish before the deadline
+        output = []
+        while True:
+            try:
+                line = self.session_output.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return None
+            if line is None:
+                return 255, "".join(output) + SESSION_CLOSED
+            marker = line.find(AndroidTransport.end_marker)
+            if marker != -1:
+                output.append(line[:marker])
+                return int(line[marker + len(AndroidTransport.end_marker):].split()[0]), "".join(output)
+            output.append(line)
+
+    @staticmethod
+    def lost(result):
+        # The command never ran or its output did not come back, it says nothing about the driver
+        return result is not None and (result[1].endswith(SESSION_CLOSED) or result[1] == PUSH_FAILED)
+
+    def run_commands(self, commands, timeouts, remote_dir):
+        # [(exit status, output, runtime) or None when the command timed out] in the order of the commands
+        results = []
+        while len(results) < len(commands):
+            if self.session is None:
+                self.start_session()
+            # Pipeline the remaining commands
+            try:
+                for command in commands[len(results):]:
+                    self.session.stdin.write("(" + command + ") 2>&1; echo " + AndroidTransport.end_marker + " $?\n")
+                self.session.stdin.flush()
+            except BrokenPipeError:
+                pass
+            start = time.monotonic()
+            while len(results) < len(commands):
+                result = self.read_result(start + timeouts[len(results)])
+                if result is None:
+                    # The shell is stuck on the command: restart it and stop what is still running in remote_dir,
+                    # the following commands are sent again to the new session
+                    results.append(None)
+                    self.stop_session()
+                    subprocess.run(self.adb_command("shell", "pkill -f " + remote_dir), capture_output=True)
+                    break
+                results.append(result + (time.monotonic() - start,))
+                start = time.monotonic()
+                if result[1].endswith(SESSION_CLOSED):
+                    # The following commands are sent again to a new session
+                    self.stop_session()
+                    break
+        return results
+
+    def execute(self, jobs, timeouts):
+        # jobs: [(local shader, command, local directory)], the command refers to the shader by its local path
+        # Each job runs in its own directory on the device, its buffer files are pulled back to its local directory
+        with self.lock:
+            remote_dir = DEVICE_ROOT + "glslsmith_" + uuid.uuid4().hex
+            files = {}
+            commands = []
+            local_dirs = {}
+            for i, (shader, command, local_dir) in enumerate(jobs):
+                job_dir = "job_" + str(i)
+                files[job_dir + "/" + os.path.basename(shader)] = shader
+                remote_shader = remote_dir + "/" + job_dir + "/" + os.path.basename(shader)
+                commands.append("cd " + remote_dir + "/" + job_dir + " && " + command.replace(shader, remote_shader))
+                local_dirs[job_dir] = local_dir
+            if self.push(files, remote_dir):
+                results = self.run_commands(commands, timeouts, remote_dir)
+            else:
+                results = [(255, PUSH_FAILED, 0) for _ in commands]
+            self.pull_and_clean(remote_dir, local_dirs)
+        return results
@@ -0,0 +1,132 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+# Progress of an interrupted batch: its first seed and shader count, the seeds generated, the seeds whose buffers were
+# compared (without difference) or saved, and the seeds kept (saved)
+BatchProgress = namedtuple("BatchProgress", ["seed", "shader_count", "generated", "completed", "kept"])
+
+
+# Write-ahead journal of the batch being executed, stored next to the keptshaders directory
+# (glslsmithoutput/journal.jsonl)
+# Each step of a seed is appended as {"event", "seed"} and synced to the disk before the next step starts:
+# generated (the shader is in shaderoutput), executed (the buffers are in dumpbufferdir), compared (with "kept") and
+# saved (the shader and the buffers are in keptshaderdir / keptbufferdir). A batch starts with {"event": "batch",
+# "seed", "shader_count"} and is over once {"event": "end"} is written, an interrupted batch can then be resumed from
+# the steps of its seeds
+# Nothing is recorded until start is called
+class BatchJournal:
+    def __init__(self):
+        self.enabled = False
+        self.path = ""
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def location(kept_shader_dir):
+        return os.path.join(os.path.dirname(os.path.normpath(kept_shader_dir)), "journal.jsonl")
+
+    def start(self, path):
+        self.path = path
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def append(self, entries):
+        if not self.enabled:
+            return
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def replace(self, entries):
+        # The journal only keeps the current batch, it is replaced atomically
+        if not self.enabled:
+            return
+        with self.lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(os.path.abspath(self.path)))
+            with os.fdopen(fd, "w") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def start_batch(self, seed, shader_count):
+        self.replace([{"event": "batch", "seed": seed, "shader_count": shader_count}])
+
+    def resume_batch(self, progress):
+        # The journal of the interrupted batch is written again without the line cut by the interruption (the
+        # following entries would be appended to it)
+        kept = set(progress.kept)
+        self.replace([{"event": "batch", "seed": progress.seed, "shader_count": progress.shader_count}] +
+                     [{"event": "generated", "seed": seed} for seed in sorted(progress.generated, key=int)] +
+                     [{"event": "compared", "seed": seed, "kept": seed in kept}
+                      for seed in sorted(progress.completed, key=int)] +
+                     [{"event": "saved", "seed": seed} for seed in progress.kept])
+
+    def generated(self, seeds):
+        self.append([{"event": "generated", "seed": seed} for seed in seeds])
+
+    def executed(self, seed):
+        self.append([{"event": "executed", "seed": seed}])
+
+    def compared(self, seed, kept):
+        self.append([{"event": "compared", "seed": seed, "kept": kept}])
+
+    def saved(self, seed):
+        self.append([{"event": "saved", "seed": seed}])
+
+    def end_batch(self):
+        self.append([{"event": "end"}])
+
+    def interrupted_batch(self):
+        # Progress of the batch of the journal if it was interrupted, None otherwise
+        try:
+            with open(self.path, "r") as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        progress = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Line cut by the interruption
+                break
+            event = entry.get("event")
+            if event == "batch":
+                progress = BatchProgress(entry["seed"], entry["shader_count"], set(), set(), [])
+            elif progress is None:
+                continue
+            elif event == "end":
+                progress = None
+            elif event == "generated":
+                progress.generated.add(entry["seed"])
+            elif event == "compared" and not entry["kept"]:
+                progress.completed.add(entry["seed"])
+            elif event == "saved":
+                progress.completed.add(entry["seed"])
+                progress.kept.append(entry["seed"])
+        return progress
+
+
+# Journal shared by all the seeds of a run
+journal = BatchJournal()
@@ -11,19 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from xml.dom import minidom
 
 
 class Compiler:
     available_syscode = 1
 
-    def __init__(self, name, renderer, compiler_type, ldpath, vkfilename, othervens):
+    def __init__(self, name, renderer, compiler_type, ldpath, vkfilename, othervens, devices=None):
         self.name = name
         self.renderer = renderer
         self.type = compiler_type
         self.ldpath = ldpath
         self.vkfilename = vkfilename
         self.otherenvs = othervens
+        # Serials of the android devices running the compiler (empty: the default adb device)
+        self.devices = devices if devices is not None else []
         self.compilercode = Compiler.available_syscode
         Compiler.available_syscode += 1
 
@@ -52,7 +53,11 @@ class Compiler:
 
     @staticmethod
     def load_compilers_settings(filename):
-        xmldoc = minidom.parse(filename)
+        from xml.dom import minidom
+        return Compiler.parse_compilers_settings(minidom.parse(filename))
+
+    @staticmethod
+    def parse_compilers_settings(xmldoc):
         compilers = []
         compilersxml = xmldoc.getElementsByTagName("compiler")
         for compiler in compilersxml:
@@ -67,5 +72,11 @@ class Compiler:
                 nb_envs = int(otherenvsxml.getElementsByTagName("length")[0].childNodes[0].data)
                 for i in range(nb_envs):
                     otherenvs.append(otherenvsxml.getElementsByTagName("env_" + str(i))[0].childNodes[0].data)
-            compilers.append(Compiler(name, renderer, compiler_type, ldpath, vkfilename, otherenvs))
+            devices = []
+            devicesxml = compiler.getElementsByTagName("devices")
+            if len(devicesxml) != 0 and len(devicesxml[0].getElementsByTagName("length")) != 0:
+                nb_devices = int(devicesxml[0].getElementsByTagName("length")[0].childNodes[0].data)
+                for i in range(nb_devices):
+                    devices.append(devicesxml[0].getElementsByTagName("device_" + str(i))[0].childNodes[0].data)
+            compilers.append(Compiler(name, renderer, compiler_type, ldpath, vkfilename, otherenvs, devices))
         return compilers
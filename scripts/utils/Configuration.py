@@ -0,0 +1,147 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from collections import namedtuple
+
+from utils.Compiler import Compiler
+from utils.DirSettings import DirSettings
+from utils.Reducer import Reducer
+from utils.ShaderTool import ShaderTool
+
+# To be increased whenever the cached settings classes change
+CACHE_VERSION = 2
+
+# Settings of a configuration file: directories, compilers, reducers and shader tools
+Configuration = namedtuple("Configuration", ["exec_dirs", "compilers", "reducers", "shader_tools"])
+
+
+def parse_configuration(content):
+    # The xml parser is only loaded when the configuration is not cached
+    from xml.dom import minidom
+    xmldoc = minidom.parseString(content)
+    return Configuration(DirSettings.parse_dir_settings(xmldoc), tuple(Compiler.parse_compilers_settings(xmldoc)),
+                         tuple(Reducer.parse_reducers_settings(xmldoc)), tuple(ShaderTool.parse_shader_tools(xmldoc)))
+
+
+def cache_directory():
+    # Files shared by the scripts of the host, in GLSLSMITH_CACHE_DIR (by default: ~/.cache/glslsmith)
+    return os.environ.get("GLSLSMITH_CACHE_DIR", os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "glslsmith"))
+
+
+def cache_location(filename):
+    # One cache file per configuration file
+    return os.path.join(cache_directory(),
+                        hashlib.sha256(os.path.abspath(filename).encode()).hexdigest()[:32] + ".json")
+
+
+def configuration_to_data(configuration):
+    # Plain data form of the configuration (the arguments of the settings constructors), stored in the cache
+    exec_dirs = configuration.exec_dirs
+    return {"exec_dirs": [exec_dirs.graphicsfuzz, exec_dirs.execdir, exec_dirs.shaderoutput, exec_dirs.dumpbufferdir,
+                          exec_dirs.keptbufferdir, exec_dirs.keptshaderdir],
+            "compilers": [[compiler.name, compiler.renderer, compiler.type, compiler.ldpath, compiler.vkfilename,
+                           compiler.otherenvs, compiler.devices] for compiler in configuration.compilers],
+            "reducers": [[reducer.name, reducer.command, reducer.interesting_test, reducer.input_file,
+                          reducer.output_files, reducer.extra_files_to_build] for reducer in configuration.reducers],
+            "shader_tools": [[tool.name, tool.path, tool.file_extension] for tool in configuration.shader_tools]}
+
+
+def configuration_from_data(data):
+    # New settings objects are built on each load, the compilers are numbered as if they had just been parsed
+    return Configuration(DirSettings(*data["exec_dirs"]), tuple(Compiler(*compiler) for compiler in data["compilers"]),
+                         tuple(Reducer(*reducer) for reducer in data["reducers"]),
+                         tuple(ShaderTool(*tool) for tool in data["shader_tools"]))
+
+
+def load_configuration(filename):
+    # The configuration is parsed once and kept as JSON in a cache file keyed on the mtime and the hash of the
+    # configuration file, the scripts started for each step of a reduction then only load the settings from it
+    with open(filename, "rb") as f:
+        content = f.read()
+    key = [CACHE_VERSION, os.stat(filename).st_mtime_ns, hashlib.sha256(content).hexdigest()]
+    cache_file = cache_location(filename)
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+        if cache["key"] == key:
+            return configuration_from_data(cache["configuration"])
+    except (OSError, ValueError, TypeError, KeyError):
+        pass
+    configuration = parse_configuration(content)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Written atomically, concurrent scripts read either the previous cache or the new one
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(cache_file))
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "configuration": configuration_to_data(configuration)}, f)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass
+    return configuration
+
+
+def build_compiler_dict(compilers, restrict_compilers=None):
+    if restrict_compilers:
+        return {compiler.name: compiler for compiler in compilers if compiler.name in restrict_compilers}
+    else:
+        return {compiler.name: compiler for compiler in compilers}
+
+
+def select_reducer(reducers, reducer_name):
+    if len(reducers) == 0:
+        exit("No reducer has been declared at installation, please edit the configuration file")
+    ans = next((x for x in reducers if x.name == reducer_name), reducers[0])
+    if reducer_name != "" and ans.name != reducer_name:
+        exit("Reducer " + reducer_name + " not found")
+    return ans
+
+
+def select_shader_tool(shader_tools, tool_name):
+    ans = next((x for x in shader_tools if x.name == tool_name), shader_tools[0])
+    if tool_name != "" and ans.name != tool_name:
+        exit(tool_name + " not found")
+    return ans
+
+
+def env_setup(parser):
+    # Add the configuration file and the host parameters to all scripts
+    parser.add_argument('--config-file', dest='config', default="config.xml",
+                        help="specify a different configuration file from the default")
+    parser.add_argument('--host', dest='host', default="",
+                        help="Specify the host language in which to embed the shader code")
+    ns = parser.parse_args(sys.argv[1:])
+
+    # Parse the configuration once (or load it from its cache)
+    configuration = load_configuration(ns.config)
+
+    # Directory config (all the directories are made absolute, no script depends on the working directory)
+    exec_dirs = configuration.exec_dirs.resolve()
+
+    # Compiler config to a compiler dictionary
+    compilers_dict = build_compiler_dict(configuration.compilers,
+                                         ns.restrict_compilers if hasattr(ns, "restrict_compilers") else [])
+
+    # Available reducers
+    reducer = select_reducer(configuration.reducers, ns.reducer if hasattr(ns, "reducer") else "")
+
+    # Host language configuration
+    shader_tool = select_shader_tool(configuration.shader_tools, ns.host)
+
+    return ns, exec_dirs, compilers_dict, reducer, shader_tool
@@ -0,0 +1,147 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.AndroidTransport import AndroidTransport
+
+
+# Android devices able to run a compiler (the devices of a compiler are expected to be identical)
+# Each job is given the least loaded device of its compiler. A device which loses its session or times out is checked
+# ("adb shell echo ok"), an unresponsive device is quarantined for quarantine_time seconds and checked again before
+# being used anew. A device which keeps losing the jobs while answering its checks is quarantined as well. The load and
+# the quarantine are shared by the pools, a device can serve several compilers
+class DevicePool:
+    pools = {}
+    in_flight = {}
+    quarantined_until = {}
+    condition = threading.Condition()
+    quarantine_time = 300
+
+    def __init__(self, serials):
+        self.serials = serials
+
+    @staticmethod
+    def get(compiler):
+        with DevicePool.condition:
+            if compiler.name not in DevicePool.pools:
+                # Compilers without devices run on the default adb device
+                DevicePool.pools[compiler.name] = DevicePool(compiler.devices if compiler.devices else [""])
+            return DevicePool.pools[compiler.name]
+
+    @staticmethod
+    def reset():
+        # Forget the devices and close their sessions
+        AndroidTransport.close_all()
+        with DevicePool.condition:
+            DevicePool.pools.clear()
+            DevicePool.in_flight.clear()
+            DevicePool.quarantined_until.clear()
+
+    @staticmethod
+    def health_check(serial):
+        try:
+            process_return = subprocess.run(AndroidTransport(serial).adb_command("shell", "echo ok"),
+                                            capture_output=True, text=True, timeout=10)
+        except subprocess.TimeoutExpired:
+            return False
+        return process_return.stdout.strip() == "ok"
+
+    @staticmethod
+    def check(serial):
+        # Quarantine the device if it does not answer anymore
+        if DevicePool.health_check(serial):
+            return True
+        DevicePool.quarantine(serial, "is unresponsive")
+        return False
+
+    @staticmethod
+    def quarantine(serial, reason):
+        print("Device " + (serial if serial != "" else "(default)") + " " + reason + ", quarantined for " +
+              str(DevicePool.quarantine_time) + "s")
+        AndroidTransport.get(serial).close()
+        with DevicePool.condition:
+            DevicePool.quarantined_until[serial] = time.monotonic() + DevicePool.quarantine_time
+
+    def acquire(self):
+        while True:
+            with DevicePool.condition:
+                now = time.monotonic()
+                # Devices at the end of their quarantine are checked before being used again, their quarantine is
+                # extended meanwhile so that a single thread checks them
+                due = [serial for serial in self.serials if DevicePool.quarantined_until.get(serial, now + 1) <= now]
+                for serial in due:
+                    DevicePool.quarantined_until[serial] = now + DevicePool.quarantine_time
+                available = [serial for serial in self.serials if serial not in DevicePool.quarantined_until]
+                if available:
+                    serial = min(available, key=lambda device: DevicePool.in_flight.get(device, 0))
+                    DevicePool.in_flight[serial] = DevicePool.in_flight.get(serial, 0) + 1
+                    return serial
+                if not due:
+                    print("All the devices of the compiler are quarantined, waiting for one of them")
+                    DevicePool.condition.wait(min(DevicePool.quarantined_until[serial] for serial in self.serials) -
+                                              now)
+                    continue
+            # The checks run without the lock, the other pools and the releases are not held up by them
+            healthy = [serial for serial in due if DevicePool.health_check(serial)]
+            with DevicePool.condition:
+                for serial in healthy:
+                    DevicePool.quarantined_until.pop(serial, None)
+                DevicePool.condition.notify_all()
+
+    @staticmethod
+    def release(serial):
+        with DevicePool.condition:
+            DevicePool.in_flight[serial] -= 1
+
+
+def execute_on_devices(pools, jobs, timeouts, max_lost=3):
+    # Run each job (see AndroidTransport.execute) on a device of its pool, the jobs given the same device share a
+    # round trip and the devices run concurrently
+    # Lost jobs (session closed, push failed) are always scheduled again, the time-outs of a device failing its health
+    # check as well. A device losing max_lost round trips in a row is quarantined
+    results = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    lost_round_trips = {}
+    while pending:
+        assigned = {}
+        for i in pending:
+            assigned.setdefault(pools[i].acquire(), []).append(i)
+        with ThreadPoolExecutor(max_workers=len(assigned)) as executor:
+            futures = {serial: executor.submit(AndroidTransport.get(serial).execute, [jobs[i] for i in indices],
+                                               [timeouts[i] for i in indices]) for serial, indices in assigned.items()}
+        pending = []
+        for serial, indices in assigned.items():
+            device_results = futures[serial].result()
+            for _ in indices:
+                DevicePool.release(serial)
+            lost = [i for i, result in zip(indices, device_results) if AndroidTransport.lost(result)]
+            timed_out = [i for i, result in zip(indices, device_results) if result is None]
+            if (lost or timed_out) and not DevicePool.check(serial):
+                lost += timed_out
+            elif lost:
+                lost_round_trips[serial] = lost_round_trips.get(serial, 0) + 1
+                if lost_round_trips[serial] >= max_lost:
+                    DevicePool.quarantine(serial, "keeps losing its jobs")
+                    lost_round_trips[serial] = 0
+            else:
+                lost_round_trips[serial] = 0
+            pending += lost
+            for i, result in zip(indices, device_results):
+                if i not in pending:
+                    results[i] = result
+    return results
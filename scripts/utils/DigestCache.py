@@ -0,0 +1,74 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import threading
+import time
+
+
+# Digests of files computed by chunks and remembered for the run
+# A digest is identified by the file identity (device, inode, size and modification time) rather than by its path, so
+# that a buffer keeps its digest when it is moved (ie: buffer_results.txt moved to <compiler>.txt)
+# Files modified less than a second before being hashed are not remembered, as a rewrite in the same clock tick would
+# not change their modification time
+class DigestCache:
+    racy_delay_ns = 1000000000
+
+    def __init__(self, algorithm="blake2b", chunk_size=1 << 20):
+        self.algorithm = algorithm
+        self.chunk_size = chunk_size
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def file_key(file_stat):
+        return file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
+
+    def new_hash(self):
+        return hashlib.new(self.algorithm)
+
+    def file_digest(self, file):
+        start = time.time_ns()
+        with open(file, "rb") as f:
+            key = self.file_key(os.fstat(f.fileno()))
+            with self.lock:
+                digest = self.digests.get(key)
+            if digest is not None:
+                return digest
+            file_hash = self.new_hash()
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                file_hash.update(chunk)
+        digest = file_hash.hexdigest()
+        self.remember(key, digest, start)
+        return digest
+
+    def register(self, file, file_hash):
+        # Record the digest computed while writing the file, under the same racy guard as the hashed files
+        if file_hash.name != self.new_hash().name:
+            return
+        self.remember(self.file_key(os.stat(file)), file_hash.hexdigest(), time.time_ns())
+
+    def remember(self, key, digest, start):
+        if start - key[3] > self.racy_delay_ns:
+            with self.lock:
+                self.digests[key] = digest
+
+    def clear(self):
+        with self.lock:
+            self.digests.clear()
+
+
+# Digests shared by all the comparisons of a run
+shared_digest_cache = DigestCache()
@@ -12,7 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from xml.dom import minidom
+import os
+
+from utils.file_utils import ensure_abs_path
 
 
 class DirSettings:
@@ -30,9 +32,22 @@ class DirSettings:
         else:
             return False
 
+    def resolve(self, execdir=None):
+        # Absolute copy of the settings, relative directories are taken from the execution directory
+        root = os.path.join(os.path.abspath(self.execdir), "")
+        if execdir is None:
+            execdir = root
+        return DirSettings(ensure_abs_path(root, self.graphicsfuzz), execdir, ensure_abs_path(root, self.shaderoutput),
+                           ensure_abs_path(root, self.dumpbufferdir), ensure_abs_path(root, self.keptbufferdir),
+                           ensure_abs_path(root, self.keptshaderdir))
+
     @staticmethod
     def load_dir_settings(filename):
-        xmldoc = minidom.parse(filename)
+        from xml.dom import minidom
+        return DirSettings.parse_dir_settings(minidom.parse(filename))
+
+    @staticmethod
+    def parse_dir_settings(xmldoc):
         dirs = xmldoc.getElementsByTagName("dirsettings")[0]
         graphicsfuzz = dirs.getElementsByTagName("graphicsfuzz")[0].childNodes[0].data
         execdir = dirs.getElementsByTagName("execdir")[0].childNodes[0].data
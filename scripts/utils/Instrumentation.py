@@ -0,0 +1,159 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Seed processed by the current thread (or task), recorded with the stages it goes through
+current_seed = contextvars.ContextVar("current_seed", default="")
+
+
+def cpu_time():
+    # CPU time of the thread and of the terminated child processes (drivers, generator, ...)
+    # The time of the child processes is the one of the whole process, concurrent stages (--jobs, --compile-jobs) share
+    # the CPU time of the processes terminated meanwhile
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.thread_time() + children.ru_utime + children.ru_stime
+
+
+# Wall and CPU time spent in each stage of the pipeline (generation, reconditioning, driver, concatenation,
+# comparison, saving), by seed and by compiler
+# Each record is appended to jsonl_file as {"batch", "stage", "seed", "compiler", "wall", "cpu", "time"} and the totals
+# of the run are exported to prometheus_file (textfile collector format) at the end of each batch
+# Nothing is recorded until start is called
+class Instrumentation:
+    stages = ["generation", "reconditioning", "driver", "concatenation", "comparison", "saving"]
+
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_file = ""
+        self.prometheus_file = ""
+        self.lock = threading.Lock()
+        self.batch = 0
+        self.batch_start = 0
+        self.batch_totals = {}
+        self.run_totals = {}
+        self.run_shaders = 0
+
+    def start(self, jsonl_file="", prometheus_file=""):
+        # A new run: the totals of a previous one are forgotten
+        with self.lock:
+            self.jsonl_file = jsonl_file
+            self.prometheus_file = prometheus_file
+            self.batch = 0
+            self.batch_totals = {}
+            self.run_totals = {}
+            self.run_shaders = 0
+            self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    @contextmanager
+    def seed(self, seed):
+        token = current_seed.set(str(seed))
+        try:
+            yield
+        finally:
+            current_seed.reset(token)
+
+    @contextmanager
+    def stage(self, stage, compiler=""):
+        if not self.enabled:
+            yield
+            return
+        wall_start = time.perf_counter()
+        cpu_start = cpu_time()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - wall_start, cpu_time() - cpu_start, compiler)
+
+    def record(self, stage, wall, cpu, compiler=""):
+        if not self.enabled:
+            return
+        key = (stage, compiler)
+        with self.lock:
+            for totals in [self.batch_totals, self.run_totals]:
+                count, total_wall, total_cpu = totals.get(key, (0, 0, 0))
+                totals[key] = (count + 1, total_wall + wall, total_cpu + cpu)
+            if self.jsonl_file != "":
+                with open(self.jsonl_file, "a") as f:
+                    f.write(json.dumps({"batch": self.batch, "stage": stage, "seed": current_seed.get(),
+                                        "compiler": compiler, "wall": wall, "cpu": cpu, "time": time.time()}) + "\n")
+
+    def start_batch(self):
+        with self.lock:
+            self.batch += 1
+            self.batch_start = time.perf_counter()
+            self.batch_totals = {}
+
+    def end_batch(self, shader_count):
+        if not self.enabled:
+            return
+        with self.lock:
+            duration = time.perf_counter() - self.batch_start
+            self.run_shaders += shader_count
+            batch_totals = dict(self.batch_totals)
+        self.print_summary(shader_count, duration, batch_totals)
+        if self.prometheus_file != "":
+            self.write_prometheus(shader_count / duration if duration > 0 else 0)
+
+    @staticmethod
+    def print_summary(shader_count, duration, batch_totals, slowest=3):
+        print("Executed " + str(shader_count) + " shaders in " + "{:.1f}".format(duration) + "s ("
+              + "{:.2f}".format(shader_count / duration if duration > 0 else 0) + " shaders/s)")
+        for stage in Instrumentation.stages:
+            entries = [value for (entry_stage, _), value in batch_totals.items() if entry_stage == stage]
+            if entries:
+                print("  " + stage + ": " + "{:.2f}".format(sum(wall for _, wall, _ in entries)) + "s wall, "
+                      + "{:.2f}".format(sum(cpu for _, _, cpu in entries)) + "s cpu")
+        drivers = sorted(((wall / count, compiler) for (stage, compiler), (count, wall, _) in batch_totals.items()
+                          if stage == "driver"), reverse=True)
+        if drivers:
+            print("  Slowest compilers: " + ", ".join(compiler + " (" + "{:.3f}".format(mean) + "s)"
+                                                     for mean, compiler in drivers[:slowest]))
+
+    def write_prometheus(self, shaders_per_second):
+        # The samples of a metric follow its description
+        metrics = [("glslsmith_stage_calls_total", "Number of executions of each stage"),
+                   ("glslsmith_stage_wall_seconds_total", "Wall time spent in each stage"),
+                   ("glslsmith_stage_cpu_seconds_total", "CPU time spent in each stage")]
+        lines = []
+        with self.lock:
+            for i, (metric, description) in enumerate(metrics):
+                lines += ["# HELP " + metric + " " + description, "# TYPE " + metric + " counter"]
+                for (stage, compiler), values in sorted(self.run_totals.items()):
+                    lines.append(metric + "{stage=\"" + stage + "\",compiler=\"" + compiler + "\"} " + repr(values[i]))
+            lines += ["# HELP glslsmith_shaders_total Number of shaders executed",
+                      "# TYPE glslsmith_shaders_total counter",
+                      "glslsmith_shaders_total " + str(self.run_shaders),
+                      "# HELP glslsmith_batch_shaders_per_second Throughput of the last batch",
+                      "# TYPE glslsmith_batch_shaders_per_second gauge",
+                      "glslsmith_batch_shaders_per_second " + repr(shaders_per_second)]
+        # The collector must never read a partial file
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(os.path.abspath(self.prometheus_file)))
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_file)
+
+
+# Instrumentation shared by all the stages of a run
+instrumentation = Instrumentation()
@@ -0,0 +1,48 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+
+from utils.execution_utils import call_glslsmith_reconditioner
+from utils.file_utils import get_reconditioned_name
+
+
+# Reconditioning of the generated shaders with the glslsmith-recondition driver of graphicsfuzz
+# The driver reconditions a single shader per invocation, each shader is charged the start of the driver
+class Reconditioner:
+    def __init__(self, graphicsfuzz):
+        self.graphicsfuzz = graphicsfuzz
+
+    def recondition(self, exec_dir, shader, harness, run_type="standard"):
+        return call_glslsmith_reconditioner(self.graphicsfuzz, exec_dir, shader, harness, run_type)
+
+    def recondition_batch(self, exec_dir, shaders, shader_tool):
+        # Pre-recondition a batch shader by shader (one driver process each), the harnesses are cached next to the
+        # shaders as <name>_re<extension> and reused while they are more recent than their shader
+        harnesses = {}
+        for shader in shaders:
+            harness = get_reconditioned_name(shader, shader_tool.file_extension)
+            if not is_reconditioned(shader, harness):
+                check, message = self.recondition(exec_dir, shader, harness)
+                if not check:
+                    print(shader + " cannot be parsed for post-processing")
+                    continue
+            harnesses[shader] = harness
+        return harnesses
+
+
+def is_reconditioned(shader, harness):
+    # The cached harness is valid as long as it is more recent than the shader
+    return os.path.isfile(shader) and os.path.isfile(harness) and os.path.getmtime(harness) >= os.path.getmtime(shader)
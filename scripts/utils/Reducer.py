@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from xml.dom import minidom
+import re
 
 
 class Reducer:
@@ -34,9 +34,23 @@ class Reducer:
         else:
             return False
 
+    def relocate(self, execdir, new_execdir):
+        # Copy of the reducer working in new_execdir, only the reduction files and the execution directory itself are
+        # moved (tools located under the execution directory are kept)
+        command = self.command
+        for file in [self.interesting_test, self.input_file, self.output_files] + self.extra_files_to_build:
+            command = command.replace(execdir + file, new_execdir + file)
+        command = re.sub(re.escape(execdir) + r"(?=[\s\"']|$)", new_execdir, command)
+        return Reducer(self.name, command, self.interesting_test, self.input_file, self.output_files,
+                       self.extra_files_to_build)
+
     @staticmethod
     def load_reducers_settings(filename):
-        xmldoc = minidom.parse(filename)
+        from xml.dom import minidom
+        return Reducer.parse_reducers_settings(minidom.parse(filename))
+
+    @staticmethod
+    def parse_reducers_settings(xmldoc):
         reducers = []
         reducerxml = xmldoc.getElementsByTagName("reducer")
         for reducer in reducerxml:
@@ -0,0 +1,176 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+# On-disk cache of the execution results of a harness on a compiler
+# An entry is keyed on the content of the (reconditioned) harness, the compiler settings, the run type, the timeout
+# and the shader tool. It is stored in entries/<key>.json as:
+#   {"digest": ..., "crash": bool, "timeout": bool, "message": ..., "drivers": {path: mtime}}
+# and the resulting buffer is stored once per content in blobs/<digest>
+# The cache is bounded to max_entries (least recently used entries are evicted first) and an entry is dropped as soon
+# as one of the driver files it was computed with (libraries, ICD files, shader tool) has been modified
+# The driver files of a compiler are listed once per run and checked on every lookup and store (see driver_fingerprint)
+class ResultCache:
+    def __init__(self, cache_dir, max_entries=10000):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_entries = max_entries
+        self.entries_dir = os.path.join(self.cache_dir, "entries")
+        self.blobs_dir = os.path.join(self.cache_dir, "blobs")
+        os.makedirs(self.entries_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.fingerprints = {}
+        # Number of entries, counted on the first store and then kept up to date
+        self.entry_count = None
+
+    @staticmethod
+    def key(compiler, shader_tool, harness, run_type, timeout):
+        key_hash = hashlib.sha256()
+        with open(harness, 'rb') as f:
+            key_hash.update(hashlib.sha256(f.read()).digest())
+        settings = [compiler.renderer, compiler.type, compiler.ldpath, compiler.vkfilename, compiler.otherenvs,
+                    run_type, timeout, shader_tool.name, shader_tool.path]
+        key_hash.update(json.dumps(settings).encode())
+        return key_hash.hexdigest()
+
+    @staticmethod
+    def driver_files(compiler, shader_tool):
+        files = [shader_tool.path]
+        if compiler.ldpath != " ":
+            for directory in compiler.ldpath.split(":"):
+                if os.path.isdir(directory):
+                    files += sorted(os.path.join(directory, file) for file in os.listdir(directory) if ".so" in file)
+        if compiler.vkfilename != " ":
+            files += compiler.vkfilename.split(":")
+        return files
+
+    def driver_fingerprint(self, compiler, shader_tool):
+        # The library directories are only listed for the first execution of each compiler, the listed files are
+        # checked again on each call so that a driver updated during a continuous run is seen
+        fingerprint_key = (compiler.name, compiler.ldpath, compiler.vkfilename, shader_tool.path)
+        with self.lock:
+            if fingerprint_key not in self.fingerprints:
+                self.fingerprints[fingerprint_key] = ResultCache.driver_files(compiler, shader_tool)
+            files = self.fingerprints[fingerprint_key]
+        fingerprint = {}
+        for file in files:
+            try:
+                fingerprint[file] = os.stat(file).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return fingerprint
+
+    def entry_path(self, key):
+        return os.path.join(self.entries_dir, key + ".json")
+
+    def lookup(self, key, drivers, buffer_file):
+        # Restore the cached buffer to buffer_file and return (crash, timeout, message), None on a miss
+        entry_file = self.entry_path(key)
+        try:
+            with open(entry_file) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry["drivers"] != drivers:
+            # A driver changed since the entry was computed
+            self.invalidate(key)
+            return None
+        try:
+            shutil.copyfile(os.path.join(self.blobs_dir, entry["digest"]), buffer_file)
+            os.utime(entry_file)
+        except OSError:
+            return None
+        return entry["crash"], entry["timeout"], entry["message"]
+
+    def store(self, key, drivers, buffer_file, crash, timeout, message):
+        with open(buffer_file, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        blob = os.path.join(self.blobs_dir, digest)
+        if not os.path.isfile(blob):
+            self.atomic_write(blob, content)
+        entry = {"digest": digest, "crash": crash, "timeout": timeout, "message": message, "drivers": drivers}
+        new_entry = not os.path.isfile(self.entry_path(key))
+        self.atomic_write(self.entry_path(key), json.dumps(entry).encode())
+        if new_entry:
+            with self.lock:
+                if self.entry_count is None:
+                    self.entry_count = len(os.listdir(self.entries_dir))
+                else:
+                    self.entry_count += 1
+                full = self.entry_count > self.max_entries
+            if full:
+                self.evict()
+
+    def invalidate(self, key=None):
+        # Drop a single entry or the whole cache
+        entries = [key + ".json"] if key is not None else os.listdir(self.entries_dir)
+        for entry in entries:
+            try:
+                os.remove(os.path.join(self.entries_dir, entry))
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.entry_count = None
+        if key is None:
+            self.remove_unused_blobs()
+
+    def evict(self):
+        # Evict down to 90% of the bound so that eviction does not run on every store
+        entries = os.listdir(self.entries_dir)
+        entries_mtime = []
+        for entry in entries:
+            try:
+                entries_mtime.append((os.path.getmtime(os.path.join(self.entries_dir, entry)), entry))
+            except FileNotFoundError:
+                pass
+        entries_mtime.sort()
+        for _, entry in entries_mtime[:len(entries_mtime) - int(self.max_entries * 0.9)]:
+            try:
+                os.remove(os.path.join(self.entries_dir, entry))
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.entry_count = min(len(entries_mtime), int(self.max_entries * 0.9))
+        self.remove_unused_blobs()
+
+    def remove_unused_blobs(self):
+        used = set()
+        for entry in os.listdir(self.entries_dir):
+            try:
+                with open(os.path.join(self.entries_dir, entry)) as f:
+                    used.add(json.load(f)["digest"])
+            except (OSError, ValueError, KeyError):
+                pass
+        for blob in os.listdir(self.blobs_dir):
+            if blob not in used and not blob.startswith("."):
+                try:
+                    os.remove(os.path.join(self.blobs_dir, blob))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def atomic_write(path, content):
+        # Concurrent executions may share the cache, files are never seen half written
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,176 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import sqlite3
+import time
+
+from utils.analysis_utils import finding_signature
+from utils.DigestCache import shared_digest_cache
+
+
+# SQLite index of the kept shaders, stored next to the keptshaders directory (glslsmithoutput/results.sqlite)
+# findings: one row per kept seed with its compiler group, the groups of agreeing compilers, the shader size, the error
+# code (as computed by the reduction), the timings of the execution ({stage: seconds}, JSON) and the signature of the
+# finding (see finding_signature), the findings sharing a signature form a bucket
+# buffers: one row per seed and compiler with the buffer digest and the execution status (ok, crash or timeout)
+# The attribution of a finding is only kept here, the kept shader is not modified
+# A connection is opened for each operation so that concurrent executions (threads or processes) can share the index
+class ResultsIndex:
+    schema = ["CREATE TABLE IF NOT EXISTS findings (seed TEXT PRIMARY KEY, group_name TEXT, groups TEXT, "
+              "shader_file TEXT, shader_size INTEGER, shader_lines INTEGER, created REAL, updated REAL, "
+              "error_code TEXT, timings TEXT, signature TEXT)",
+              "CREATE TABLE IF NOT EXISTS buffers (seed TEXT, compiler TEXT, digest TEXT, status TEXT, "
+              "PRIMARY KEY (seed, compiler))"]
+    # Columns added to the findings of the indexes created before them
+    added_columns = [("error_code", "TEXT"), ("timings", "TEXT"), ("signature", "TEXT")]
+    # Created once the columns are added
+    indexes = ["CREATE INDEX IF NOT EXISTS findings_group ON findings (group_name)",
+               "CREATE INDEX IF NOT EXISTS findings_signature ON findings (signature)"]
+
+    def __init__(self, path):
+        self.path = path
+        with self.connect() as connection:
+            for statement in ResultsIndex.schema:
+                connection.execute(statement)
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(findings)")]
+            for column, column_type in ResultsIndex.added_columns:
+                if column not in columns:
+                    connection.execute("ALTER TABLE findings ADD COLUMN " + column + " " + column_type)
+            for statement in ResultsIndex.indexes:
+                connection.execute(statement)
+        connection.close()
+
+    @staticmethod
+    def location(kept_shader_dir):
+        return os.path.join(os.path.dirname(os.path.normpath(kept_shader_dir)), "results.sqlite")
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    @staticmethod
+    def buffer_status(buffer_file):
+        # Crashes and timeouts are recorded as the content of the buffer file by the execution
+        if os.path.getsize(buffer_file) <= len("timeout"):
+            with open(buffer_file, "r") as f:
+                content = f.read()
+            if content in ["crash", "timeout"]:
+                return content
+        return "ok"
+
+    def record(self, seed, group_name, groups, buffer_files, shader_file=None, error_code=None, timings=None,
+               signature=None):
+        # Without the crash messages, the signature only depends on the error code (or the groups when it is unknown,
+        # as for the rebuilt indexes) and the group
+        if signature is None:
+            signature = finding_signature(error_code if error_code is not None else json.dumps(groups), group_name)
+        shader_size = None
+        shader_lines = None
+        if shader_file is not None and os.path.isfile(shader_file):
+            shader_size = os.path.getsize(shader_file)
+            with open(shader_file, "rb") as f:
+                shader_lines = sum(1 for _ in f)
+        buffers = []
+        for compiler_name, buffer_file in buffer_files.items():
+            if os.path.isfile(buffer_file):
+                buffers.append((seed, compiler_name, shared_digest_cache.file_digest(buffer_file),
+                                ResultsIndex.buffer_status(buffer_file)))
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("INSERT INTO findings (seed, group_name, groups, shader_file, shader_size, "
+                               "shader_lines, created, updated, error_code, timings, signature) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                               "ON CONFLICT (seed) DO UPDATE SET "
+                               "group_name = excluded.group_name, groups = excluded.groups, "
+                               "shader_file = excluded.shader_file, shader_size = excluded.shader_size, "
+                               "shader_lines = excluded.shader_lines, updated = excluded.updated, "
+                               "error_code = excluded.error_code, timings = excluded.timings, "
+                               "signature = excluded.signature",
+                               (seed, group_name, json.dumps(groups), shader_file, shader_size, shader_lines, now,
+                                now, error_code, json.dumps(timings) if timings is not None else None, signature))
+            connection.execute("DELETE FROM buffers WHERE seed = ?", (seed,))
+            connection.executemany("INSERT INTO buffers VALUES (?, ?, ?, ?)", buffers)
+        connection.close()
+
+    def forget(self, seeds):
+        # Drop the findings of the given seeds
+        with self.connect() as connection:
+            connection.executemany("DELETE FROM findings WHERE seed = ?", [(seed,) for seed in seeds])
+            connection.executemany("DELETE FROM buffers WHERE seed = ?", [(seed,) for seed in seeds])
+        connection.close()
+
+    def clear(self):
+        with self.connect() as connection:
+            connection.execute("DELETE FROM findings")
+            connection.execute("DELETE FROM buffers")
+        connection.close()
+
+    def findings(self):
+        # (seed, group name, groups, shader lines) ordered by seed
+        with self.connect() as connection:
+            rows = connection.execute("SELECT seed, group_name, groups, shader_lines FROM findings "
+                                      "ORDER BY CAST(seed AS INTEGER), seed").fetchall()
+        connection.close()
+        return [(seed, group_name, json.loads(groups), shader_lines) for seed, group_name, groups, shader_lines in rows]
+
+    def group_counts(self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT group_name, COUNT(*) FROM findings GROUP BY group_name").fetchall()
+        connection.close()
+        return dict(rows)
+
+    def buckets(self):
+        # {signature: [(seed, shader size)]} with the smallest shaders first (unknown sizes last), findings recorded
+        # before the signatures are left out
+        with self.connect() as connection:
+            rows = connection.execute("SELECT signature, seed, shader_size FROM findings WHERE signature IS NOT NULL "
+                                      "ORDER BY shader_size IS NULL, shader_size, CAST(seed AS INTEGER), "
+                                      "seed").fetchall()
+        connection.close()
+        buckets = {}
+        for signature, seed, shader_size in rows:
+            buckets.setdefault(signature, []).append((seed, shader_size))
+        return buckets
+
+    def bucket_counts(self):
+        # [(signature, error code, group name, count)] from the largest bucket
+        with self.connect() as connection:
+            rows = connection.execute("SELECT signature, MIN(error_code), MIN(group_name), COUNT(*) FROM findings "
+                                      "WHERE signature IS NOT NULL GROUP BY signature "
+                                      "ORDER BY COUNT(*) DESC, signature").fetchall()
+        connection.close()
+        return rows
+
+    def attribution(self, seed):
+        # Everything known about a finding without opening its shader, None if the seed was not kept
+        with self.connect() as connection:
+            row = connection.execute("SELECT group_name, groups, error_code, timings, shader_file, signature "
+                                     "FROM findings WHERE seed = ?", (seed,)).fetchone()
+        connection.close()
+        if row is None:
+            return None
+        group_name, groups, error_code, timings, shader_file, signature = row
+        return {"group": group_name, "groups": json.loads(groups), "error_code": error_code,
+                "timings": json.loads(timings) if timings is not None else None, "shader_file": shader_file,
+                "signature": signature,
+                "digests": {compiler: digest for compiler, (digest, _) in self.buffers(seed).items()}}
+
+    def buffers(self, seed):
+        # {compiler: (digest, status)} of a seed
+        with self.connect() as connection:
+            rows = connection.execute("SELECT compiler, digest, status FROM buffers WHERE seed = ?",
+                                      (seed,)).fetchall()
+        connection.close()
+        return {compiler: (digest, status) for compiler, digest, status in rows}
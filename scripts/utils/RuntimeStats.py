@@ -0,0 +1,109 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+import math
+import os
+import tempfile
+import threading
+
+
+# Runtimes of the compilers, used to derive a timeout per compiler instead of a fixed one
+# The timeout of a compiler is the given percentile of its last runtimes times a safety factor, bounded by min_timeout
+# and max_timeout. Until min_samples runtimes are known, the default timeout (bounded as well) is used
+# Only the executions that completed (with or without a crash) are recorded, a timeout is not a runtime
+# The runtimes are persisted in stats_file as {compiler: [runtime, ...]} (the last max_samples of each compiler)
+class RuntimeStats:
+    def __init__(self, stats_file="", percentile=99, safety_factor=3.0, min_timeout=1.0, max_timeout=60.0,
+                 min_samples=20, max_samples=500):
+        self.stats_file = stats_file
+        self.percentile = percentile
+        self.safety_factor = safety_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.samples = {}
+        # Runtimes of the original shader of a reduction (see for_reduction)
+        self.reference_runtimes = None
+        self.lock = threading.Lock()
+        if stats_file != "" and os.path.isfile(stats_file):
+            try:
+                with open(stats_file, "r") as f:
+                    self.samples = {compiler: runtimes[-max_samples:] for compiler, runtimes in json.load(f).items()}
+            except (OSError, ValueError, AttributeError):
+                print("Ignoring the unreadable runtime statistics " + stats_file)
+
+    def for_reduction(self):
+        # Same statistics, the first runtime recorded for each compiler is the one of the original shader and the
+        # timeouts are tightened to this runtime times the safety factor (reduced shaders are not expected to run
+        # longer than the original one)
+        reduction_stats = copy.copy(self)
+        reduction_stats.reference_runtimes = {}
+        return reduction_stats
+
+    def record(self, compiler_name, runtime):
+        with self.lock:
+            runtimes = self.samples.setdefault(compiler_name, [])
+            runtimes.append(runtime)
+            del runtimes[:-self.max_samples]
+            if self.reference_runtimes is not None:
+                self.reference_runtimes.setdefault(compiler_name, runtime)
+
+    def percentile_runtime(self, compiler_name):
+        with self.lock:
+            runtimes = sorted(self.samples.get(compiler_name, []))
+        if len(runtimes) < self.min_samples:
+            return None
+        # Nearest-rank percentile
+        return runtimes[max(0, math.ceil(self.percentile / 100 * len(runtimes)) - 1)]
+
+    def timeout(self, compiler_name, default=10):
+        runtime = self.percentile_runtime(compiler_name)
+        timeout = default if runtime is None else runtime * self.safety_factor
+        if self.reference_runtimes is not None and compiler_name in self.reference_runtimes:
+            timeout = min(timeout, self.reference_runtimes[compiler_name] * self.safety_factor)
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def save(self):
+        if self.stats_file == "":
+            return
+        with self.lock:
+            content = json.dumps(self.samples)
+        # Written atomically, concurrent runs sharing the file keep the statistics of the last one to save
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(os.path.abspath(self.stats_file)))
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.stats_file)
+
+
+def add_runtime_stats_arguments(parser):
+    parser.add_argument('--runtime-stats', dest="runtime_stats", default="",
+                        help="File in which the runtimes of the compilers are recorded, the timeout of each compiler "
+                             "is then derived from its runtimes (by default: fixed timeout of 10s)")
+    parser.add_argument('--timeout-percentile', dest="timeout_percentile", default=99, type=float,
+                        help="Percentile of the recorded runtimes used for the timeouts (by default: 99)")
+    parser.add_argument('--timeout-factor', dest="timeout_factor", default=3.0, type=float,
+                        help="Safety factor applied to the runtime percentile (by default: 3)")
+    parser.add_argument('--min-timeout', dest="min_timeout", default=1.0, type=float,
+                        help="Lower bound of the derived timeouts in seconds (by default: 1)")
+    parser.add_argument('--max-timeout', dest="max_timeout", default=60.0, type=float,
+                        help="Upper bound of the derived timeouts in seconds (by default: 60)")
+
+
+def load_runtime_stats(ns):
+    if ns.runtime_stats == "":
+        return None
+    return RuntimeStats(ns.runtime_stats, ns.timeout_percentile, ns.timeout_factor, ns.min_timeout, ns.max_timeout)
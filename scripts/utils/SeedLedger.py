@@ -0,0 +1,102 @@
+# Copyright 2021 The glslsmith Project Authors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from utils.Configuration import cache_directory
+
+
+# Seeds explored on the host, stored as merged [start, end) intervals in a JSON file ({"explored": [[start, end]]})
+# Every batch is given a range of seeds disjoint from the explored ones, the ledger is locked (<ledger>.lock) while a
+# range is allocated so that concurrent processes never receive overlapping ranges
+class SeedLedger:
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def default_location():
+        return os.path.join(cache_directory(), "seeds.json")
+
+    @contextmanager
+    def locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read(self):
+        try:
+            with open(self.path, "r") as f:
+                return [tuple(interval) for interval in json.load(f)["explored"]]
+        except FileNotFoundError:
+            return []
+        except (ValueError, KeyError, TypeError):
+            print("The seed ledger " + self.path + " cannot be read, it is started again")
+            return []
+
+    def write(self, intervals):
+        # Written atomically, a process stopped while writing leaves the previous ledger
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, "w") as f:
+            json.dump({"explored": [list(interval) for interval in intervals]}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def merge(intervals, start, end):
+        # Sorted intervals with [start, end) added, overlapping and adjacent intervals are merged
+        merged = []
+        for interval_start, interval_end in sorted(intervals + [(start, end)]):
+            if merged and interval_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], interval_end))
+            else:
+                merged.append((interval_start, interval_end))
+        return merged
+
+    @staticmethod
+    def first_free(intervals, start, count):
+        # First seed from start followed by count unexplored seeds
+        for interval_start, interval_end in intervals:
+            if interval_end <= start:
+                continue
+            if interval_start >= start + count:
+                break
+            start = interval_end
+        return start
+
+    def allocate(self, count, start=None):
+        # First range of count unexplored seeds from start (by default: the current time, as without the ledger)
+        if start is None:
+            start = int(time.time())
+        with self.locked():
+            intervals = self.read()
+            seed = SeedLedger.first_free(intervals, start, count)
+            self.write(SeedLedger.merge(intervals, seed, seed + count))
+        return seed
+
+    def record(self, seed, count):
+        # Seeds chosen by the user are explored as given
+        with self.locked():
+            self.write(SeedLedger.merge(self.read(), seed, seed + count))
+
+    def explored(self):
+        with self.locked():
+            return self.read()
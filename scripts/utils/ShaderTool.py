@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from xml.dom import minidom
-
 
 class ShaderTool:
     def __init__(self, name, path, file_extension):
@@ -32,7 +30,11 @@ class ShaderTool:
 
     @staticmethod
     def load_shader_tools(filename):
-        xmldoc = minidom.parse(filename)
+        from xml.dom import minidom
+        return ShaderTool.parse_shader_tools(minidom.parse(filename))
+
+    @staticmethod
+    def parse_shader_tools(xmldoc):
         shadertools_xml = xmldoc.getElementsByTagName("shadertool")
         shadertools = []
         for shadertool in shadertools_xml:
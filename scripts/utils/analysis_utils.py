@@ -13,19 +13,23 @@
 # limitations under the License.
 
 import hashlib
+import re
 
+from utils.DigestCache import shared_digest_cache
 from utils.file_utils import get_compiler_name
 
 
-def comparison_helper(files):
+def comparison_helper(files, digest_cache=None):
+    # Group the compilers by identical buffers (files are hashed by chunks, digests are reused within a run)
+    if digest_cache is None:
+        digest_cache = shared_digest_cache
     comparison_values = {}
     for file in files:
-        with open(file, "r") as fid:
-            digest = hashlib.md5(fid.read().encode("ascii")).hexdigest()
-            if digest in comparison_values:
-                comparison_values[digest].append(get_compiler_name(file))
-            else:
-                comparison_values[digest] = [get_compiler_name(file)]
+        digest = digest_cache.file_digest(file)
+        if digest in comparison_values:
+            comparison_values[digest].append(get_compiler_name(file))
+        else:
+            comparison_values[digest] = [get_compiler_name(file)]
     values = list(comparison_values.values())
     values.sort()
     return values
@@ -52,3 +56,21 @@ def attribute_compiler_results(results, compilers_dict):
         return "compiler groups"
     # Something else is happening
     return "more than two"
+
+
+def normalize_crash_message(message, max_lines=3):
+    # The crash messages of a bug differ by their addresses, paths (seeds, temporary directories) and numbers
+    message = re.sub(r"0x[0-9a-fA-F]+", "ADDR", message)
+    message = re.sub(r"(/[^\s:'\"()]+)+", "PATH", message)
+    message = re.sub(r"[0-9]+", "N", message)
+    lines = [" ".join(line.split()) for line in message.splitlines() if line.strip() != ""]
+    return "\n".join(lines[:max_lines])
+
+
+def finding_signature(error_code, group_name, crash_messages=None):
+    # Findings of the same bug share their error code, the differing compiler(s) and the normalized crash messages
+    # crash_messages: {compiler name: message} of the crashing compilers
+    parts = [str(error_code), group_name]
+    for compiler_name, message in sorted((crash_messages or {}).items()):
+        parts.append(compiler_name + ": " + normalize_crash_message(message))
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:16]
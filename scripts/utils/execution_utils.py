@@ -12,73 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextvars
 import os
 import re
 import shlex
 import shutil
 import subprocess
-import sys
-
-from utils.Compiler import Compiler
-from utils.DirSettings import DirSettings
-from utils.Reducer import Reducer
-from utils.ShaderTool import ShaderTool
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.AndroidTransport import DEVICE_ROOT
+from utils.DevicePool import DevicePool, execute_on_devices
+from utils.DigestCache import shared_digest_cache
+from utils.Instrumentation import instrumentation
 from utils.file_utils import find_compiler_buffer_file, clean_files, concatenate_files, find_digit_buffer_file, ensure_abs_path
 from utils.analysis_utils import comparison_helper
 
 
-def build_compiler_dict(compilers, restrict_compilers=None):
-    if restrict_compilers:
-        return {compiler.name: compiler for compiler in compilers if compiler.name in restrict_compilers}
-    else:
-        return {compiler.name: compiler for compiler in compilers}
-
-
-def select_reducer(reducers, reducer_name):
-    if len(reducers) == 0:
-        exit("No reducer has been declared at installation, please edit the configuration file")
-    ans = next((x for x in reducers if x.name == reducer_name), reducers[0])
-    if reducer_name != "" and ans.name != reducer_name:
-        exit("Reducer " + reducer_name + " not found")
-    return ans
-
-
-def select_shader_tool(shader_tools, tool_name):
-    ans = next((x for x in shader_tools if x.name == tool_name), shader_tools[0])
-    if tool_name != "" and ans.name != tool_name:
-        exit(tool_name + " not found")
-    return ans
-
-
-def env_setup(parser):
-    # Add the configuration file and the host parameters to all scripts
-    parser.add_argument('--config-file', dest='config', default="config.xml",
-                        help="specify a different configuration file from the default")
-    parser.add_argument('--host', dest='host', default="",
-                        help="Specify the host language in which to embed the shader code")
-    ns = parser.parse_args(sys.argv[1:])
-
-    # Parse directory config
-    exec_dirs = DirSettings.load_dir_settings(ns.config)
-
-    # Parse the compiler config to a compiler dictionary
-    compilers = Compiler.load_compilers_settings(ns.config)
-    compilers_dict = build_compiler_dict(compilers, ns.restrict_compilers if hasattr(ns, "restrict_compilers") else [])
-
-    # Parse available reducers
-    reducers = Reducer.load_reducers_settings(ns.config)
-    reducer = select_reducer(reducers, ns.reducer if hasattr(ns, "reducer") else "")
-
-    # Parse host language configuration
-    shader_tools = ShaderTool.load_shader_tools(ns.config)
-    shader_tool = select_shader_tool(shader_tools, ns.host)
-
-    # Ensure that values are taken from the root
-    os.chdir(exec_dirs.execdir)
-
-    return ns, exec_dirs, compilers_dict, reducer, shader_tool
-
-
 def find_amber_buffers(shader_to_compile):
     with open(shader_to_compile) as f:
         return re.findall(r"BUFFER (.+) AS storage DESCRIPTOR_SET (.*) BINDING (.*)", f.read())
@@ -127,57 +78,14 @@ def call_glslsmith_reconditioner(graphicsfuzz, exec_dir, shader, harness, run_ty
     return collect_process_return(subprocess.run(cmd, capture_output=True, text=True), "SUCCESS!")
 
 
-def single_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout=10, run_type="standard", verbose=False):
-    previous_location = os.getcwd()
-    os.chdir(exec_dir)
-    try:
-        # Push the shader file to android
-        if compiler.type == "android":
-            subprocess.run(["adb", "push", shader_to_compile, "/data/local/tmp/" + shader_to_compile],
-                           capture_output=True, text=True)
-            # Construct the tool path
-            tool_path = "./" + shader_tool.path.split("/")[-1]
-        else:
-            tool_path = shader_tool.path
-
-        # Prepare the command depending on the tool path
-        if shader_tool.name == "amber":
-            cmd_ending = prepare_amber_command(tool_path, "buffer_results.txt", shader_to_compile, run_type == "add_id")
-        else:
-            cmd_ending = prepare_shadertrap_command(tool_path, compiler.renderer, shader_to_compile)
-
-        # Execute the command
-        if compiler.type == "android":
-            process_return = subprocess.run(["adb", "shell", "cd /data/local/tmp && " + cmd_ending],
-                                            capture_output=True, text=True, timeout=timeout)
-            if verbose:
-                print("adb shell cd /data/local/tmp && " + cmd_ending)
-        else:
-            process_return = subprocess.run(compiler.build_exec_env() + shlex.split(cmd_ending), capture_output=True,
-                                            text=True, timeout=timeout)
-            if verbose:
-                print(" ".join(compiler.build_exec_env()) + cmd_ending)
-
-        # Collect the result
-        if compiler.type == "android":
-            # Pull all buffers from android
-            ls_return = subprocess.run(["adb", "shell", "ls", "/data/local/tmp/buffer_*"], capture_output=True,
-                                       text=True)
-            for buffer_file in ls_return.stdout.split():
-                subprocess.run(["adb", "pull", buffer_file], capture_output=True, text=True)
-
-            # Clean in the case of android
-            subprocess.run(["adb", "shell", "rm", "/data/local/tmp/buffer_*", "/data/local/tmp/" + shader_to_compile],
-                           capture_output=True, text=True)
+def prepare_command(compiler, shader_to_compile, shader_tool, tool_path, run_type="standard"):
+    if shader_tool.name == "amber":
+        return prepare_amber_command(tool_path, "buffer_results.txt", shader_to_compile, run_type == "add_id")
+    return prepare_shadertrap_command(tool_path, compiler.renderer, shader_to_compile)
 
-    # Timeout case
-    except subprocess.TimeoutExpired:
-        with open("buffer_results.txt", 'w') as file:
-            file.write("timeout")
-            file.close()
-        os.chdir(previous_location)
-        return False, True, "timeout"
 
+def collect_compile_result(exec_dir, shader_tool, process_return, run_type="standard"):
+    buffer_results = os.path.join(exec_dir, "buffer_results.txt")
     # Detect error at compilation time
     if shader_tool.name == "amber":
         check_passed, message = collect_process_return(process_return, "1 pass")
@@ -185,25 +93,173 @@ def single_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout=1
         check_passed, message = collect_process_return(process_return, "SUCCESS!")
         if check_passed:
             if run_type == "add_id":
-                shutil.move("buffer_ids.txt", "buffer_results.txt")
+                shutil.move(os.path.join(exec_dir, "buffer_ids.txt"), buffer_results)
             else:
-                buffer_files = find_digit_buffer_file(os.getcwd())
+                buffer_files = find_digit_buffer_file(exec_dir)
                 # Exclude combined files from concatenation and removal
-                concatenate_files("buffer_results.txt", buffer_files)
-                clean_files(exec_dir, buffer_files)
+                # The digest is computed during the concatenation (the kernel copy of concatenate_files is not used
+                # here), it is only remembered when the buffer is not racy, as for the digests of DigestCache
+                with instrumentation.stage("concatenation"):
+                    file_hash = shared_digest_cache.new_hash()
+                    concatenate_files(buffer_results, [os.path.join(exec_dir, file) for file in buffer_files],
+                                      file_hash)
+                    shared_digest_cache.register(buffer_results, file_hash)
+                    clean_files(exec_dir, buffer_files)
     if not check_passed:
-        with open("buffer_results.txt", 'w') as file:
+        with open(buffer_results, 'w') as file:
             file.write("crash")
             file.close()
 
-    # Return to location
-    os.chdir(previous_location)
     return not check_passed, False, message if not check_passed else "no_crash"
 
 
+def collect_timeout(exec_dir):
+    with open(os.path.join(exec_dir, "buffer_results.txt"), 'w') as file:
+        file.write("timeout")
+        file.close()
+    return False, True, "timeout"
+
+
+def android_compile(compilers, exec_dirs, shader_to_compile, shader_tool, timeouts, run_type="standard",
+                    verbose=False, runtime_stats=None):
+    # Run the shader on each (android) compiler, the compilers given the same device share a single round trip, the
+    # buffers of each compiler are collected in its execution directory
+    tool_path = DEVICE_ROOT + shader_tool.path.split("/")[-1]
+    jobs = []
+    for compiler, exec_dir in zip(compilers, exec_dirs):
+        command = prepare_command(compiler, shader_to_compile, shader_tool, tool_path, run_type)
+        if verbose:
+            print("adb shell " + command)
+        jobs.append((shader_to_compile, command, exec_dir))
+    results = execute_on_devices([DevicePool.get(compiler) for compiler in compilers], jobs, timeouts)
+    compile_results = []
+    for compiler, exec_dir, result in zip(compilers, exec_dirs, results):
+        if result is None:
+            compile_results.append(collect_timeout(exec_dir))
+            continue
+        status, output, runtime = result
+        # The driver runs on the device, only its wall time is known
+        instrumentation.record("driver", runtime, 0, compiler.name)
+        if runtime_stats is not None:
+            runtime_stats.record(compiler.name, runtime)
+        compile_results.append(collect_compile_result(exec_dir, shader_tool,
+                                                      subprocess.CompletedProcess([], status, output, ""), run_type))
+    return compile_results
+
+
+def single_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout=10, run_type="standard", verbose=False):
+    # Every artifact is located in exec_dir and every process is launched from it (no global working directory)
+    exec_dir = str(exec_dir)
+    shader_to_compile = ensure_abs_path(exec_dir, str(shader_to_compile))
+    # Android compilers go through the transport of their device
+    if compiler.type == "android":
+        return android_compile([compiler], [exec_dir], shader_to_compile, shader_tool, [timeout], run_type,
+                               verbose)[0]
+    cmd_ending = prepare_command(compiler, shader_to_compile, shader_tool, shader_tool.path, run_type)
+    try:
+        with instrumentation.stage("driver", compiler.name):
+            process_return = subprocess.run(compiler.build_exec_env() + shlex.split(cmd_ending), capture_output=True,
+                                            text=True, timeout=timeout, cwd=exec_dir)
+        if verbose:
+            print(" ".join(compiler.build_exec_env()) + cmd_ending)
+    # Timeout case
+    except subprocess.TimeoutExpired:
+        return collect_timeout(exec_dir)
+    return collect_compile_result(exec_dir, shader_tool, process_return, run_type)
+
+
+def timed_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout=10, run_type="standard",
+                  runtime_stats=None):
+    # Run the compiler with the timeout derived from its runtimes and record the runtime of completed executions
+    if runtime_stats is None:
+        return single_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout, run_type)
+    start = time.monotonic()
+    crash_result, timeout_result, message = single_compile(exec_dir, compiler, shader_to_compile, shader_tool,
+                                                           runtime_stats.timeout(compiler.name, timeout), run_type)
+    if not timeout_result:
+        runtime_stats.record(compiler.name, time.monotonic() - start)
+    return crash_result, timeout_result, message
+
+
+def cached_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout=10, run_type="standard",
+                   result_cache=None, runtime_stats=None):
+    # Results of android devices are not cached as the device state is not part of the key
+    # The key holds the configured timeout, not the derived one, so that the entries survive new runtimes: time-outs
+    # (which depend on the derived timeout and on the load of the host) are never stored
+    if result_cache is None or compiler.type == "android":
+        return timed_compile(exec_dir, compiler, shader_to_compile, shader_tool, timeout, run_type, runtime_stats)
+    buffer_results = os.path.join(str(exec_dir), "buffer_results.txt")
+    key = result_cache.key(compiler, shader_tool, ensure_abs_path(str(exec_dir), str(shader_to_compile)), run_type,
+                           timeout)
+    drivers = result_cache.driver_fingerprint(compiler, shader_tool)
+    result = result_cache.lookup(key, drivers, buffer_results)
+    if result is not None:
+        return result
+    crash_result, timeout_result, message = timed_compile(exec_dir, compiler, shader_to_compile, shader_tool,
+                                                          timeout, run_type, runtime_stats)
+    if not timeout_result:
+        result_cache.store(key, drivers, buffer_results, crash_result, timeout_result, message)
+    return crash_result, timeout_result, message
+
+
+def compile_in_scratch_dir(exec_dir, compiler, shader_to_compile, shader_tool, file_result, timeout=10,
+                           run_type="standard", result_cache=None, runtime_stats=None):
+    # Give the compiler its own directory so that its buffers do not collide with the ones of other compilers
+    scratch_dir = tempfile.mkdtemp(prefix=compiler.name + "_", dir=exec_dir)
+    try:
+        _, _, message = cached_compile(scratch_dir, compiler, shader_to_compile, shader_tool, timeout, run_type,
+                                       result_cache, runtime_stats)
+        shutil.move(os.path.join(scratch_dir, "buffer_results.txt"), file_result)
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return message
+
+
+def parallel_compilation(compilers_dict, exec_dir, shader_to_compile, shader_tool, file_results, timeout=10,
+                         run_type="standard", compile_jobs=2, result_cache=None, runtime_stats=None):
+    messages = {}
+    with ThreadPoolExecutor(max_workers=compile_jobs) as executor:
+        futures = {}
+        for compiler_name, compiler in compilers_dict.items():
+            if compiler.type != "android":
+                # The compilers run in the context of the seed (instrumentation)
+                futures[compiler_name] = executor.submit(contextvars.copy_context().run, compile_in_scratch_dir,
+                                                         exec_dir, compiler, shader_to_compile, shader_tool,
+                                                         file_results[compiler_name], timeout, run_type, result_cache,
+                                                         runtime_stats)
+        # Android compilers go through the transport of their device, they are kept sequential
+        for compiler_name, compiler in compilers_dict.items():
+            if compiler.type == "android":
+                messages[compiler_name] = compile_in_scratch_dir(exec_dir, compiler, shader_to_compile, shader_tool,
+                                                                 file_results[compiler_name], timeout, run_type,
+                                                                 result_cache, runtime_stats)
+        for compiler_name, future in futures.items():
+            messages[compiler_name] = future.result()
+    # Report the messages in the order of the compilers
+    return [messages[compiler_name] for compiler_name in compilers_dict]
+
+
+def batched_android_compilation(compilers_dict, exec_dir, shader_to_compile, shader_tool, file_results, timeout=10,
+                                run_type="standard", runtime_stats=None):
+    # The android compilers run the shader in a single round trip to the device, each one collects its buffers in its
+    # own directory
+    scratch_dirs = [tempfile.mkdtemp(prefix=compiler_name + "_", dir=exec_dir) for compiler_name in compilers_dict]
+    try:
+        timeouts = [runtime_stats.timeout(compiler_name, timeout) if runtime_stats is not None else timeout
+                    for compiler_name in compilers_dict]
+        results = android_compile(list(compilers_dict.values()), scratch_dirs, shader_to_compile, shader_tool,
+                                  timeouts, run_type, runtime_stats=runtime_stats)
+        for compiler_name, scratch_dir in zip(compilers_dict, scratch_dirs):
+            shutil.move(os.path.join(scratch_dir, "buffer_results.txt"), file_results[compiler_name])
+    finally:
+        for scratch_dir in scratch_dirs:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    return {compiler_name: message for compiler_name, (_, _, message) in zip(compilers_dict, results)}
+
+
 def execute_compilation(compilers_dict, graphicsfuzz, exec_dir, shader_tool, shader_name, output_seed="", move_dir="./",
-                        run_type="standard", timeout=10):
-    no_compile_errors = []
+                        run_type="standard", timeout=10, compile_jobs=1, reconditioner=None, result_cache=None,
+                        runtime_stats=None):
     # Verify that the file exists
     if not os.path.isfile(ensure_abs_path(exec_dir, shader_name)):
         print(shader_name + " not found")
@@ -213,15 +269,20 @@ def execute_compilation(compilers_dict, graphicsfuzz, exec_dir, shader_tool, sha
     # Call postprocessing using java if requested
     if run_type != "no_postprocessing":
         shader_to_compile = ensure_abs_path(exec_dir, "tmp" + shader_tool.file_extension)
-        reconditioned, error = call_glslsmith_reconditioner(graphicsfuzz, exec_dir, str(shader_name),
-                                                            shader_to_compile,
-                                                            run_type)
+        with instrumentation.stage("reconditioning"):
+            if reconditioner is not None:
+                reconditioned, error = reconditioner.recondition(exec_dir, str(shader_name), shader_to_compile,
+                                                                 run_type)
+            else:
+                reconditioned, error = call_glslsmith_reconditioner(graphicsfuzz, exec_dir, str(shader_name),
+                                                                    shader_to_compile,
+                                                                    run_type)
         if not reconditioned:
             print(error)
             return ["failed_reconditioning"] * len(compilers_dict)
 
     file_result = ""
-    # Call the compilation with a subset of compilers in add_id mode
+    file_results = {}
     for compiler_name in compilers_dict:
         # Specify the buffers output name (if a seed is given it is added in the name)
         if output_seed != "":
@@ -231,11 +292,29 @@ def execute_compilation(compilers_dict, graphicsfuzz, exec_dir, shader_tool, sha
         file_result = ensure_abs_path(exec_dir, file_result)
         # Register the resulting buffer as a result instead of a temporary buffer (ie: buffer_1 etc...)
         resulting_buffers.append(file_result)
-        compiler = compilers_dict[compiler_name]
-        crash_result, timeout_result, message = single_compile(exec_dir, compiler, shader_to_compile, shader_tool,
-                                                               timeout, run_type)
-        no_compile_errors.append(message)
-        shutil.move(ensure_abs_path(exec_dir, "buffer_results.txt"), file_result)
+        file_results[compiler_name] = file_result
+
+    messages = {}
+    # Several android compilers share a single round trip to the device
+    android_compilers = {compiler_name: compiler for compiler_name, compiler in compilers_dict.items()
+                         if compiler.type == "android"}
+    if len(android_compilers) > 1:
+        messages = batched_android_compilation(android_compilers, exec_dir, shader_to_compile, shader_tool,
+                                               file_results, timeout, run_type, runtime_stats)
+    other_compilers = {compiler_name: compiler for compiler_name, compiler in compilers_dict.items()
+                       if compiler_name not in messages}
+
+    # Call the compilation with a subset of compilers in add_id mode
+    if compile_jobs > 1 and len(other_compilers) > 1:
+        messages.update(zip(other_compilers, parallel_compilation(other_compilers, exec_dir, shader_to_compile,
+                                                                  shader_tool, file_results, timeout, run_type,
+                                                                  compile_jobs, result_cache, runtime_stats)))
+    else:
+        for compiler_name, compiler in other_compilers.items():
+            _, _, messages[compiler_name] = cached_compile(exec_dir, compiler, shader_to_compile, shader_tool,
+                                                           timeout, run_type, result_cache, runtime_stats)
+            shutil.move(ensure_abs_path(exec_dir, "buffer_results.txt"), file_results[compiler_name])
+    no_compile_errors = [messages[compiler_name] for compiler_name in compilers_dict]
 
     # Compare the different buffers obtained from the compilation if we need to rerun
     if run_type == "add_id":
@@ -246,7 +325,8 @@ def execute_compilation(compilers_dict, graphicsfuzz, exec_dir, shader_tool, sha
             shutil.move(file_result, ensure_abs_path(exec_dir, "buffer_results.txt"))
             # Recursive call with the reduced number of wrappers
             return execute_compilation(compilers_dict, graphicsfuzz, exec_dir, shader_tool, shader_name, output_seed,
-                                       move_dir, "reduced", timeout)
+                                       move_dir, "reduced", timeout, compile_jobs, reconditioner,
+                                       result_cache, runtime_stats)
 
     # Copy back the results
     if move_dir != "./":
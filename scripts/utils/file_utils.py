@@ -14,25 +14,53 @@
 
 import os
 import re
-
-
-def concatenate_files(outputname, files):
-    out = b''
-    for fileadd in files:
-        if 'buffer' in fileadd:
-            with open(fileadd, 'rb') as f:
-                out += f.read()
-    with open(outputname, 'wb') as dumpfile:
-        dumpfile.write(out)
+import shutil
+
+
+def buffer_order(file):
+    # Natural order of the buffers (buffer_2 before buffer_10) whatever the order given by the file system
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", os.path.basename(file))], file
+
+
+def copy_file_content(source, destination):
+    # Copy in the kernel when possible, through user space otherwise (the copy goes on from the current offsets)
+    for kernel_copy in [getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)]:
+        if kernel_copy is None:
+            continue
+        try:
+            if kernel_copy is os.copy_file_range:
+                while os.copy_file_range(source.fileno(), destination.fileno(), 1 << 30) > 0:
+                    pass
+            else:
+                while os.sendfile(destination.fileno(), source.fileno(), None, 1 << 30) > 0:
+                    pass
+            return
+        except OSError:
+            continue
+    shutil.copyfileobj(source, destination)
+
+
+def concatenate_files(outputname, files, file_hash=None):
+    # Stream the buffer files in a deterministic order, file_hash (if given) is updated with the written content
+    # Hashing needs the content in user space: the files are then copied by chunks (a single read of each file), the
+    # kernel copy only serves the concatenations without a digest
+    files = sorted([file for file in files if 'buffer' in file], key=buffer_order)
+    with open(outputname, 'wb', buffering=0) as dumpfile:
+        for fileadd in files:
+            with open(fileadd, 'rb', buffering=0) as f:
+                if file_hash is None:
+                    copy_file_content(f, dumpfile)
+                else:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        file_hash.update(chunk)
+                        dumpfile.write(chunk)
 
 
 def clean_files(current_dir, files_list):
-    ref = os.getcwd()
-    os.chdir(current_dir)
     for file in files_list:
+        file = ensure_abs_path(str(current_dir), file)
         if os.path.isfile(file):
             os.remove(file)
-    os.chdir(ref)
 
 
 def find_file(current_dir, regex_pattern=""):
@@ -60,6 +88,19 @@ def find_test_file(current_dir):  # pragma: no cover
     return find_file(current_dir, "test")
 
 
+def find_generated_shaders(shader_output, file_extension, seeds=None):
+    # Every generated shader of the output directory or only the ones of the given seeds
+    if seeds is None:
+        return [shader_output + file for file in
+                sorted(find_file(shader_output, "test_[0-9]+" + re.escape(file_extension) + "$"),
+                       key=lambda x: int(get_seed(x)))]
+    return [shader_output + "test_" + str(seed) + file_extension for seed in seeds]
+
+
+def get_reconditioned_name(shader_name, file_extension):
+    return shader_name.removesuffix(file_extension) + "_re" + file_extension
+
+
 def get_compiler_name(buffer_name):
     return re.split("_[0-9]+", buffer_name.split("/")[-1].removeprefix("buffer_").removesuffix(".txt"))[0]
 